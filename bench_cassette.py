@@ -0,0 +1,114 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# --------------------------------
+# 카세트 점검: python bench_cassette.py
+#  1) record : 목 서버(실제 API 대신, 지연 있음)에 심문하며 카세트에 녹화
+#  2) replay : 같은 심문을 카세트로만 재생 (API 키/네트워크 없이). 답이 녹화와 같은지 확인
+#  3) miss   : 녹화에 없는 질문으로 재생 → 미스 보고
+# 단계마다 GAME_CASSETTE 를 바꾼 하위 프로세스에서 돌고, 턴당 지연과 카세트 보고를 출력한다.
+# 단일 심문(스트리밍/비스트리밍 번갈아)과 단체 심문(비동기)을 모두 지난다.
+# --------------------------------
+QUESTIONS = ["범인이 누구야?", "그 시각에 어디 있었어?", "D에 대해 어떻게 생각해?", "E는 뭘 알고 있지?",
+             "너 범인이야?", "알리바이를 말해 봐"]
+OTHER_QUESTIONS = ["어젯밤 날씨는 어땠어?", "피해자와는 어떤 사이였지?"]
+
+
+def child(turns: int, questions: list[str]):
+    if os.environ["GAME_CASSETTE"] != "replay":
+        from game_mock_server import MockConfig, serve
+
+        server = serve(MockConfig(latency_ms=300, latency_dist="fixed", tokens_per_sec=80, seed=1),
+                       port=0, background=True)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from game_cassette import CASSETTE
+    from game_engine import group_interrogate, interrogate
+    from game_policy import TurnFailed
+    from game_scenario import load_scenario
+    from game_text import parse_llm_output
+
+    scenario = load_scenario()
+    rooms = {rid: {"messages": [], "model": []} for rid in scenario.room_ids}
+    lat, replies, failed = [], [], 0
+    for i in range(turns):
+        room_id = scenario.room_ids[i % len(scenario.room_ids)]
+        t0 = time.perf_counter()
+        try:
+            payload = interrogate(rooms, room_id, questions[i % len(questions)], use_cache=False,
+                                  on_partial=(lambda md: None) if i % 2 else None)
+            replies.append(parse_llm_output(payload)[0])
+        except TurnFailed:
+            failed += 1
+        lat.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for room_id, payload, err in sorted(group_interrogate(rooms, scenario.room_ids, questions[0], use_cache=False),
+                                        key=lambda r: r[0]):
+        if err is not None:
+            failed += 1
+        else:
+            replies.append(parse_llm_output(payload)[0])
+    group_s = time.perf_counter() - t0
+    lat.sort()
+    print(json.dumps({
+        "turn_p50_ms": lat[len(lat) // 2] * 1000, "turn_max_ms": lat[-1] * 1000, "group_ms": group_s * 1000,
+        "failed": failed, "replies": hashlib.sha256("\n".join(replies).encode()).hexdigest()[:12],
+        "cassette": CASSETTE.report(),
+    }, ensure_ascii=False))
+
+
+def run_phase(mode: str, path: str, turns: int, questions: list[str], latency_ms: float) -> dict:
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    env.update(GAME_CASSETTE=mode, GAME_CASSETTE_PATH=path, GAME_CASSETTE_LATENCY_MS=str(latency_ms),
+               GAME_SESSION_DB="")
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--turns", str(turns),
+         "--questions", json.dumps(questions, ensure_ascii=False)],
+        env=env, capture_output=True, text=True,
+    )
+    if out.returncode:
+        print(out.stderr[-2000:])
+        raise SystemExit(out.returncode)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=0, help="재생 때 흉내 낼 지연")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--questions", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.turns, json.loads(args.questions))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.db")
+        phases = [("record", QUESTIONS), ("replay", QUESTIONS), ("replay", OTHER_QUESTIONS)]
+        results = []
+        print(f"{args.turns} turns + 1 group interrogation per phase")
+        print(f"{'phase':<16} {'turn_p50_ms':>11} {'turn_max_ms':>11} {'group_ms':>9} {'failed':>6} {'replies':>12}  cassette")
+        for mode, questions in phases:
+            r = run_phase(mode, path, args.turns, questions, args.latency_ms)
+            results.append(r)
+            c = r["cassette"]
+            label = mode if questions is QUESTIONS else f"{mode} (new qs)"
+            print(f"{label:<16} {r['turn_p50_ms']:>11.1f} {r['turn_max_ms']:>11.1f} {r['group_ms']:>9.1f} "
+                  f"{r['failed']:>6} {r['replies']:>12}  entries={c['entries']} {c['body_kb']} KB "
+                  f"hits={c['hits']} misses={c['misses']} recorded={c['recorded']}")
+        assert results[0]["replies"] == results[1]["replies"], "재생한 답이 녹화와 다름"
+        print("recent misses:")
+        for m in results[2]["cassette"]["recent_misses"][:5]:
+            print(f"  {m}")
+
+
+if __name__ == "__main__":
+    main()
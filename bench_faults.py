@@ -0,0 +1,72 @@
+import os
+import time
+
+from game_mock_server import MockConfig, serve
+
+# --------------------------------
+# 장애 주입 점검: python bench_faults.py
+# 로컬 목 서버에 오류/429/깨진 JSON/지연/모델 다운을 주입하고 interrogate() 를 돌려
+# 성공률, 재시도/폴백 횟수, 스키마 수리/재질문 횟수, 회로 상태를 출력한다.
+# 실패한 턴이 방 히스토리에 흔적을 남기지 않는지(질문-답이 짝을 이루는지)도 매 턴 확인한다.
+# --------------------------------
+SCENARIOS = [
+    ("clean", {}),
+    ("flaky 30% 5xx + 10% 429 + 10% bad JSON", {"error_rate": 0.3, "rate_limit_rate": 0.1, "malformed_rate": 0.1}),
+    ("schema-invalid 30% (half unrepairable)", {"invalid_rate": 0.3}),
+    ("stalls 30% (attempt timeout 0.5 s)", {"stall_rate": 0.3, "stall_ms": 3000}),
+    ("primary model down", {"down_models": ("gpt-4o",)}),
+    ("everything down", {"error_rate": 1.0}),
+]
+
+
+def check_room(room: dict, answered: int):
+    body = [m for m in room["model"] if m["role"] != "system"]
+    roles = [m["role"] for m in body]
+    assert roles == ["user", "assistant"] * (len(roles) // 2), roles
+    assert room["answered"] == answered
+
+
+def main(turns: int = 40):
+    server = serve(MockConfig(latency_ms=20, latency_dist="fixed", tokens_per_sec=0, seed=1), port=0, background=True)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from game_engine import MODEL_TIERS, interrogate
+    from game_metrics import METRICS
+    from game_policy import POLICY, TurnFailed
+    from game_scenario import load_scenario
+
+    POLICY.backoff_base, POLICY.backoff_cap = 0.02, 0.2  # 점검은 빠르게
+    scenario = load_scenario()
+    print(f"tiers={MODEL_TIERS} attempts/tier={POLICY.max_attempts} deadline={POLICY.deadline}s")
+    print(f"{'scenario':<42} {'ok':>4} {'failed':>6} {'retries':>7} {'fallbacks':>9} {'repaired':>8} {'reasked':>7} {'p50_ms':>7} {'max_ms':>7}  breakers")
+    for name, faults in SCENARIOS:
+        server.backend.config = MockConfig(latency_ms=20, latency_dist="fixed", tokens_per_sec=0, seed=1, **faults)
+        POLICY.reset()
+        POLICY.attempt_timeout = 0.5 if "stall_rate" in faults else 20
+        before = METRICS.counters()
+        rooms = {rid: {"messages": [], "model": [], "answered": 0} for rid in scenario.room_ids}
+        ok = failed = 0
+        lat = []
+        for i in range(turns):
+            room_id = scenario.room_ids[i % len(scenario.room_ids)]
+            t0 = time.perf_counter()
+            try:
+                interrogate(rooms, room_id, f"질문 {i}", use_cache=False,
+                            on_partial=(lambda md: None) if i % 2 else None)
+                rooms[room_id]["answered"] += 1
+                ok += 1
+            except TurnFailed:
+                failed += 1
+            lat.append(time.perf_counter() - t0)
+            check_room(rooms[room_id], rooms[room_id]["answered"])
+        after = METRICS.counters()
+        delta = lambda prefix: sum(v - before.get(k, 0) for k, v in after.items() if k.startswith(prefix))
+        lat.sort()
+        print(f"{name:<42} {ok:>4} {failed:>6} {delta('retries'):>7.0f} {delta('fallbacks'):>9.0f} "
+              f"{delta('schema_repaired'):>8.0f} {delta('schema_reasked'):>7.0f} "
+              f"{lat[len(lat) // 2] * 1000:>7.0f} {lat[-1] * 1000:>7.0f}  {POLICY.report()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# --------------------------------
+# 출력 형식 비교: python bench_formats.py
+# words(단어 객체 목록) 와 compact(굵게 표시 평문) 두 형식의 답변당 완성 토큰과 지연을 비교한다.
+#  1) 코퍼스: 시나리오 핵심 진술/일반 답 + 핵심 진술 감지 라벨 답변을 두 형식으로 만들어 토큰을 세고,
+#     parse_llm_output 결과(content_md, speaker, utt_type)가 형식과 무관하게 같은지 확인한다.
+#  2) 목 서버: 형식마다 GAME_OUTPUT_FORMAT 을 바꾼 하위 프로세스에서 스트리밍 심문을 돌려
+#     usage.completion_tokens 평균과 첫 토큰/전체 지연을 잰다.
+# tiktoken 이 없으면 토큰은 game_history.count_tokens 근사치다.
+# --------------------------------
+FORMATS = ("words", "compact")
+_SENTENCE = re.compile(r"(?<=[.?!])\s+")
+
+
+def corpus(scenario) -> list[tuple[str, str, str]]:
+    # (speaker, utterance_type, text_md)
+    from game_core_detect import LABELED_REPLIES, detect_core_statements
+    from game_mock_server import NORMAL_REPLIES
+
+    out = []
+    for s in scenario.suspects.values():
+        out += [(s.id, "core", f"**{c}**") for c in s.core]
+        out += [(s.id, "normal", text) for text in NORMAL_REPLIES]
+    for speaker, text, _ in LABELED_REPLIES:
+        parts = [f"**{p}**" if detect_core_statements(p, speaker, scenario.id) else p
+                 for p in _SENTENCE.split(text)]
+        out.append((speaker, "core" if any(p.startswith("**") for p in parts) else "normal", " ".join(parts)))
+    return out
+
+
+def encode(output_format: str, speaker: str, utt_type: str, text_md: str) -> str:
+    from game_text import compact_payload, markdown_to_tokens
+
+    payload = {"json_list": markdown_to_tokens(text_md), "speaker": speaker, "utterance_type": utt_type,
+               "combined_text_md": text_md}
+    return json.dumps(compact_payload(payload) if output_format == "compact" else payload, ensure_ascii=False)
+
+
+def bench_corpus(scenario):
+    from game_history import count_tokens, tiktoken
+    from game_text import parse_llm_output
+
+    rows = corpus(scenario)
+    totals = dict.fromkeys(FORMATS, 0)
+    for speaker, utt_type, text_md in rows:
+        parsed = {}
+        for fmt in FORMATS:
+            raw = encode(fmt, speaker, utt_type, text_md)
+            totals[fmt] += count_tokens(raw)
+            parsed[fmt] = parse_llm_output(raw)[:3]
+        assert len(set(parsed.values())) == 1, parsed
+    print(f"corpus: {len(rows)} replies, tokens={'tiktoken' if tiktoken else 'approx'}; "
+          f"parse_llm_output identical across formats")
+    for fmt in FORMATS:
+        print(f"  {fmt:<8} completion tokens/reply {totals[fmt] / len(rows):>6.1f} "
+              f"({totals[fmt] / totals['words']:.0%} of words)")
+
+
+def child(turns: int, tokens_per_sec: float):
+    # GAME_OUTPUT_FORMAT 이 정해진 프로세스 안에서 목 서버 + 스트리밍 심문
+    from game_mock_server import MockConfig, serve
+
+    server = serve(MockConfig(latency_ms=50, latency_dist="fixed", tokens_per_sec=tokens_per_sec, seed=1),
+                   port=0, background=True)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from game_engine import interrogate
+    from game_metrics import METRICS
+    from game_scenario import load_scenario
+    from game_text import parse_llm_output
+
+    scenario = load_scenario()
+    rooms = {rid: {"messages": [], "model": []} for rid in scenario.room_ids}
+    first, total = [], []
+    for i in range(turns):
+        room_id = scenario.room_ids[i % len(scenario.room_ids)]
+        t0, seen = time.perf_counter(), []
+        payload = interrogate(rooms, room_id, f"질문 {i}", use_cache=False,
+                              on_partial=lambda md: seen or seen.append(time.perf_counter() - t0))
+        total.append(time.perf_counter() - t0)
+        first.append(seen[0] if seen else total[-1])
+        assert parse_llm_output(payload)[0]
+    completion = sum(r["completion_tokens"] for r in METRICS.spend_table())
+    first.sort()
+    total.sort()
+    print(json.dumps({"completion_tokens": completion / turns, "first_ms": first[len(first) // 2] * 1000,
+                      "p50_ms": total[len(total) // 2] * 1000, "max_ms": total[-1] * 1000}))
+
+
+def bench_mock(turns: int, tokens_per_sec: float):
+    print(f"mock: {turns} streamed turns per format, {tokens_per_sec:g} tokens/s")
+    print(f"  {'format':<8} {'tokens/reply':>12} {'first_partial_ms':>16} {'p50_ms':>7} {'max_ms':>7}")
+    for fmt in FORMATS:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--turns", str(turns),
+             "--tokens-per-sec", str(tokens_per_sec)],
+            env={**os.environ, "GAME_OUTPUT_FORMAT": fmt, "GAME_SESSION_DB": ""},
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"  {fmt:<8} {r['completion_tokens']:>12.1f} {r['first_ms']:>16.0f} {r['p50_ms']:>7.0f} "
+              f"{r['max_ms']:>7.0f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=30)
+    ap.add_argument("--tokens-per-sec", type=float, default=80)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.turns, args.tokens_per_sec)
+        return
+
+    from game_scenario import load_scenario
+
+    bench_corpus(load_scenario())
+    bench_mock(args.turns, args.tokens_per_sec)
+
+
+if __name__ == "__main__":
+    main()
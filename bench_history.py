@@ -0,0 +1,78 @@
+import json
+
+import game_engine
+import game_history
+from game_engine import _checked_reply, _finish_turn, _prepare_turn
+from game_history import count_tokens, message_tokens
+from game_mock_server import MockBackend, MockConfig
+from game_prompts import suspect_prompt
+from game_scenario import load_scenario
+from game_session import deep_size
+from game_text import parse_llm_output
+
+# --------------------------------
+# 히스토리 형식 비교: python bench_history.py
+# 목 서버 응답으로 30턴 심문 한 번을 녹화해 두고, 같은 녹화를 히스토리 형식(raw / compact)만 바꿔
+# 엔진의 턴 준비/커밋 경로로 다시 재생한다 (네트워크 없음). 턴마다 보내는 프롬프트 토큰과
+# 세션 메모리(화면 메시지 + 모델 히스토리, 공유 시스템 프롬프트 제외)를 비교한다.
+# 접기 없이(예산 무제한) 한 번, 기본 히스토리 예산으로 한 번 돌린다.
+# --------------------------------
+QUESTIONS = [
+    "범인이 누구야?", "그 시각에 어디 있었어?", "D에 대해 어떻게 생각해?", "E는 뭘 알고 있지?",
+    "너 범인이야?", "알리바이를 말해 봐", "누가 거짓말을 하고 있지?", "C는 무고해?",
+]
+
+
+def record(scenario, room_id: str, turns: int) -> list[tuple[str, str]]:
+    # (질문, 모델 원문) 녹화. 목 서버의 응답 생성기를 직접 쓴다.
+    backend = MockBackend(MockConfig(scenario_id=scenario.id, core_ratio=0.4, seed=7))
+    system = {"role": "system", "content": suspect_prompt(scenario.id, scenario.suspect_for_room(room_id).id, "words")}
+    return [(QUESTIONS[i % len(QUESTIONS)], backend.reply([system])[0]) for i in range(turns)]
+
+
+def replay(scenario, room_id: str, transcript: list[tuple[str, str]], history_format: str, budget: int) -> dict:
+    game_history.HISTORY_FORMAT = history_format
+    game_engine.HISTORY.budget = budget
+    rooms = {room_id: {"messages": [], "model": []}}
+    prompt_tokens = []
+    for query, raw in transcript:
+        room, work, suspect = _prepare_turn(rooms, room_id, query, scenario.id)
+        prompt_tokens.append(message_tokens(work["model"]))
+        raw, payload = _checked_reply(raw, suspect)
+        _finish_turn(room, work, suspect, raw, None, payload)
+        content_md, speaker, _, _ = parse_llm_output(payload)
+        room["messages"] += [{"role": "user", "content": query},
+                             {"role": "assistant", "speaker": speaker, "content": content_md}]
+    model = rooms[room_id]["model"]
+    replies = [m["content"] for m in model if m["role"] == "assistant"]
+    shared = {id(model[0]["content"])}  # 시스템 프롬프트는 프로세스 공유 문자열
+    return {"prompt_tokens": prompt_tokens, "kb": deep_size(rooms, set(shared)) / 1024,
+            "model_kb": deep_size(model, set(shared)) / 1024,
+            "reply_tokens": sum(map(count_tokens, replies)) / len(replies),
+            "last": model[-1]["content"]}
+
+
+def main(turns: int = 30, room_id: str = "room A"):
+    scenario = load_scenario()
+    transcript = record(scenario, room_id, turns)
+    print(f"{turns}-turn interrogation in {room_id} (tokens: {'tiktoken' if game_history._encoding() else 'approx'})")
+    for label, budget in (("no folding", 10 ** 9), (f"budget {game_history.HISTORY_TOKEN_BUDGET}",
+                                                     game_history.HISTORY_TOKEN_BUDGET)):
+        results = {fmt: replay(scenario, room_id, transcript, fmt, budget) for fmt in ("raw", "compact")}
+        raw, compact = results["raw"], results["compact"]
+        assert json.loads(compact["last"])["text"] == json.loads(transcript[-1][1])["combined_text_md"]
+        print(f"[{label}]")
+        print(f"{'turn':>6} {'raw_prompt':>10} {'compact_prompt':>14}")
+        for i in range(turns):
+            if i == 0 or (i + 1) % 5 == 0:
+                print(f"{i + 1:>6} {raw['prompt_tokens'][i]:>10} {compact['prompt_tokens'][i]:>14}")
+        mean = lambda r: sum(r["prompt_tokens"]) / turns
+        print(f"  mean prompt tokens/turn: raw {mean(raw):.0f}, compact {mean(compact):.0f} "
+              f"({1 - mean(compact) / mean(raw):.0%} less); history reply tokens: "
+              f"raw {raw['reply_tokens']:.1f}, compact {compact['reply_tokens']:.1f}")
+        print(f"  session memory: raw {raw['kb']:.1f} KB (model {raw['model_kb']:.1f}), "
+              f"compact {compact['kb']:.1f} KB (model {compact['model_kb']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import resource
+import statistics
+import threading
+import time
+from datetime import datetime
+
+from game_mock_server import add_mock_args, mock_config, serve
+from game_session import deep_size
+
+# --------------------------------
+# 부하 테스트: python bench_load.py --players 1,10,50 --turns 20
+# 플레이어 N명이 동시에 용의자 방(A~E)을 심문한다. 앱과 같은 interrogate() 경로를 타고,
+# 모델은 로컬 목 서버가 대신한다 (--base-url 을 주면 그 서버를 쓴다).
+# 처리량(턴/초), 지연 백분위, 오류 수, 세션당 메모리를 동시 접속 수별로 출력한다.
+# Streamlit 렌더 비용은 포함하지 않는다 (bench_rerun.py 참고).
+# --------------------------------
+QUESTIONS = [
+    "범인이 누구야?", "그 시각에 어디 있었어?", "D에 대해 어떻게 생각해?", "E는 뭘 알고 있지?",
+    "너 범인이야?", "알리바이를 말해 봐", "누가 거짓말을 하고 있지?", "C는 무고해?",
+]
+
+
+def play(scenario, turns: int, stream: bool, think_s: float, seed: int, out: dict):
+    # 플레이어 한 명: 세션 상태 하나를 만들고 무작위 방에 turns 번 질문한다
+    from game_engine import interrogate
+    from game_text import parse_llm_output
+
+    rng = random.Random(seed)
+    rooms = {rid: {"messages": [], "model": []} for rid in scenario.room_ids}
+    latencies, errors = [], 0
+    for _ in range(turns):
+        room_id = rng.choice(scenario.room_ids)
+        query = rng.choice(QUESTIONS)
+        rooms[room_id]["messages"].append({"role": "user", "content": query, "ts": datetime.now().isoformat()})
+        t0 = time.perf_counter()
+        try:
+            payload = interrogate(rooms, room_id, query, scenario_id=scenario.id, use_cache=False,
+                                  on_partial=(lambda md: None) if stream else None)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+        content_md, speaker, _, _ = parse_llm_output(payload)
+        rooms[room_id]["messages"].append({"role": "assistant", "speaker": speaker, "content": content_md,
+                                           "ts": datetime.now().isoformat()})
+        if think_s:
+            time.sleep(rng.uniform(0, 2 * think_s))
+    out.update(latencies=latencies, errors=errors, rooms=rooms)
+
+
+def run(scenario, players: int, turns: int, stream: bool, think_s: float) -> dict:
+    results = [{} for _ in range(players)]
+    threads = [threading.Thread(target=play, args=(scenario, turns, stream, think_s, i, results[i]))
+               for i in range(players)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat = sorted(x for r in results for x in r["latencies"])
+    p = lambda q: lat[int(q * (len(lat) - 1))] * 1000 if lat else float("nan")
+    return {
+        "players": players, "turns": len(lat), "errors": sum(r["errors"] for r in results),
+        "tps": len(lat) / wall, "p50": p(0.5), "p95": p(0.95), "p99": p(0.99),
+        "kb_session": statistics.mean(deep_size(r["rooms"]) for r in results) / 1024,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", default="1,5,10,25,50")
+    ap.add_argument("--turns", type=int, default=20, help="플레이어당 질문 수")
+    ap.add_argument("--think-ms", type=float, default=0, help="질문 사이 평균 대기")
+    ap.add_argument("--no-stream", action="store_true")
+    ap.add_argument("--base-url", default="", help="이미 떠 있는 서버 (없으면 목 서버를 띄운다)")
+    add_mock_args(ap)
+    args = ap.parse_args()
+
+    if args.base_url:
+        os.environ["OPENAI_BASE_URL"] = args.base_url
+    else:
+        server = serve(mock_config(args), port=0, background=True)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from game_client import connection_stats, default_config
+    from game_scenario import load_scenario
+
+    scenario = load_scenario(args.scenario)
+    print(f"base_url={os.environ['OPENAI_BASE_URL']} stream={not args.no_stream} "
+          f"max_connections={default_config().max_connections}")
+    print(f"{'players':>7} {'turns':>6} {'errors':>6} {'turns/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} "
+          f"{'KB/session':>10}")
+    for players in (int(x) for x in args.players.split(",")):
+        r = run(scenario, players, args.turns, not args.no_stream, args.think_ms / 1000)
+        print(f"{r['players']:>7} {r['turns']:>6} {r['errors']:>6} {r['tps']:>8.1f} {r['p50']:>8.1f} "
+              f"{r['p95']:>8.1f} {r['p99']:>8.1f} {r['kb_session']:>10.1f}")
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS {peak_mb:.0f} MB, connections {connection_stats()}")
+
+
+if __name__ == "__main__":
+    main()
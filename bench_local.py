@@ -0,0 +1,135 @@
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+# --------------------------------
+# 추론 백엔드 비교: python bench_local.py --model qwen2.5-1.5b-instruct-q4_k_m.gguf
+# 같은 스트리밍 심문(방을 돌아가며 N턴)을 백엔드마다 하위 프로세스에서 돌려
+# 턴 지연(p50/p95), 첫 부분 답 지연, 생성 속도(tokens/s), 프롬프트 중 재사용(cached) 비율, 스키마 위반 수를 비교한다.
+#   mock     : 로컬 목 서버 (--mock-latency-ms / --mock-tokens-per-sec 로 호스팅 모델 흉내, 항상 돈다)
+#   hosted   : OpenAI (OPENAI_API_KEY 가 있을 때만)
+#   server   : OpenAI 호환 로컬 서버 (--server-url, --server-model 이 있을 때만)
+#   local    : 프로세스 안 llama.cpp (--model GGUF 와 llama-cpp-python 이 있을 때만)
+# 응답 캐시/의미 캐시는 끄고, 폴백 모델과 카세트는 쓰지 않는다. invalid = 수리/재질문/실패한 답 수.
+# --------------------------------
+QUESTIONS = ["범인이 누구야?", "그 시각에 어디 있었어?", "D에 대해 어떻게 생각해?", "E는 뭘 알고 있지?",
+             "너 범인이야?", "알리바이를 말해 봐"]
+
+
+def child(turns: int, mock: dict | None):
+    if mock is not None:
+        from game_mock_server import MockConfig, serve
+
+        server = serve(MockConfig(latency_dist="fixed", seed=1, **mock), port=0, background=True)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from game_client import get_client
+    from game_engine import interrogate
+    from game_local import local_report
+    from game_metrics import METRICS
+    from game_schema import VALIDATION
+    from game_scenario import load_scenario
+
+    t0 = time.perf_counter()
+    get_client()  # 로컬 모델 적재/프리픽스 예열은 턴 지연에서 뺀다
+    setup_s = time.perf_counter() - t0
+    scenario = load_scenario()
+    rooms = {rid: {"messages": [], "model": []} for rid in scenario.room_ids}
+    first, total = [], []
+    for i in range(turns):
+        room_id = scenario.room_ids[i % len(scenario.room_ids)]
+        t0, seen = time.perf_counter(), []
+        interrogate(rooms, room_id, QUESTIONS[i % len(QUESTIONS)], use_cache=False,
+                    on_partial=lambda md: seen or seen.append(time.perf_counter() - t0))
+        total.append(time.perf_counter() - t0)
+        first.append(seen[0] if seen else total[-1])
+    spend = METRICS.spend_table()
+    tokens = {k: sum(r[k] for r in spend) for k in ("prompt_tokens", "completion_tokens", "cached_tokens")}
+    checks = VALIDATION.report()
+    decode_s = sum(t - f for t, f in zip(total, first))
+    first_sorted, total_sorted = sorted(first), sorted(total)
+    print(json.dumps({
+        "setup_s": setup_s,
+        "first_ms": first_sorted[len(first) // 2] * 1000,
+        "p50_ms": total_sorted[len(total) // 2] * 1000,
+        "p95_ms": total_sorted[int(0.95 * (len(total) - 1))] * 1000,
+        "completion_per_turn": tokens["completion_tokens"] / turns,
+        "tokens_per_s": tokens["completion_tokens"] / sum(total),
+        "decode_tokens_per_s": tokens["completion_tokens"] / decode_s if decode_s else 0.0,
+        "cached_ratio": tokens["cached_tokens"] / tokens["prompt_tokens"] if tokens["prompt_tokens"] else 0.0,
+        "invalid": sum(sum(v for k, v in r.items() if k not in ("suspect", "ok", "invalid_ratio")) for r in checks),
+        "local": local_report(),
+    }))
+
+
+def targets(args) -> dict[str, dict | str]:
+    # 이름 → 하위 프로세스 환경 (돌릴 수 없으면 건너뛰는 이유 문자열)
+    base = {"GAME_FALLBACK_MODEL": "", "GAME_SESSION_DB": "", "GAME_CASSETTE": ""}
+    out: dict[str, dict | str] = {"mock": {**base, "GAME_BACKEND": "openai"}}
+    out["hosted"] = ({**base, "GAME_BACKEND": "openai", "OPENAI_BASE_URL": ""} if os.getenv("OPENAI_API_KEY")
+                     else "OPENAI_API_KEY 없음")
+    out["server"] = ({**base, "GAME_BACKEND": "openai", "OPENAI_BASE_URL": args.server_url,
+                      "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "local"), "GAME_MODEL": args.server_model}
+                     if args.server_url and args.server_model else "--server-url/--server-model 없음")
+    if importlib.util.find_spec("llama_cpp") is None:
+        out["local"] = "llama-cpp-python 없음"
+    elif not args.model or not os.path.exists(args.model):
+        out["local"] = "--model GGUF 없음"
+    else:
+        out["local"] = {**base, "GAME_BACKEND": "local", "GAME_LOCAL_MODEL": args.model,
+                        "GAME_LOCAL_THREADS": str(args.threads), "GAME_LOCAL_CTX": str(args.ctx)}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=12)
+    ap.add_argument("--targets", default="mock,hosted,server,local")
+    ap.add_argument("--model", default=os.getenv("GAME_LOCAL_MODEL", ""), help="GGUF 경로 (local)")
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--ctx", type=int, default=8192)
+    ap.add_argument("--server-url", default="", help="OpenAI 호환 로컬 서버 (예: http://127.0.0.1:8080/v1)")
+    ap.add_argument("--server-model", default="")
+    ap.add_argument("--mock-latency-ms", type=float, default=400)
+    ap.add_argument("--mock-tokens-per-sec", type=float, default=80)
+    ap.add_argument("--format", default=os.getenv("GAME_OUTPUT_FORMAT", "words"))
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--mock", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.turns, {"latency_ms": args.mock_latency_ms, "tokens_per_sec": args.mock_tokens_per_sec}
+              if args.mock else None)
+        return
+
+    print(f"{args.turns} streamed turns per backend, output format {args.format}")
+    print(f"{'backend':<7} {'setup_s':>7} {'first_ms':>8} {'p50_ms':>7} {'p95_ms':>7} {'tok/turn':>8} "
+          f"{'tok/s':>6} {'decode_tok/s':>12} {'cached':>6} {'invalid':>7}")
+    available = targets(args)
+    for name in args.targets.split(","):
+        env = available[name]
+        if isinstance(env, str):
+            print(f"{name:<7} skipped: {env}")
+            continue
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--turns", str(args.turns),
+               "--mock-latency-ms", str(args.mock_latency_ms), "--mock-tokens-per-sec", str(args.mock_tokens_per_sec)]
+        out = subprocess.run(cmd + (["--mock"] if name == "mock" else []),
+                             env={**os.environ, **env, "GAME_OUTPUT_FORMAT": args.format},
+                             capture_output=True, text=True)
+        if out.returncode:
+            print(f"{name:<7} failed: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{name:<7} {r['setup_s']:>7.1f} {r['first_ms']:>8.0f} {r['p50_ms']:>7.0f} {r['p95_ms']:>7.0f} "
+              f"{r['completion_per_turn']:>8.1f} {r['tokens_per_s']:>6.1f} {r['decode_tokens_per_s']:>12.1f} "
+              f"{r['cached_ratio']:>6.0%} {r['invalid']:>7}")
+        if r["local"]:
+            print(f"        {r['local']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+# --------------------------------
+# 다음 질문 미리 생성 효과: python bench_prefetch.py
+# 플레이어 흉내: 방마다 질문 N개를 던지고, 답을 받으면 --read-s 초 동안 읽은 뒤 다음 질문을 한다.
+# 질문은 후속 질문 템플릿을 바꿔 말한 것과 템플릿에 없는 질문을 섞어 고른다 (--seed 고정).
+# 모델은 목 서버(--latency-ms, --tokens-per-sec)가 대신한다. GAME_PREFETCH 를 끈/켠 하위 프로세스에서
+# 턴 지연(평균/p50/p95), 적중률, 미리 생성 때문에 더 든 토큰/비용을 비교한다.
+# --------------------------------
+PLAYER_QUESTIONS = [
+    "너 범인이야?", "네가 범인이지?", "범인이 누구라고 생각해?", "범인은 누구라고 봐?", "그 시각에 어디 있었어?",
+    "그 시간에 어디 있었지?", "알리바이를 말해 봐", "알리바이가 뭐야?", "누가 거짓말을 하고 있지?",
+    "피해자와는 어떤 관계였어?", "촛대에 대해 아는 거 있어?", "고무장갑은 누구 거야?", "C는 어떻게 생각해?",
+    "E랑은 아는 사이야?", "C와는 어떤 사이야?", "D는 어때?", "E에 대해 아는 거 있어?", "A가 너를 범인이라던데?",
+]
+
+
+def child(rooms_n: int, questions: int, read_s: float, latency_ms: float, tokens_per_sec: float, seed: int):
+    from game_mock_server import MockConfig, serve
+
+    server = serve(MockConfig(latency_ms=latency_ms, latency_dist="fixed", tokens_per_sec=tokens_per_sec, seed=seed),
+                   port=0, background=True)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from game_core_detect import detect_core_statements, unlock
+    from game_engine import interrogate, prefetch
+    from game_metrics import METRICS
+    from game_prefetch import PREFETCH
+    from game_scenario import load_scenario
+    from game_text import payload_text
+
+    scenario = load_scenario()
+    rng = random.Random(seed)
+    rooms = {rid: {"messages": [], "model": []} for rid in scenario.room_ids}
+    lat = []
+    for room_id in scenario.room_ids[:rooms_n]:
+        suspect = scenario.suspect_for_room(room_id)
+        for _ in range(questions):
+            query = rng.choice(PLAYER_QUESTIONS)
+            t0 = time.perf_counter()
+            payload = interrogate(rooms, room_id, query, use_cache=False)
+            lat.append(time.perf_counter() - t0)
+            room = rooms[room_id]
+            room["messages"] += [{"role": "user", "content": query}, {"role": "assistant", "content": ""}]
+            unlock(room, detect_core_statements(payload_text(payload), suspect.id, scenario.id))
+            prefetch(rooms, room_id, scenario_id=scenario.id)
+            time.sleep(read_s)
+    stats = PREFETCH.stats()
+    lat.sort()
+    spend = METRICS.spend_table()
+    print(json.dumps({
+        "mean_ms": sum(lat) / len(lat) * 1000, "p50_ms": lat[len(lat) // 2] * 1000, "p95_ms": lat[int(0.95 * (len(lat) - 1))] * 1000,
+        "completion_tokens": sum(r["completion_tokens"] for r in spend),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in spend),
+        "cost_usd": sum(r["cost_usd"] for r in spend), "prefetch": stats,
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rooms", type=int, default=5)
+    ap.add_argument("--questions", type=int, default=6, help="방마다 질문 수")
+    ap.add_argument("--read-s", type=float, default=1.5, help="답을 읽는 시간")
+    ap.add_argument("--latency-ms", type=float, default=400)
+    ap.add_argument("--tokens-per-sec", type=float, default=80)
+    ap.add_argument("--count", type=int, default=3, help="GAME_PREFETCH_COUNT")
+    ap.add_argument("--seed", type=int, default=3)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.rooms, args.questions, args.read_s, args.latency_ms, args.tokens_per_sec, args.seed)
+        return
+
+    print(f"{args.rooms} rooms x {args.questions} questions, read {args.read_s:g} s, mock {args.latency_ms:g} ms "
+          f"+ {args.tokens_per_sec:g} tokens/s, prefetch {args.count} per reply")
+    print(f"{'prefetch':<8} {'mean_ms':>7} {'p50_ms':>7} {'p95_ms':>7} {'hit_ratio':>9} {'hits':>5} {'waited':>6} {'wasted':>6} "
+          f"{'tokens':>7} {'cost_usd':>9} {'extra_usd':>9}")
+    for mode in ("0", "1"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--rooms", str(args.rooms),
+             "--questions", str(args.questions), "--read-s", str(args.read_s), "--latency-ms", str(args.latency_ms),
+             "--tokens-per-sec", str(args.tokens_per_sec), "--seed", str(args.seed)],
+            env={**os.environ, "GAME_PREFETCH": mode, "GAME_PREFETCH_COUNT": str(args.count), "GAME_SESSION_DB": "",
+                 "GAME_CASSETTE": ""},
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        p = r["prefetch"]
+        print(f"{'on' if mode == '1' else 'off':<8} {r['mean_ms']:>7.0f} {r['p50_ms']:>7.0f} {r['p95_ms']:>7.0f} {p['hit_ratio']:>9.0%} "
+              f"{p['hits']:>5} {p['waited']:>6} {p['wasted']:>6} {r['prompt_tokens'] + r['completion_tokens']:>7} "
+              f"{r['cost_usd']:>9.4f} {p['extra_cost_usd']:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
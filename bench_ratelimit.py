@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+# --------------------------------
+# 공급자 속도 제한 시뮬레이션: python bench_ratelimit.py
+# 목 서버가 분당 요청/토큰 한도(--rpm/--tpm)를 강제하고, 넘으면 429 를 준다.
+# 플레이어 N명(세션 N개)이 동시에 들어와 방마다 질문을 던진다 (답을 --read-s 초 읽고 다음 질문).
+# 첫 질문은 모두 같은 방에 같은 질문을 던져 (흔한 시작) 같은 요청이 동시에 나가는 상황을 만든다.
+# GAME_SCHEDULER 를 끈/켠 하위 프로세스에서 성공/실패 턴, 서버가 준 429 수, 실제 나간 요청 수,
+# 합친 요청 수, 턴 지연(p50/p95), 대기열 대기(p95/최대), 세션 간 공정성(플레이어별 평균 지연 최소/최대)을 비교한다.
+# 응답 캐시/의미 캐시는 끄고 (합치기 효과만 보려고) 폴백 모델은 쓰지 않는다.
+# --------------------------------
+QUESTIONS = ["그 시각에 어디 있었어?", "알리바이를 말해 봐", "누가 거짓말을 하고 있지?", "피해자와는 어떤 관계였어?",
+             "범인이 누구라고 생각해?", "C는 어떻게 생각해?", "E랑은 아는 사이야?", "고무장갑은 누구 거야?"]
+FIRST_QUESTION = "너 범인이야?"
+
+
+def child(players: int, questions: int, read_s: float, rpm: float, tpm: float, latency_ms: float,
+          stream: bool, seed: int):
+    from game_mock_server import MockConfig, serve
+
+    server = serve(MockConfig(latency_ms=latency_ms, latency_dist="fixed", tokens_per_sec=0, seed=seed,
+                              rpm_limit=rpm, tpm_limit=tpm), port=0, background=True)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from game_engine import interrogate
+    from game_metrics import METRICS, current_session
+    from game_policy import TurnFailed
+    from game_scenario import load_scenario
+    from game_scheduler import SCHEDULER, queue_listener
+
+    scenario = load_scenario()
+    start = threading.Barrier(players)
+    results = {}
+
+    def player(i: int):
+        current_session.set(f"player-{i}")
+        rng = random.Random(seed * 1000 + i)
+        rooms = {rid: {"messages": [], "model": []} for rid in scenario.room_ids}
+        positions = []
+        queue_listener.set(positions.append)
+        lat, failed = [], 0
+        start.wait()
+        for n in range(questions):
+            room_id = scenario.room_ids[0] if n == 0 else rng.choice(scenario.room_ids)
+            query = FIRST_QUESTION if n == 0 else rng.choice(QUESTIONS)
+            t0 = time.perf_counter()
+            try:
+                interrogate(rooms, room_id, query, use_cache=False, scenario_id=scenario.id,
+                            on_partial=(lambda md: None) if stream else None)
+            except TurnFailed:
+                failed += 1
+            else:
+                lat.append(time.perf_counter() - t0)
+            time.sleep(read_s)
+        results[i] = {"lat": lat, "failed": failed, "max_position": max(positions, default=0)}
+
+    threads = [threading.Thread(target=player, args=(i,)) for i in range(players)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    lat = sorted(x for r in results.values() for x in r["lat"])
+    per_player = [sum(r["lat"]) / len(r["lat"]) for r in results.values() if r["lat"]]
+    waits = [r for r in METRICS.latency_table() if r["span"] == "queue_wait"]
+    report = SCHEDULER.report() if SCHEDULER is not None else {}
+    print(json.dumps({
+        "ok": len(lat), "failed": sum(r["failed"] for r in results.values()), "elapsed_s": elapsed,
+        "upstream": server.backend.stats["requests"], "rate_limited": server.backend.stats["rate_limited"],
+        "coalesced": report.get("coalesced", 0), "queue_timeouts": report.get("timeouts", 0),
+        "p50_ms": lat[len(lat) // 2] * 1000 if lat else 0.0,
+        "p95_ms": lat[int(0.95 * (len(lat) - 1))] * 1000 if lat else 0.0,
+        "wait_p95_ms": max((r["p95_ms"] for r in waits), default=0.0),
+        "wait_max_ms": max((r["max_ms"] for r in waits), default=0.0),
+        "max_position": max(r["max_position"] for r in results.values()),
+        "player_min_ms": min(per_player, default=0.0) * 1000, "player_max_ms": max(per_player, default=0.0) * 1000,
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", type=int, default=12)
+    ap.add_argument("--questions", type=int, default=5, help="플레이어마다 질문 수")
+    ap.add_argument("--read-s", type=float, default=0.5, help="답을 읽는 시간")
+    ap.add_argument("--rpm", type=float, default=60, help="목 서버 분당 요청 한도")
+    ap.add_argument("--tpm", type=float, default=120_000, help="목 서버 분당 토큰 한도")
+    ap.add_argument("--latency-ms", type=float, default=300)
+    ap.add_argument("--max-wait", type=float, default=30, help="GAME_RATE_MAX_WAIT")
+    ap.add_argument("--stream", action="store_true", help="스트리밍 심문 (합친 스트림 경로)")
+    ap.add_argument("--seed", type=int, default=5)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.players, args.questions, args.read_s, args.rpm, args.tpm, args.latency_ms, args.stream, args.seed)
+        return
+
+    print(f"{args.players} players x {args.questions} questions, mock limit {args.rpm:g} rpm / {args.tpm:g} tpm, "
+          f"{'streamed' if args.stream else 'non-streamed'} turns")
+    print(f"{'scheduler':<9} {'ok':>4} {'failed':>6} {'429s':>5} {'upstream':>8} {'coalesced':>9} {'p50_ms':>7} "
+          f"{'p95_ms':>7} {'wait_p95':>8} {'wait_max':>8} {'position':>8} {'player_ms(min/max)':>19} {'elapsed_s':>9}")
+    for mode in ("0", "1"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--players", str(args.players),
+             "--questions", str(args.questions), "--read-s", str(args.read_s), "--rpm", str(args.rpm),
+             "--tpm", str(args.tpm), "--latency-ms", str(args.latency_ms), "--seed", str(args.seed)]
+            + (["--stream"] if args.stream else []),
+            env={**os.environ, "GAME_SCHEDULER": mode, "GAME_RATE_RPM": str(args.rpm), "GAME_RATE_TPM": str(args.tpm),
+                 "GAME_RATE_MAX_WAIT": str(args.max_wait), "GAME_FALLBACK_MODEL": "", "GAME_SESSION_DB": "",
+                 "GAME_CASSETTE": "", "GAME_PREFETCH": "0", "GAME_BACKEND": "openai"},
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{'on' if mode == '1' else 'off':<9} {r['ok']:>4} {r['failed']:>6} {r['rate_limited']:>5} {r['upstream']:>8} "
+              f"{r['coalesced']:>9} {r['p50_ms']:>7.0f} {r['p95_ms']:>7.0f} {r['wait_p95_ms']:>8.0f} "
+              f"{r['wait_max_ms']:>8.0f} {r['max_position']:>8} {r['player_min_ms']:>9.0f}/{r['player_max_ms']:<9.0f} "
+              f"{r['elapsed_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime
+
+# --------------------------------
+# 재실행(rerun) 시간 측정: python bench_rerun.py
+# 용의자 방들에 메시지를 N개 채워 두고 스크립트 한 번 재실행하는 데 걸리는 시간을 잰다.
+# 모델 호출은 하지 않는다 (입력 없이 다시 그리기만).
+# --question: 질문 하나를 보낼 때의 전체 스크립트 실행 횟수와 시간 (목 서버 필요).
+# --------------------------------
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_game.py")
+
+
+def _fake_rooms(rooms: dict, total: int) -> dict:
+    suspect_rooms = [rid for rid in rooms if rid.startswith("room ")]
+    for i in range(total):
+        rid = suspect_rooms[i % len(suspect_rooms)]
+        ts = datetime.now().isoformat()
+        if i % 2 == 0:
+            rooms[rid]["messages"].append({"role": "user", "content": f"{i}번째 질문, 그 시각에 어디 있었지?", "ts": ts})
+        else:
+            rooms[rid]["messages"].append({
+                "role": "assistant", "speaker": rid[-1], "ts": ts,
+                "content": f"**난 아니다**. {i}번째 대답도 같다. 그 시각엔 밖에 있었다.",
+            })
+    return rooms
+
+
+def open_app(room: str = "room A") -> AppTest:
+    # 앱을 띄우고 용의자 방 하나를 연 상태로 돌려준다
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    at.radio(key="active_room").set_value(room).run()
+    return at
+
+
+def measure(total: int, runs: int = 5) -> float:
+    at = open_app()
+    at.session_state["rooms"] = _fake_rooms(at.session_state["rooms"], total)
+    at.run()  # 워밍업
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - t0)
+        assert not at.exception, at.exception
+    return statistics.median(times)
+
+
+def measure_question(total: int, questions: int = 5) -> tuple[float, float]:
+    # 질문 하나당 (전체 스크립트 실행 횟수, 벽시계 시간). OPENAI_BASE_URL 로 목 서버를 가리킬 것.
+    # 전체 실행은 st.set_page_config 호출 수로 센다 (프래그먼트 재실행은 이걸 부르지 않는다).
+    import streamlit as st
+
+    calls = {"n": 0}
+    original = st.set_page_config
+
+    def counting(*args, **kwargs):
+        calls["n"] += 1
+        return original(*args, **kwargs)
+
+    st.set_page_config = counting
+    try:
+        at = open_app()
+        at.session_state["rooms"] = _fake_rooms(at.session_state["rooms"], total)
+        at.run()
+        calls["n"] = 0
+        t0 = time.perf_counter()
+        for i in range(questions):
+            at.chat_input(key="chat_input_room A").set_value(f"질문 {i}").run()
+            assert not at.exception, at.exception
+        wall = time.perf_counter() - t0
+    finally:
+        st.set_page_config = original
+    return calls["n"] / questions, wall / questions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="0,50,200,500,1000")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--question", action="store_true", help="질문 한 번의 실행 횟수/시간 측정 (목 서버 필요)")
+    args = ap.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+    if args.question:
+        print(f"{'messages':>8} {'script_runs':>11} {'ms/question':>11}")
+        for total in sizes:
+            runs, wall = measure_question(total)
+            print(f"{total:>8} {runs:>11.1f} {wall * 1000:>11.1f}")
+        return
+    print(f"{'messages':>8} {'rerun_ms':>9}")
+    for total in sizes:
+        print(f"{total:>8} {measure(total, args.runs) * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# --------------------------------
+# 다중 사용자 점검: python bench_sessions.py --sessions 200
+# 세션 N개를 AppTest 로 한 프로세스에 띄워 두고(Streamlit 서버가 세션을 들고 있는 것과 같다),
+# 세션마다 용의자 방을 돌며 질문한 뒤 프로세스 RSS, 세션 상태 크기, 재실행 지연을 잰다.
+# 모델은 로컬 목 서버가 대신한다. 모드마다 하위 프로세스에서 돈다:
+#   single : 기본 설정 (세션 예산 없음)
+#   multi  : GAME_MULTIUSER=1 (--budget-kb 예산, --idle-s 동안 쉰 세션은 디스크로 내림)
+# --------------------------------
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_game.py")
+QUESTIONS = ["범인이 누구야?", "그 시각에 어디 있었어?", "D에 대해 어떻게 생각해?", "E는 뭘 알고 있지?",
+             "너 범인이야?", "알리바이를 말해 봐"]
+MODES = {"single": {"GAME_MULTIUSER": "0"}, "multi": {"GAME_MULTIUSER": "1"}}
+
+
+def _rss_mb() -> float:
+    # 현재 상주 메모리 (최대치가 아니라 지금 값)
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def child(sessions: int, questions: int, sample: int):
+    from game_mock_server import MockConfig, serve
+
+    server = serve(MockConfig(latency_ms=5, latency_dist="fixed", tokens_per_sec=0, seed=1), port=0, background=True)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from streamlit.testing.v1 import AppTest
+
+    from game_scenario import load_scenario
+    from game_session import SESSION_POOL, deep_size
+
+    rooms = load_scenario().room_ids
+    apps, turn_lat = [], []
+    rss0 = _rss_mb()
+    t_start = time.perf_counter()
+    for i in range(sessions):
+        at = AppTest.from_file(APP, default_timeout=60).run()
+        for q in range(questions):
+            at.radio(key="active_room").set_value(rooms[(i + q) % len(rooms)]).run()
+            t0 = time.perf_counter()
+            at.chat_input[0].set_value(QUESTIONS[(i * 7 + q) % len(QUESTIONS)]).run()
+            turn_lat.append(time.perf_counter() - t0)
+            assert not at.exception, at.exception
+        apps.append(at)
+    build_s = time.perf_counter() - t_start
+
+    # 만들어 둔 세션 중 일부를 다시 실행: 최근 세션(메모리에 있음)과 오래된 세션(내려갔으면 디스크에서 읽음)
+    rerun = {"recent": [], "oldest": []}
+    for name, picked in (("recent", apps[-sample:]), ("oldest", apps[:sample])):
+        for at in picked:
+            t0 = time.perf_counter()
+            at.run()
+            rerun[name].append(time.perf_counter() - t0)
+            assert not at.exception, at.exception
+            assert any(m["role"] == "assistant" for m in at.session_state["rooms"][at.radio(key="active_room").value]["messages"])
+    state_kb = [deep_size(at.session_state["rooms"]) / 1024 for at in apps]
+    turn_lat.sort()
+    print(json.dumps({
+        "sessions": sessions, "build_s": build_s, "rss_mb": _rss_mb(), "rss_delta_mb": _rss_mb() - rss0,
+        "state_kb_mean": statistics.mean(state_kb), "state_kb_max": max(state_kb),
+        "turn_p50_ms": turn_lat[len(turn_lat) // 2] * 1000, "turn_p95_ms": turn_lat[int(0.95 * (len(turn_lat) - 1))] * 1000,
+        "rerun_recent_ms": statistics.median(rerun["recent"]) * 1000,
+        "rerun_oldest_ms": statistics.median(rerun["oldest"]) * 1000,
+        "pool": SESSION_POOL.report() if SESSION_POOL is not None else None,
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--questions", type=int, default=6, help="세션당 질문 수")
+    ap.add_argument("--sample", type=int, default=20, help="재실행 지연을 잴 세션 수")
+    ap.add_argument("--budget-kb", type=int, default=64)
+    ap.add_argument("--idle-s", type=float, default=10)
+    ap.add_argument("--modes", default="single,multi")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.sessions, args.questions, args.sample)
+        return
+
+    print(f"{args.sessions} sessions x {args.questions} questions, budget {args.budget_kb} KB, idle {args.idle_s:g} s")
+    print(f"{'mode':<7} {'RSS_MB':>7} {'ΔRSS_MB':>8} {'state_KB':>9} {'max_KB':>7} {'turn_p50':>9} {'turn_p95':>9} "
+          f"{'rerun_recent':>12} {'rerun_oldest':>12}  pool")
+    for mode in args.modes.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, **MODES[mode], "GAME_SESSION_DB": os.path.join(tmp, "sessions.db"),
+                   "GAME_SESSION_BUDGET_KB": str(args.budget_kb), "GAME_SESSION_IDLE_S": str(args.idle_s)}
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", "--sessions", str(args.sessions),
+                 "--questions", str(args.questions), "--sample", str(args.sample)],
+                env=env, capture_output=True, text=True,
+            )
+        if out.returncode:
+            print(out.stderr[-2000:])
+            raise SystemExit(out.returncode)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:<7} {r['rss_mb']:>7.0f} {r['rss_delta_mb']:>8.0f} {r['state_kb_mean']:>9.1f} "
+              f"{r['state_kb_max']:>7.1f} {r['turn_p50_ms']:>9.0f} {r['turn_p95_ms']:>9.0f} "
+              f"{r['rerun_recent_ms']:>12.0f} {r['rerun_oldest_ms']:>12.0f}  {r['pool'] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
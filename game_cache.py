@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --------------------------------
+# 응답 캐시 (opt-in)
+# 키 = (시나리오, 용의자, 정규화된 질문, 최근 히스토리 창 해시).
+# 메모리 LRU/TTL 1단 + (선택) SQLite 2단, 2단은 세션/프로세스 간 공유된다.
+# temperature 샘플링 다양성을 위해 키마다 변형 K개를 모은 뒤에야 적중으로 치고,
+# 적중 시 K개를 돌아가며 내준다.
+# --------------------------------
+CACHE_ENABLED = os.getenv("GAME_RESPONSE_CACHE", "0") == "1"
+CACHE_SIZE = int(os.getenv("GAME_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("GAME_CACHE_TTL", "3600"))
+CACHE_VARIANTS = int(os.getenv("GAME_CACHE_VARIANTS", "3"))
+CACHE_WINDOW = int(os.getenv("GAME_CACHE_WINDOW", "2"))
+CACHE_DB = os.getenv("GAME_CACHE_DB", "")
+
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    # "범인이 누구야?!" / "범인이  누구야" → "범인이 누구야"
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _PUNCT.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def history_window_hash(model: list[dict], window: int = CACHE_WINDOW) -> str:
+    # 방금 추가된 질문을 뺀 직전 window 개 메시지(system 제외)만 본다
+    body = [m for m in model[:-1] if m["role"] != "system"]
+    recent = body[-window:] if window > 0 else []
+    h = hashlib.sha1()
+    for m in recent:
+        h.update(m["role"].encode())
+        h.update(b"\0")
+        h.update((m.get("content") or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def cache_key(scenario_id: str, suspect: str, query: str, model: list[dict], window: int = CACHE_WINDOW) -> str:
+    return "|".join([scenario_id, suspect, normalize_question(query), history_window_hash(model, window)])
+
+
+class _DiskTier:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT NOT NULL, variant INTEGER NOT NULL, raw TEXT NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (key, variant))"
+        )
+        self._conn.commit()
+
+    def load(self, key: str, ttl: float) -> tuple[list[str], float]:
+        # (변형들, 가장 오래된 변형의 저장 시각)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT raw, created FROM response_cache WHERE key = ? AND created >= ? ORDER BY variant",
+                (key, time.time() - ttl),
+            ).fetchall()
+        return [r[0] for r in rows], min((r[1] for r in rows), default=0.0)
+
+    def store(self, key: str, variant: int, raw: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, variant, raw, created) VALUES (?, ?, ?, ?)",
+                (key, variant, raw, time.time()),
+            )
+            self._conn.commit()
+
+
+class ResponseCache:
+    def __init__(self, enabled: bool = CACHE_ENABLED, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL,
+                 variants: int = CACHE_VARIANTS, db_path: str = CACHE_DB):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._cursor: dict[str, int] = {}
+        self._disk = _DiskTier(db_path) if db_path else None
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def _variants_for(self, key: str) -> tuple[list[str], str, float | None]:
+        # (변형들, 적중한 층, 저장 시각). 메모리 항목은 처음 저장된 시각을 유지해 TTL 이 늘어나지 않는다
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._mem.move_to_end(key)
+                return entry[1], "memory", entry[0]
+            self._mem.pop(key, None)
+        if self._disk is None:
+            return [], "", None
+        found, created = self._disk.load(key, self.ttl)
+        if not found:
+            return [], "disk", None
+        self._remember(key, found, created)  # 디스크 행의 시각 그대로 (곧 만료될 행에 새 TTL 을 주지 않는다)
+        return found, "disk", created
+
+    def _remember(self, key: str, variants: list[str], created: float | None = None):
+        with self._lock:
+            self._mem[key] = (time.time() if created is None else created, variants)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                old, _ = self._mem.popitem(last=False)
+                self._cursor.pop(old, None)
+
+    def get(self, key: str) -> str | None:
+        variants, tier, _ = self._variants_for(key)
+        with self._lock:
+            # 변형이 K개 모일 때까지는 새로 생성하게 둔다
+            if len(variants) < self.variants:
+                self._stats["misses"] += 1
+                return None
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            self._stats["hits"] += 1
+            self._stats[f"{tier}_hits"] += 1
+            return variants[i % len(variants)]
+
+    def put(self, key: str, raw: str):
+        variants, _, created = self._variants_for(key)
+        if raw in variants or len(variants) >= self.variants:
+            return
+        variants = [*variants, raw]
+        self._remember(key, variants, created)
+        if self._disk is not None:
+            self._disk.store(key, len(variants) - 1, raw)
+        with self._lock:
+            self._stats["stores"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._mem)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+
+RESPONSE_CACHE = ResponseCache()
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from game_metrics import METRICS
+
+# --------------------------------
+# 녹화/재생(카세트) 모델 백엔드
+# GAME_CASSETTE=record : 실제 모델을 부르고 요청/응답 쌍을 카세트에 쓴다
+#              replay : 카세트에서만 답한다 (API 키/네트워크 불필요). 없는 요청은 CassetteMiss
+#              auto   : 있으면 재생, 없으면 모델을 불러 녹화
+# 요청 키 = (messages, model, temperature, response_format 등) 의 sha256. timeout/stream 여부는 키에 넣지 않으므로
+# 스트리밍으로 녹화한 답을 비스트리밍으로 재생할 수 있다 (반대도 같다).
+# 카세트는 SQLite 파일 하나, 응답 본문은 zlib 으로 압축한다. 재생 때 GAME_CASSETTE_LATENCY_MS 만큼 지연을 흉내 낸다.
+# 재생 응답의 usage 는 녹화 당시 값이다 (토큰 비교용. 실제 비용은 들지 않는다).
+# --------------------------------
+CASSETTE_MODE = os.getenv("GAME_CASSETTE", "")
+CASSETTE_PATH = os.getenv("GAME_CASSETTE_PATH", "game_cassette.db")
+CASSETTE_LATENCY_MS = float(os.getenv("GAME_CASSETTE_LATENCY_MS", "0"))
+CASSETTE_MODES = ("record", "replay", "auto")
+
+_KEY_IGNORED = ("timeout", "stream", "stream_options")
+_REPLAY_CHUNK = 8  # 재생 스트리밍 조각 크기 (글자)
+
+
+class CassetteMiss(LookupError):
+    # replay 모드에서 녹화되지 않은 요청. 재시도해도 같으므로 호출 정책은 바로 TurnFailed 로 끝낸다.
+    def __init__(self, key: str, model: str, question: str):
+        super().__init__(f"카세트에 없는 요청 {key[:12]} (model={model}, 질문={question!r})")
+        self.key = key
+
+
+def request_key(messages: list[dict], params: dict) -> str:
+    body = {"messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+            **{k: v for k, v in params.items() if k not in _KEY_IGNORED}}
+    return hashlib.sha256(json.dumps(body, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _question(messages: list[dict]) -> str:
+    # 미스 보고용: 마지막 사용자 메시지 앞부분
+    for m in reversed(messages):
+        if m["role"] == "user":
+            return m["content"][:60]
+    return ""
+
+
+class CassetteStore:
+    def __init__(self, path: str = CASSETTE_PATH, latency_ms: float = CASSETTE_LATENCY_MS):
+        self.path = path
+        self.latency = latency_ms / 1000
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cassette ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, question TEXT NOT NULL, body BLOB NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self._misses: deque = deque(maxlen=50)
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM cassette WHERE key = ?", (key,)).fetchone()
+            self._stats["hits" if row else "misses"] += 1
+        METRICS.add("cassette_hits" if row else "cassette_misses")
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, key: str, messages: list[dict], entry: dict):
+        body = zlib.compress(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cassette (key, model, question, body, created) VALUES (?, ?, ?, ?, ?)",
+                (key, entry["model"], _question(messages), body, time.time()),
+            )
+            self._stats["recorded"] += 1
+        METRICS.add("cassette_recorded")
+
+    def miss(self, key: str, messages: list[dict], model: str) -> CassetteMiss:
+        error = CassetteMiss(key, model, _question(messages))
+        with self._lock:
+            self._misses.append({"key": key[:12], "model": model, "question": _question(messages),
+                                 "messages": len(messages)})
+        return error
+
+    def report(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM cassette"
+            ).fetchone()
+            out = {"path": self.path, "entries": entries, "body_kb": round(size / 1024, 1), **self._stats,
+                   "recent_misses": list(self._misses)}
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+
+def _entry(content: str, usage, model: str) -> dict:
+    return {"content": content, "usage": usage.model_dump() if usage is not None else None, "model": model}
+
+
+def _completion(key: str, entry: dict) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": f"cassette-{key[:12]}", "object": "chat.completion", "created": int(time.time()),
+        "model": entry["model"], "usage": entry["usage"],
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": entry["content"]}}],
+    })
+
+
+class ReplayStream:
+    # 녹화된 답을 SDK 스트림처럼 조각(ChatCompletionChunk)으로 흘려보낸다
+    def __init__(self, key: str, entry: dict, include_usage: bool):
+        self._key, self._entry, self._include_usage = key, entry, include_usage
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def _chunk(self, delta: dict, finish=None, usage=None) -> ChatCompletionChunk:
+        return ChatCompletionChunk.model_validate({
+            "id": f"cassette-{self._key[:12]}", "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": self._entry["model"], "usage": usage,
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+        })
+
+    def __iter__(self):
+        content = self._entry["content"] or ""
+        for i in range(0, len(content), _REPLAY_CHUNK):
+            yield self._chunk({"content": content[i:i + _REPLAY_CHUNK]})
+        yield self._chunk({}, "stop")
+        if self._include_usage and self._entry["usage"]:
+            yield self._chunk({}, usage=self._entry["usage"])
+
+
+class RecordingStream:
+    # 실제 SDK 스트림을 그대로 넘겨주면서 내용을 모았다가, 끝까지 받으면 카세트에 쓴다
+    def __init__(self, inner, on_done):
+        self._inner, self._on_done = inner, on_done
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._inner.close()
+
+    def __iter__(self):
+        parts, usage, model = [], None, ""
+        for chunk in self._inner:
+            model = chunk.model or model
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        self._on_done(_entry("".join(parts), usage, model))
+
+
+class _Completions:
+    def __init__(self, store: CassetteStore, inner, mode: str):
+        self._store, self._inner, self._mode = store, inner, mode
+
+    def _lookup(self, messages: list[dict], params: dict) -> tuple[str, dict | None]:
+        key = request_key(messages, params)
+        if self._mode == "record":
+            return key, None
+        entry = self._store.get(key)
+        if entry is None and self._mode == "replay":
+            raise self._store.miss(key, messages, params.get("model", ""))
+        return key, entry
+
+    def create(self, *, messages: list[dict], stream: bool = False, **params):
+        key, entry = self._lookup(messages, params)
+        if entry is not None:
+            if self._store.latency:
+                time.sleep(self._store.latency)
+            if stream:
+                return ReplayStream(key, entry, bool((params.get("stream_options") or {}).get("include_usage")))
+            return _completion(key, entry)
+        resp = self._inner.create(messages=messages, stream=stream, **params)
+        if stream:
+            return RecordingStream(resp, lambda e: self._store.put(key, messages, e))
+        self._store.put(key, messages, _entry(resp.choices[0].message.content, resp.usage, resp.model))
+        return resp
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, *, messages: list[dict], stream: bool = False, **params):
+        if stream:
+            raise ValueError("카세트는 비동기 스트리밍을 지원하지 않음")
+        key, entry = self._lookup(messages, params)
+        if entry is not None:
+            if self._store.latency:
+                await asyncio.sleep(self._store.latency)
+            return _completion(key, entry)
+        resp = await self._inner.create(messages=messages, **params)
+        self._store.put(key, messages, _entry(resp.choices[0].message.content, resp.usage, resp.model))
+        return resp
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class CassetteClient:
+    # OpenAI / AsyncOpenAI 자리에 끼우는 클라이언트. chat.completions.create 만 흉내 낸다.
+    # replay 모드에선 inner 가 None 이어도 된다.
+    def __init__(self, inner, store: CassetteStore, mode: str, is_async: bool = False):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"알 수 없는 카세트 모드: {mode!r} (가능: {CASSETTE_MODES})")
+        self._inner, self._is_async = inner, is_async
+        inner_completions = inner.chat.completions if inner is not None else None
+        self.chat = _Chat((_AsyncCompletions if is_async else _Completions)(store, inner_completions, mode))
+
+    def close(self):
+        # AsyncOpenAI.close() 는 코루틴이므로 비동기판은 항상 코루틴을 돌려준다 (close_clients 참고)
+        if self._inner is not None:
+            return self._inner.close()
+        return asyncio.sleep(0) if self._is_async else None
+
+
+CASSETTE = CassetteStore() if CASSETTE_MODE else None
@@ -0,0 +1,231 @@
+import asyncio
+import os
+import threading
+from functools import lru_cache
+from dataclasses import dataclass, asdict
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from game_cassette import CASSETTE, CASSETTE_MODE, CassetteClient
+from game_local import BACKEND, BACKENDS, get_local_client
+from game_scheduler import SCHEDULER, ScheduledClient
+
+# --------------------------------
+# 공용 OpenAI 클라이언트 레지스트리
+# 프로세스 전체(모든 세션, 모든 용의자 방)가 설정별로 클라이언트 하나를 공유한다.
+# Streamlit 은 스크립트만 다시 실행하고 import 된 모듈은 유지하므로
+# 모듈 전역 레지스트리가 st.cache_resource 와 같은 역할을 한다.
+# GAME_CASSETTE 가 설정되면 녹화/재생 클라이언트로 감싼다 (replay 는 실제 클라이언트를 만들지 않는다).
+# GAME_BACKEND=local 이면 OpenAI 대신 프로세스 안 추론 클라이언트(game_local)를 쓴다.
+# GAME_SCHEDULER=1 이면 실제 클라이언트를 공용 스케줄러(game_scheduler: 속도 제한/공정 대기열/요청 합치기)로 감싼다.
+# 카세트는 그 바깥이라 재생/녹화 적중은 대기열을 거치지 않는다.
+# --------------------------------
+def _env_int(name: str, default: int) -> int:
+    v = os.getenv(name)
+    return int(v) if v else default
+
+
+def _env_float(name: str, default: float) -> float:
+    v = os.getenv(name)
+    return float(v) if v else default
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    base_url: str | None = None        # None 이면 OPENAI_BASE_URL / 기본 엔드포인트
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    max_retries: int = 0               # SDK 내장 재시도 (재시도는 game_policy 가 맡으므로 기본은 끔)
+
+    @classmethod
+    def from_env(cls) -> "ClientConfig":
+        return cls(
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            max_connections=_env_int("GAME_HTTP_MAX_CONNECTIONS", cls.max_connections),
+            max_keepalive=_env_int("GAME_HTTP_MAX_KEEPALIVE", cls.max_keepalive),
+            keepalive_expiry=_env_float("GAME_HTTP_KEEPALIVE_EXPIRY", cls.keepalive_expiry),
+            connect_timeout=_env_float("GAME_HTTP_CONNECT_TIMEOUT", cls.connect_timeout),
+            read_timeout=_env_float("GAME_HTTP_READ_TIMEOUT", cls.read_timeout),
+            max_retries=_env_int("GAME_MAX_RETRIES", cls.max_retries),
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+
+class ConnectionStats:
+    # 요청 수 대비 새 TCP/TLS 연결 수 → 재사용률 확인용 카운터
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+
+    def _trace(self, event_name: str, info: dict):
+        # httpcore trace 확장: 연결을 새로 열 때만 connect_tcp / start_tls 이벤트가 온다
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def _atrace(self, event_name: str, info: dict):
+        self._trace(event_name, info)
+
+    def on_request(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def on_request_async(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._atrace  # 비동기 전송은 코루틴 trace 만 받는다
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reused": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            }
+
+
+@lru_cache(maxsize=1)
+def default_config() -> ClientConfig:
+    # 환경 설정은 처음 한 번만 읽는다 (load_dotenv 이후 첫 호출 시점)
+    return ClientConfig.from_env()
+
+
+_lock = threading.Lock()
+_clients: dict[ClientConfig, OpenAI] = {}
+_async_clients: dict[ClientConfig, AsyncOpenAI] = {}
+_stats: dict[ClientConfig, ConnectionStats] = {}
+
+
+if BACKEND not in BACKENDS:
+    raise ValueError(f"알 수 없는 GAME_BACKEND: {BACKEND!r} (가능: {BACKENDS})")
+
+
+def _stats_for(config: ClientConfig) -> ConnectionStats:
+    if config not in _stats:
+        _stats[config] = ConnectionStats()
+    return _stats[config]
+
+
+def get_client(config: ClientConfig | None = None) -> OpenAI:
+    config = config or default_config()
+    client = _clients.get(config)
+    if client is not None:
+        return client
+    with _lock:
+        if config not in _clients:
+            if CASSETTE_MODE == "replay":
+                client = None
+            elif BACKEND == "local":
+                client = get_local_client()
+            else:
+                stats = _stats_for(config)
+                http_client = httpx.Client(
+                    limits=config.limits(),
+                    timeout=config.timeout(),
+                    event_hooks={"request": [stats.on_request]},
+                )
+                client = OpenAI(
+                    base_url=config.base_url,
+                    max_retries=config.max_retries,
+                    timeout=config.timeout(),
+                    http_client=http_client,
+                )
+            if client is not None and SCHEDULER is not None:
+                client = ScheduledClient(client, SCHEDULER)
+            _clients[config] = CassetteClient(client, CASSETTE, CASSETTE_MODE) if CASSETTE_MODE else client
+        return _clients[config]
+
+
+# --------------------------------
+# 비동기 클라이언트 + 공용 이벤트 루프
+# AsyncOpenAI 의 커넥션 풀은 만들어진 루프에 묶이므로, 백그라운드 스레드에서 도는
+# 루프 하나를 프로세스 전체가 공유하고 코루틴은 submit() 으로 넘긴다.
+# --------------------------------
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="game-async-loop", daemon=True).start()
+        return _loop
+
+
+def submit(coro):
+    # 공용 루프에서 코루틴을 실행하고 concurrent.futures.Future 를 돌려준다
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop())
+
+
+def get_async_client(config: ClientConfig | None = None) -> AsyncOpenAI:
+    # 공용 루프 안(submit 된 코루틴)에서만 사용할 것
+    config = config or default_config()
+    client = _async_clients.get(config)
+    if client is not None:
+        return client
+    with _lock:
+        if config not in _async_clients:
+            if CASSETTE_MODE == "replay":
+                client = None
+            elif BACKEND == "local":
+                client = get_local_client().aio
+            else:
+                stats = _stats_for(config)
+                http_client = httpx.AsyncClient(
+                    limits=config.limits(),
+                    timeout=config.timeout(),
+                    event_hooks={"request": [stats.on_request_async]},
+                )
+                client = AsyncOpenAI(
+                    base_url=config.base_url,
+                    max_retries=config.max_retries,
+                    timeout=config.timeout(),
+                    http_client=http_client,
+                )
+            if client is not None and SCHEDULER is not None:
+                client = ScheduledClient(client, SCHEDULER, is_async=True)
+            _async_clients[config] = (CassetteClient(client, CASSETTE, CASSETTE_MODE, is_async=True)
+                                      if CASSETTE_MODE else client)
+        return _async_clients[config]
+
+
+def connection_stats(config: ClientConfig | None = None) -> dict:
+    config = config or default_config()
+    with _lock:
+        stats = _stats_for(config)
+    return {**asdict(config), **stats.snapshot()}
+
+
+def close_clients():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        async_clients = list(_async_clients.values())
+        _async_clients.clear()
+        _stats.clear()
+    for client in async_clients:
+        submit(client.close()).result()
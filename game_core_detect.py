@@ -0,0 +1,261 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+from game_scenario import DEFAULT_SCENARIO, Suspect, load_scenario
+
+# --------------------------------
+# 로컬 핵심 진술 감지
+# 모델의 utterance_type 대신, 답변 평문을 용의자의 핵심 진술 + 패러프레이즈와
+# 문장 단위 문자 bigram 포함률로 비교해 어느 핵심 진술을 말했는지 점수와 함께 돌려준다.
+# 포함률만 보면 부정/인용도 걸리므로 ("D가 했다는 증거는 없다", "E가 한 거다? 웃기지 마")
+# 같은 문장 안에서 구절 뒤에 부정어가 오거나("-다고 생각하지 않는다", "-다고 말한 적 없다"),
+# 따옴표 안이거나, 꾸미는 절(-다는)이거나, 되묻는 문장이면 뺀다.
+# 주어도 본다: 구절의 인물(나/C/D…)이 같은 역할(주어/목적어/…)로 문장에 있어야 하고,
+# 구절 앞에서 가장 가까운 주어가 구절의 주어여야 한다 ("D는 죽이지 않았다" ≠ "나는 죽이지 않았다",
+# "나는 D가 죽이지 않았다고 들었다" 의 서술어 주어는 D).
+# 모델 호출 없음. 답변 하나당 수십 마이크로초 수준.
+# --------------------------------
+CORE_THRESHOLD = 0.8
+
+_SENTENCE = re.compile(r"[^.!?。…\n]+[.!?。…\n]*")
+_SENTENCE_SPLIT = re.compile(r"[.!?。…\n]+")
+_NON_WORD = re.compile(r"[^\w]")
+_QUOTED = re.compile(r"[\"“”「『][^\"“”「」『』]*[\"“”」』]")  # 따옴표 안은 남의 말
+# 구절 뒤(같은 문장)에 오면 진술을 뒤집는 말 (공백/문장부호 뺀 형태로 본다)
+_NEGATION = re.compile(r"않|없|아니|아냐|아닌|아닐|못|안했|안한|안해|안죽|안믿|거짓|웃기지|말도안|모르|모른|몰라")
+_BARE_NEGATION = {"안", "못"}  # 띄어 쓴 "안 믿는다" — 붙인 형태에서는 "안" 만으로 찾을 수 없다
+_AFFIRMATIVE = re.compile(r"틀림없|어김없|빠짐없|다름없")  # 없 이 들어가도 긍정
+_EMBEDDED = re.compile(r"^(는|라는|던)")  # "D가 했다는 증거", "범인은 D라는 소문" — 꾸미는 절
+_QUESTION_END = re.compile(r"[냐니까]$")  # "내가 했겠냐" 같은 반문은 물음표가 붙어도 진술
+# 인물 표시: 1인칭 대명사 낱말 → 역할, 이름(영문 한 글자) 뒤 조사 → 역할
+_PRONOUNS = {
+    "나는": "subj", "난": "subj", "나도": "subj", "나만": "subj", "내가": "subj",
+    "저는": "subj", "전": "subj", "저도": "subj", "저만": "subj", "제가": "subj",
+    "날": "obj", "나를": "obj", "저를": "obj", "내": "of", "제": "of", "나의": "of", "저의": "of",
+    "나랑": "with", "저랑": "with", "나와": "with", "저와": "with", "나한테": "to", "저한테": "to",
+    "나에게": "to", "저에게": "to", "나": "bare", "저": "bare",
+}
+_PARTICLES = {
+    "가": "subj", "이": "subj", "는": "subj", "은": "subj", "도": "subj", "만": "subj", "께서": "subj",
+    "를": "obj", "을": "obj", "의": "of", "랑": "with", "이랑": "with", "와": "with", "과": "with",
+    "하고": "with", "한테": "to", "에게": "to", "": "bare",
+}
+_NAME = re.compile(r"^([a-z])([^a-z0-9]*)$")
+
+
+def _compact(text: str) -> str:
+    # NFKC + 소문자 + 공백/문장부호 제거 → "난 아니다." == "난아니다"
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def _bigrams(text: str) -> frozenset[str]:
+    t = _compact(text)
+    if len(t) < 2:
+        return frozenset([t]) if t else frozenset()
+    return frozenset(t[i:i + 2] for i in range(len(t) - 1))
+
+
+def _words(text: str) -> list[tuple[int, str]]:
+    # [(압축 문자열에서의 시작 위치, 압축한 낱말)]
+    out, offset = [], 0
+    for word in text.split():
+        w = _compact(word)
+        if w:
+            out.append((offset, w))
+            offset += len(w)
+    return out
+
+
+def _mentions(words: list[tuple[int, str]]) -> list[tuple[int, str, str]]:
+    # [(위치, 인물, 역할)] — 인물은 "1"(1인칭) 또는 이름 글자
+    out = []
+    for offset, w in words:
+        if w in _PRONOUNS:
+            out.append((offset, "1", _PRONOUNS[w]))
+        elif (m := _NAME.match(w)) is not None:
+            out.append((offset, m.group(1), _PARTICLES.get(m.group(2), "other")))
+    return out
+
+
+class _Phrase:
+    __slots__ = ("core", "grams", "last", "spans", "negated", "question", "marks", "subject")
+
+    def __init__(self, core: int, phrase: str):
+        compact = _compact(phrase)
+        self.core, self.grams = core, _bigrams(phrase)
+        self.last = compact[-2:]                                     # 문장에서 구절이 끝나는 자리 찾기용
+        self.spans = len([p for p in _SENTENCE_SPLIT.split(phrase) if p.strip()])  # "E? 몰라" 는 두 문장
+        self.negated = bool(_NEGATION.search(_AFFIRMATIVE.sub("", compact)))
+        self.question = bool(_QUESTION_END.search(compact))
+        mentions = _mentions(_words(phrase))
+        self.marks = frozenset((who, role) for _, who, role in mentions)
+        subjects = [who for _, who, role in mentions if role == "subj"]
+        self.subject = subjects[-1] if subjects else None
+
+
+class _Sentence:
+    __slots__ = ("compact", "grams", "question", "mentions", "marks", "bare")
+
+    def __init__(self, text: str):
+        text = _QUOTED.sub(" ", text)
+        self.compact, self.grams = _compact(text), _bigrams(text)
+        self.question = text.rstrip().endswith("?")
+        words = _words(text)
+        self.mentions = _mentions(words)
+        self.marks = frozenset((who, role) for _, who, role in self.mentions)
+        self.bare = [offset for offset, w in words if w in _BARE_NEGATION]
+
+
+class CoreDetector:
+    def __init__(self, suspect: Suspect, threshold: float = CORE_THRESHOLD):
+        self.suspect = suspect
+        self.threshold = threshold
+        # 핵심 진술별 구절 — 원문 + 패러프레이즈
+        self._phrases: list[_Phrase] = []
+        for i, core in enumerate(suspect.core):
+            paraphrases = suspect.paraphrases[i] if i < len(suspect.paraphrases) else ()
+            for phrase in (core, *paraphrases):
+                if _compact(phrase):
+                    self._phrases.append(_Phrase(i, phrase))
+
+    @staticmethod
+    def _asserted(phrase: _Phrase, sent: _Sentence) -> bool:
+        # 문장이 구절을 그대로 주장하는가 (부정/인용/되묻기가 아닌가)
+        if sent.question and not phrase.question:
+            return False  # "E가 한 거다?" — 상대 말을 되묻는 것
+        if not phrase.marks <= sent.marks:
+            return False  # 구절의 인물이 없거나 역할이 다르다 ("B도" ≠ "C도", "D는" ≠ "나는")
+        end = sent.compact.rfind(phrase.last) if phrase.last else -1
+        stop = end if end >= 0 else len(sent.compact)
+        if phrase.subject is not None:
+            subjects = [who for offset, who, role in sent.mentions if role == "subj" and offset < stop]
+            if not subjects or subjects[-1] != phrase.subject:
+                return False  # 서술어의 주어가 다른 인물 ("나는 D가 죽이지 않았다고")
+        if end < 0:
+            # 구절 끝이 문장에 없음 (부분 일치): 구절에 없는 부정어가 문장에 있으면 뺀다
+            return phrase.negated or not (_NEGATION.search(_AFFIRMATIVE.sub("", sent.compact)) or sent.bare)
+        tail = end + len(phrase.last)
+        if any(offset >= tail for offset in sent.bare):
+            return False  # "D가 죽였다고 하는데 난 안 믿는다"
+        tail = sent.compact[tail:]
+        return not (_EMBEDDED.search(tail) or _NEGATION.search(_AFFIRMATIVE.sub("", tail)))
+
+    def scores(self, text: str) -> list[float]:
+        # 핵심 진술별 최고 점수 = max(문장, 구절) |구절 ∩ 문장| / |구절| (주장하는 문장만)
+        # "E? 몰라" 처럼 구절 안에 문장부호가 있으면 이웃한 두 문장을 이은 것과 비교한다.
+        best = [0.0] * len(self.suspect.core)
+        parts = [p for p in _SENTENCE.findall(text) if _compact(p)]
+        by_spans = {1: [_Sentence(p) for p in parts], 2: [_Sentence(a + b) for a, b in zip(parts, parts[1:])]}
+        for phrase in self._phrases:
+            need = len(phrase.grams)
+            for sent in by_spans.get(phrase.spans, ()):
+                score = len(phrase.grams & sent.grams) / need
+                if score > best[phrase.core] and self._asserted(phrase, sent):
+                    best[phrase.core] = score
+        return best
+
+    def detect(self, text: str) -> list[tuple[int, float]]:
+        # [(핵심 진술 번호, 점수)] — 임계값 이상만
+        return [(i, s) for i, s in enumerate(self.scores(text)) if s >= self.threshold]
+
+
+@lru_cache(maxsize=None)
+def get_detector(scenario_id: str, suspect: str) -> CoreDetector:
+    return CoreDetector(load_scenario(scenario_id).suspects[suspect])
+
+
+def detect_core_statements(text: str, suspect: str, scenario_id: str = DEFAULT_SCENARIO) -> list[tuple[int, float]]:
+    return get_detector(scenario_id, suspect).detect(text)
+
+
+def unlock(room: dict, hits: list[tuple[int, float]]) -> list[int]:
+    # 방에서 확보한 핵심 진술 번호를 누적한다 (room["unlocked"], 정렬된 list)
+    unlocked = set(room.get("unlocked", []))
+    unlocked.update(i for i, _ in hits)
+    room["unlocked"] = sorted(unlocked)
+    return room["unlocked"]
+
+
+# --------------------------------
+# 벤치마크: python game_core_detect.py
+# 라벨이 달린 답변으로 정밀도/재현율과 답변당 지연을 잰다.
+# --------------------------------
+LABELED_REPLIES = [
+    ("A", "난 아니다. C도 아니라고 본다. D가 했다.", {0, 2}),
+    ("A", "내가 한 건 아니다. C는 그 시각 현장에 없었다. 범인은 D 쪽이다.", {0}),
+    ("A", "C는 무고야. 그건 확실하다.", {1}),
+    ("A", "그날 밤엔 밖에 있었다. 더 할 말 없다.", set()),
+    ("A", "내 소행 아니다. 범인은 D야.", {0, 2}),
+    ("B", "내가 범인은 아니다. D는 알리바이가 있다.", {0, 1}),
+    ("B", "E가 정황을 알고 있다고 들었습니다.", {2}),
+    ("B", "확인해 보겠습니다. 지금은 말씀드리기 어렵네요.", set()),
+    ("B", "D도 죽이지 않았다. 기록을 보시죠.", {1}),
+    ("C", "난 아니지. E? 몰라.", {0, 1}),
+    ("C", "D가 했지. 그날 D가 수상했어.", {2}),
+    ("C", "나랑 무슨 상관인데.", set()),
+    ("C", "내가 했겠냐? 웃기지 마.", {0}),
+    ("D", "난 아니다. 내 기록 보면 안다.", {0}),
+    ("D", "E가 한 거다. A가 날 모함했다.", {1, 2}),
+    ("D", "순찰 태깅 기록이 다 남아 있습니다.", set()),
+    ("D", "그 말, 사실 아냐. E가 가장 유력하다.", {1, 2}),
+    ("E", "제가 한 건 아니에요. B가 한 것 같아요.", {0, 1}),
+    ("E", "C랑 오래 봤어요.", {2}),
+    ("E", "죄송해요, 잘 모르겠어요.", set()),
+    ("E", "전 아니라고요... 같은 커뮤니티에서 계속 마주쳤어요.", {0, 2}),
+    # 부정/인용/되묻기 — 구절 bigram 은 다 들어 있어도 진술이 아니다
+    ("A", "D가 했다는 증거는 없다.", set()),
+    ("A", "나는 D가 죽였다고 생각하지 않는다.", set()),
+    ("A", "나는 죽이지 않았다고 말한 적 없다.", set()),
+    ("A", "C는 무고야? 누가 그래?", set()),
+    ("A", "범인은 D야. 그건 틀림없다.", {2}),
+    ("B", "D는 알리바이가 있다고들 하지만 난 모르겠다.", set()),
+    ("C", "\"D가 했지\" 라고들 하더라. 난 몰라.", set()),
+    ("D", "E가 한 거다? 웃기지 마, 난 그런 말 안 했다.", set()),
+    ("D", "E가 한 거다. 난 D가 아니라 E를 봤다.", {1}),
+    ("E", "B가 한 것 같아요? 전혀 아니에요.", set()),
+    ("E", "C랑 오래 봤어요. 그건 사실이에요.", {2}),
+    # 주어 바꾸기 — 구절 bigram 대부분이 같아도 다른 인물의 이야기다
+    ("A", "D는 죽이지 않았다.", set()),
+    ("A", "E는 죽이지 않았다.", set()),
+    ("A", "B도 죽이지 않았다.", set()),
+    ("A", "D 소행 아니다. 범인은 E야.", set()),
+    ("B", "E는 죽이지 않았다.", set()),
+    ("C", "E가 죽였다.", set()),
+    ("D", "A가 죽였다. 내 기록 보면 안다.", {0}),
+    ("E", "D가 죽였다. C는 오래 못 봤어요.", set()),
+    # 전해 들은 말 — 서술어의 주어가 다르거나 믿지 않는다고 하면 진술이 아니다
+    ("B", "나는 D가 죽이지 않았다고 들었다.", set()),
+    ("C", "D가 죽였다고 하는데 난 안 믿는다.", set()),
+    ("A", "누가 C도 죽이지 않았다고 하던데 난 모른다.", set()),
+    ("E", "B가 그러는데 D가 죽였대요.", set()),
+    ("D", "A가 내가 죽였다고 말한 것은 거짓말이다.", {2}),
+    ("A", "나는 D가 죽였다고 들었다.", {2}),
+]
+
+
+def _bench(rounds: int = 2000):
+    import time
+
+    tp = fp = fn = 0
+    for suspect, text, expected in LABELED_REPLIES:
+        got = {i for i, _ in detect_core_statements(text, suspect)}
+        tp += len(got & expected)
+        fp += len(got - expected)
+        fn += len(expected - got)
+        if got != expected:
+            print(f"  mismatch {suspect}: {text!r} expected={sorted(expected)} got={sorted(got)}")
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    print(f"labeled={len(LABELED_REPLIES)} precision={precision:.2f} recall={recall:.2f}")
+
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for suspect, text, _ in LABELED_REPLIES:
+            detect_core_statements(text, suspect)
+    per = (time.perf_counter() - t0) / (rounds * len(LABELED_REPLIES))
+    print(f"latency: {per * 1e6:.1f} us/reply")
+
+
+if __name__ == "__main__":
+    _bench()
@@ -0,0 +1,354 @@
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from game_cache import RESPONSE_CACHE, cache_key, history_window_hash
+from game_client import get_async_client, get_client, submit
+from game_history import HistoryManager, history_entry
+from game_metrics import METRICS, current_session
+from game_policy import FALLBACK_MODEL, POLICY
+from game_prefetch import PREFETCH, predict_questions
+from game_prompts import OUTPUT_FORMAT, PREFIX_CACHE, suspect_prompt
+from game_schema import VALIDATION, InvalidReply, repair_reply, response_format, validate_reply
+from game_scenario import DEFAULT_SCENARIO, load_scenario
+from game_scheduler import queue_listener
+from game_semantic import SEMANTIC
+from game_text import (CompactTextStreamParser, JsonListStreamParser, MarkdownRunBuilder, compact_payload,
+                       expand_compact, tokens_to_markdown)
+
+# --------------------------------
+# 모델 호출 (용의자 공통 심문 엔진)
+# rooms 는 st.session_state.rooms 와 같은 {room_id: {"messages": [...], "model": [...]}} 구조.
+# Streamlit 에 의존하지 않으므로 앱과 헤드리스 도구가 같은 경로를 탄다.
+# --------------------------------
+MODEL_PARAMS = dict(
+    model=os.getenv("GAME_MODEL", "gpt-4o"),  # OpenAI 호환 로컬 서버면 서버 쪽 모델 이름
+    response_format={"type": "json_object"},  # 호출 때 스키마 모드로 바뀐다 (game_schema.response_format)
+    max_tokens=512,
+    top_p=1,
+    frequency_penalty=1,
+    presence_penalty=1,
+)
+
+
+# 호출 등급: 기본 모델 → (회로가 열리거나 재시도가 소진되면) 폴백 모델
+MODEL_TIERS = [MODEL_PARAMS["model"], *([FALLBACK_MODEL] if FALLBACK_MODEL and FALLBACK_MODEL != MODEL_PARAMS["model"] else [])]
+
+# 방별 히스토리 예산 (GAME_HISTORY_BUDGET / GAME_HISTORY_KEEP_TURNS)
+HISTORY = HistoryManager()
+
+
+def _stream_completion(client, messages: list[dict], temperature: float, on_partial, params: dict,
+                       timeout: float | None = None, labels: dict | None = None) -> tuple[str, object]:
+    if OUTPUT_FORMAT == "compact":
+        parser, builder = CompactTextStreamParser(), None
+    else:
+        parser, builder = JsonListStreamParser(), MarkdownRunBuilder()
+    t0, first = time.perf_counter(), True
+    usage = None
+    with client.chat.completions.create(
+        messages=messages, temperature=temperature, stream=True,
+        stream_options={"include_usage": True}, timeout=timeout, **params
+    ) as stream:
+        # httpx 타임아웃은 읽기 한 번 기준이라, 조금씩 흘러나오는 스트림은 전체 마감 시간을 따로 본다
+        # (스케줄러 대기열에서 기다린 시간은 빼고, 스트림이 열린 뒤부터 잰다)
+        deadline = time.monotonic() + timeout if timeout else None
+        for chunk in stream:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("스트리밍 응답 마감 시간 초과")
+            if chunk.usage is not None:
+                usage = chunk.usage  # include_usage: 마지막 청크에만 실린다
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first:
+                METRICS.observe("llm_first_token", (time.perf_counter() - t0) * 1000, **(labels or {}))
+                first = False
+            if builder is None:
+                md = parser.feed(delta)  # compact: text 필드가 자란 만큼의 마크다운
+                if md is not None:
+                    on_partial(md)
+                continue
+            words = parser.feed(delta)
+            if words:
+                for tok in words:
+                    builder.push(tok)
+                on_partial(builder.markdown)
+    return parser.text, usage
+
+
+# --------------------------------
+# 턴 트랜잭션
+# 질문 추가/히스토리 접기는 방의 사본(work)에서 하고, 답을 받아 파싱까지 끝난 뒤에만
+# 방에 반영한다 (_finish_turn). 호출이 실패하면 방의 model/summary 는 손대지 않은 그대로다.
+# --------------------------------
+def _prepare_turn(rooms: dict, room_id: str, query: str, scenario_id: str):
+    suspect = load_scenario(scenario_id).suspect_for_room(room_id)
+    if suspect is None:
+        raise KeyError(f"용의자 방이 아님: {room_id}")
+
+    # --- 모델 히스토리 준비 (사본) ---
+    room = rooms[room_id]
+    work = {"model": list(room["model"])}
+    if "summary" in room:
+        work["summary"] = copy.deepcopy(room["summary"])
+    if not work["model"]:
+        work["model"] = [
+            {"role": "system", "content": suspect_prompt(scenario_id, suspect.id)}
+        ]
+    work["model"].append(
+        {"role": "user", "content": f"심문 : {query}"}
+    )
+    # 예산 초과 시 오래된 턴을 요약으로 접는다
+    HISTORY.fold(work)
+    return room, work, suspect
+
+
+def _parse_reply(raw_json: str | None, suspect) -> dict:
+    with METRICS.span("json_parse", suspect=suspect.id):
+        return expand_compact(json.loads(raw_json or ""))
+
+
+def _checked_reply(raw_json: str | None, suspect, reasked: bool = False) -> tuple[str, dict]:
+    # 파싱 + 스키마 검사. 어긋나면 로컬 수리한 (raw, payload), 못 고치면 InvalidReply.
+    # 깨진 JSON 은 JSONDecodeError → 호출 정책이 다시 샘플링한다.
+    # 검사 결과는 답 하나당 한 번만 센다 (다시 물은 답은 reasked / failed).
+    try:
+        payload = _parse_reply(raw_json, suspect)
+    except json.JSONDecodeError:
+        VALIDATION.record(suspect.id, "failed", ["json 파싱 실패"])
+        raise
+    errors = validate_reply(payload, suspect.id)
+    if not errors:
+        VALIDATION.record(suspect.id, "reasked" if reasked else "ok")
+        return raw_json, payload
+    try:
+        fixed = repair_reply(payload, suspect.id)
+    except InvalidReply as e:
+        if reasked:
+            VALIDATION.record(suspect.id, "failed", e.errors)
+        raise
+    VALIDATION.record(suspect.id, "reasked" if reasked else "repaired", errors)
+    if OUTPUT_FORMAT == "compact":
+        return json.dumps(compact_payload(fixed), ensure_ascii=False), fixed
+    return json.dumps(fixed, ensure_ascii=False), fixed
+
+
+REASK_PROMPT = "[형식 오류] 직전 답이 출력 형식을 어겼다 ({errors}). 같은 내용을 형식에 맞는 JSON 하나로만 다시 출력하라."
+
+
+def _reask_messages(work: dict, raw_json: str | None, error: InvalidReply) -> list[dict]:
+    # 한 번만 다시 묻는다. 이 두 메시지는 방 히스토리에 남기지 않는다.
+    return [*work["model"], {"role": "assistant", "content": raw_json or ""},
+            {"role": "user", "content": REASK_PROMPT.format(errors=error)}]
+
+
+def _reasked(raw_json: str | None, suspect) -> tuple[str, dict]:
+    try:
+        return _checked_reply(raw_json, suspect, reasked=True)
+    except json.JSONDecodeError as e:
+        raise InvalidReply(["json 파싱 실패"]) from e
+
+
+def _finish_turn(room: dict, work: dict, suspect, raw_json: str, usage, payload: dict) -> dict:
+    PREFIX_CACHE.record(suspect.id, usage)
+    METRICS.record_usage(suspect.id, usage)
+    work["model"].append(
+        {"role": "assistant", "content": history_entry(raw_json, payload)}
+    )
+    # 커밋: 사본을 방에 반영
+    room["model"] = work["model"]
+    if "summary" in work:
+        room["summary"] = work["summary"]
+    return payload
+
+
+def _cached_reply(work: dict, suspect, query: str, scenario_id: str, use_cache: bool | None):
+    # (캐시 키, 적중한 raw_json) — 캐시를 안 쓰면 (None, None)
+    # 정확히 같은 질문이 없으면 같은 맥락의 의미상 비슷한 질문 답을 찾아본다.
+    if not (RESPONSE_CACHE.enabled if use_cache is None else use_cache):
+        return None, None
+    key = cache_key(scenario_id, suspect.id, query, work["model"])
+    cached = RESPONSE_CACHE.get(key)
+    if cached is None:
+        similar = SEMANTIC.lookup(scenario_id, suspect.id, history_window_hash(work["model"]), query)
+        if similar is not None:
+            cached = similar[1]
+    return key, cached
+
+
+def _remember_reply(work: dict, suspect, query: str, scenario_id: str, key: str, raw_json: str):
+    # 어시스턴트 답을 히스토리에 붙이기 전에 호출해야 맥락 해시가 조회 때와 같다
+    RESPONSE_CACHE.put(key, raw_json)
+    SEMANTIC.remember(scenario_id, suspect.id, history_window_hash(work["model"]), query, raw_json)
+
+
+def _generate(work: dict, suspect, scenario_id: str, temperature: float, on_partial=None,
+              labels: dict | None = None, deadline: float | None = None) -> tuple[str, dict, object]:
+    # 모델을 불러 검사/수리까지 마친 (raw_json, payload, usage). 방 상태는 건드리지 않는다.
+    # deadline: 이번 턴에 남은 시간 (None 이면 턴 마감 시간 전체)
+    client = get_client()  # 프로세스 공용 클라이언트 (커넥션 풀 재사용)
+    labels = labels or {"suspect": suspect.id}
+
+    def attempt(model: str, timeout: float):
+        params = {**MODEL_PARAMS, "model": model, "response_format": response_format(scenario_id)}
+        if on_partial is None:
+            with METRICS.span("llm_call", mode="sync", model=model, **labels):
+                resp = client.chat.completions.create(
+                    messages=work["model"], temperature=temperature, timeout=timeout, **params
+                )
+            raw = resp.choices[0].message.content  # JSON 문자열
+            usage = resp.usage
+        else:
+            with METRICS.span("llm_call", mode="stream", model=model, **labels):
+                raw, usage = _stream_completion(client, work["model"], temperature, on_partial, params,
+                                                timeout, labels)
+        try:
+            return (*_checked_reply(raw, suspect), usage)
+        except InvalidReply as e:
+            METRICS.record_usage(suspect.id, usage)  # 버린 생성도 비용으로 센다
+            with METRICS.span("llm_call", mode="reask", model=model, **labels):
+                resp = client.chat.completions.create(
+                    messages=_reask_messages(work, raw, e), temperature=0, timeout=timeout, **params
+                )
+            return (*_reasked(resp.choices[0].message.content, suspect), resp.usage)
+
+    return POLICY.call(MODEL_TIERS, attempt, deadline)
+
+
+def interrogate(rooms: dict, room_id: str, query: str, temperature: float = 0.5,
+                on_partial=None, scenario_id: str = DEFAULT_SCENARIO, use_cache: bool | None = None) -> dict:
+    # room_id 로 용의자를 찾아 한 턴 심문한다.
+    # on_partial(md) 가 주어지면 스트리밍으로 받아 단어가 도착할 때마다 호출한다.
+    # 최종 반환값은 비스트리밍 경로와 같은 전체 JSON 이다.
+    # use_cache=None 이면 GAME_RESPONSE_CACHE 설정을 따른다.
+    # 재시도/폴백까지 모두 실패하면 TurnFailed (방 상태는 그대로).
+    room, work, suspect = _prepare_turn(rooms, room_id, query, scenario_id)
+    end = time.monotonic() + POLICY.deadline  # 미리 만든 답을 기다린 시간도 턴 마감 시간에 넣는다
+    prefetched = PREFETCH.take(room_id, room, query, timeout=POLICY.deadline)
+    key, cached = None, None
+    if prefetched is None:  # 미리 만든 답을 쓰면 캐시는 보지 않는다 (변형 회전/적중률이 어긋나지 않게)
+        key, cached = _cached_reply(work, suspect, query, scenario_id, use_cache)
+    if prefetched is not None or cached is not None:
+        if prefetched is not None:
+            raw_json, payload = prefetched  # 비용은 미리 만들 때 이미 잡았다
+        else:
+            METRICS.add("cache_hits", suspect=suspect.id)
+            raw_json, payload = cached, _parse_reply(cached, suspect)
+        if on_partial is not None:
+            on_partial(tokens_to_markdown(payload.get("json_list", [])))
+        return _finish_turn(room, work, suspect, raw_json, None, payload)
+    raw_json, payload, usage = _generate(work, suspect, scenario_id, temperature, on_partial,
+                                         {"room": room_id, "suspect": suspect.id}, end - time.monotonic())
+    if key is not None:
+        _remember_reply(work, suspect, query, scenario_id, key, raw_json)
+    return _finish_turn(room, work, suspect, raw_json, usage, payload)
+
+
+def prefetch(rooms: dict, room_id: str, temperature: float = 0.5, scenario_id: str = DEFAULT_SCENARIO) -> list[str]:
+    # 방금 답한 방의 다음 질문 후보를 미리 생성한다 (GAME_PREFETCH). 방 히스토리 사본마다 따로 부른다.
+    # 미리 만든 질문 목록을 돌려준다 (꺼져 있으면 빈 목록).
+    if not PREFETCH.enabled:
+        return []
+    suspect = load_scenario(scenario_id).suspect_for_room(room_id)
+    questions = predict_questions(rooms[room_id], suspect)
+    jobs = []
+    for q in questions:
+        room, work, _ = _prepare_turn(rooms, room_id, q, scenario_id)
+
+        def job(work=work):
+            raw_json, payload, usage = _generate(work, suspect, scenario_id, temperature,
+                                                 labels={"room": room_id, "suspect": suspect.id, "prefetch": True})
+            PREFIX_CACHE.record(suspect.id, usage)
+            METRICS.record_usage(suspect.id, usage, prefetch=True)
+            return raw_json, payload, usage
+
+        jobs.append((q, job))
+    PREFETCH.schedule(room_id, rooms[room_id], suspect.id, jobs)
+    return questions
+
+
+# --------------------------------
+# 단체 심문: 같은 질문을 여러 용의자에게 동시에
+# 공용 이벤트 루프에서 AsyncOpenAI 로 병렬 호출하고, 끝나는 순서대로 돌려준다.
+# --------------------------------
+GROUP_CONCURRENCY = int(os.getenv("GAME_GROUP_CONCURRENCY", "5"))
+
+
+async def ainterrogate(rooms: dict, room_id: str, query: str, temperature: float = 0.5,
+                       scenario_id: str = DEFAULT_SCENARIO, use_cache: bool | None = None) -> dict:
+    room, work, suspect = _prepare_turn(rooms, room_id, query, scenario_id)
+    key, cached = _cached_reply(work, suspect, query, scenario_id, use_cache)
+    if cached is not None:
+        METRICS.add("cache_hits", suspect=suspect.id)
+        return _finish_turn(room, work, suspect, cached, None, _parse_reply(cached, suspect))
+
+    async def attempt(model: str, timeout: float):
+        params = {**MODEL_PARAMS, "model": model, "response_format": response_format(scenario_id)}
+        with METRICS.span("llm_call", mode="async", model=model, room=room_id, suspect=suspect.id):
+            resp = await get_async_client().chat.completions.create(
+                messages=work["model"], temperature=temperature, timeout=timeout, **params
+            )
+        raw = resp.choices[0].message.content
+        try:
+            return (*_checked_reply(raw, suspect), resp.usage)
+        except InvalidReply as e:
+            METRICS.record_usage(suspect.id, resp.usage)
+            with METRICS.span("llm_call", mode="reask", model=model, room=room_id, suspect=suspect.id):
+                resp = await get_async_client().chat.completions.create(
+                    messages=_reask_messages(work, raw, e), temperature=0, timeout=timeout, **params
+                )
+            return (*_reasked(resp.choices[0].message.content, suspect), resp.usage)
+
+    raw_json, payload, usage = await POLICY.acall(MODEL_TIERS, attempt)
+    if key is not None:
+        _remember_reply(work, suspect, query, scenario_id, key, raw_json)
+    return _finish_turn(room, work, suspect, raw_json, usage, payload)
+
+
+def group_interrogate(rooms: dict, room_ids: list[str], query: str, temperature: float = 0.5,
+                      scenario_id: str = DEFAULT_SCENARIO, max_concurrency: int = GROUP_CONCURRENCY,
+                      use_cache: bool | None = None, on_queue=None):
+    # (room_id, payload, error) 를 완료 순서대로 yield 한다. 각 답변은 해당 방 model 히스토리에 쌓인다.
+    # on_queue(room_id, 순번): 공용 스케줄러 대기열 순번이 바뀌면 호출한 쪽 스레드에서 불린다 (GAME_SCHEDULER)
+    sem = asyncio.Semaphore(max_concurrency)
+    session = current_session.get()  # 공용 루프 스레드에는 호출한 쪽 컨텍스트가 없으므로 넘겨준다
+    positions, lock = {}, threading.Lock()
+
+    def waiting(room_id: str):
+        def note(pos: int):
+            with lock:
+                positions[room_id] = pos
+        return note
+
+    async def one(room_id: str) -> dict:
+        current_session.set(session)
+        if on_queue is not None:
+            queue_listener.set(waiting(room_id))  # 루프 스레드에서는 UI 를 못 그리므로 순번만 적어 둔다
+        async with sem:
+            return await ainterrogate(rooms, room_id, query, temperature, scenario_id, use_cache)
+
+    def flush():
+        with lock:
+            changed = dict(positions)
+            positions.clear()
+        for room_id, pos in changed.items():
+            on_queue(room_id, pos)
+
+    futures = {submit(one(room_id)): room_id for room_id in room_ids}
+    remaining, poll = set(futures), 0.2 if on_queue is not None else None
+    while remaining:
+        done, remaining = wait(remaining, timeout=poll, return_when=FIRST_COMPLETED)
+        if on_queue is not None:
+            flush()
+        for fut in done:
+            try:
+                yield futures[fut], fut.result(), None
+            except Exception as e:
+                yield futures[fut], None, e
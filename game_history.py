@@ -0,0 +1,195 @@
+import json
+import os
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # 선택 의존성: 없으면 근사치로 센다
+    tiktoken = None
+
+from game_text import compact_payload, expand_compact
+
+# --------------------------------
+# 방별 모델 히스토리 관리
+# 시스템 프롬프트 + 최근 N턴은 그대로 두고, 예산을 넘으면 오래된 턴을
+# 요약 메시지 하나로 접는다 (지금까지 나온 핵심 진술 포함). 모델 호출은 하지 않는다.
+# --------------------------------
+HISTORY_TOKEN_BUDGET = int(os.getenv("GAME_HISTORY_BUDGET", "3000"))
+HISTORY_KEEP_TURNS = int(os.getenv("GAME_HISTORY_KEEP_TURNS", "6"))
+# 어시스턴트 답을 히스토리에 남기는 형식: compact(굵게 표시 평문 + 화자/발화 종류) | raw(받은 원문 그대로)
+HISTORY_FORMAT = os.getenv("GAME_HISTORY_FORMAT", "compact")
+
+SUMMARY_HEADER = "[이전 심문 요약]"
+MESSAGE_OVERHEAD = 4  # role/구분자 등 메시지당 고정 토큰
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")  # gpt-4o 토크나이저
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    # 근사: 한글은 대략 글자당 1토큰, 영문/기호는 4글자당 1토큰
+    hangul = sum(1 for ch in text if "가" <= ch <= "힣")
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+def message_tokens(messages: list[dict]) -> int:
+    return sum(count_tokens(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages)
+
+
+def history_entry(raw_json: str, payload: dict) -> str:
+    # 검사를 통과한 답 → 히스토리에 넣을 문자열. 단어 목록(json_list)은 화면용이라 다시 보내지 않는다
+    if HISTORY_FORMAT == "raw":
+        return raw_json
+    return json.dumps(compact_payload(payload), ensure_ascii=False, separators=(",", ":"))
+
+
+def _reply_text(raw: str) -> tuple[str, list[str]]:
+    # 어시스턴트 원문(JSON) → (평문, 핵심 진술 문구들)
+    try:
+        payload = expand_compact(json.loads(raw))
+    except (TypeError, ValueError):
+        return str(raw), []
+    if not isinstance(payload, dict):
+        return str(raw), []
+    words = [t for t in payload.get("json_list", []) if isinstance(t, dict)]
+    text = payload.get("combined_text_md")
+    if not isinstance(text, str) or not text:
+        text = " ".join(str(t.get("w", "")) for t in words)
+    text = text.replace("**", "").strip()
+    core = []
+    if payload.get("utterance_type") == "core":
+        bold = " ".join(str(t.get("w", "")) for t in words if t.get("bold"))
+        if bold:
+            core.append(bold)
+    return text, core
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _split_turns(messages: list[dict]) -> list[list[dict]]:
+    # user 로 시작하는 묶음 단위 턴으로 나눈다
+    turns: list[list[dict]] = []
+    for m in messages:
+        if m["role"] == "user" or not turns:
+            turns.append([m])
+        else:
+            turns[-1].append(m)
+    return turns
+
+
+class HistoryManager:
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET, keep_turns: int = HISTORY_KEEP_TURNS,
+                 answer_chars: int = 80, max_summary_lines: int = 20):
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.answer_chars = answer_chars
+        self.max_summary_lines = max_summary_lines
+
+    def fold(self, room: dict) -> bool:
+        # room["model"] 을 예산 안으로 줄인다. 접었으면 True
+        model = room["model"]
+        if not model or message_tokens(model) <= self.budget:
+            return False
+
+        system = model[0] if model[0]["role"] == "system" else None
+        body = [m for m in model[1 if system else 0:] if not _is_summary(m)]
+        turns = _split_turns(body)
+        if len(turns) <= self.keep_turns:
+            return False
+
+        old, recent = turns[:-self.keep_turns], turns[-self.keep_turns:]
+        summary = room.setdefault("summary", {"lines": [], "core": []})
+        for turn in old:
+            self._fold_turn(summary, turn)
+        # 요약 자체도 무한히 자라지 않게 오래된 줄부터 버린다 (핵심 진술은 유지)
+        del summary["lines"][:-self.max_summary_lines]
+
+        new_model = [system] if system else []
+        new_model.append({"role": "system", "content": render_summary(summary)})
+        for turn in recent:
+            new_model.extend(turn)
+        model[:] = new_model
+        return True
+
+    def _fold_turn(self, summary: dict, turn: list[dict]):
+        q, answers = "", []
+        for m in turn:
+            if m["role"] == "user":
+                q = m["content"].split(":", 1)[-1].strip()
+            elif m["role"] == "assistant":
+                text, core = _reply_text(m["content"])
+                answers.append(text)
+                for c in core:
+                    if c not in summary["core"]:
+                        summary["core"].append(c)
+        a = _clip(" ".join(answers), self.answer_chars)
+        summary["lines"].append(f"- Q: {_clip(q, self.answer_chars)} / A: {a}")
+
+
+def _is_summary(m: dict) -> bool:
+    return m["role"] == "system" and (m.get("content") or "").startswith(SUMMARY_HEADER)
+
+
+def render_summary(summary: dict) -> str:
+    parts = [SUMMARY_HEADER, *summary["lines"]]
+    if summary["core"]:
+        parts.append("[이미 말한 핵심 진술]")
+        parts.extend(f"- {c}" for c in summary["core"])
+    return "\n".join(parts)
+
+
+# --------------------------------
+# 벤치마크: python game_history.py
+# 합성 심문 60턴에서 턴별 프롬프트 토큰(전송량)과 접기 비용을 비교한다.
+# --------------------------------
+def _fake_reply(i: int) -> str:
+    words = [{"w": w, "bold": i % 7 == 0} for w in f"난 아니다 {i}번째 질문에도 같은 대답이다. 그 시각엔 밖에 있었다.".split()]
+    return json.dumps({
+        "json_list": words,
+        "speaker": "A",
+        "utterance_type": "core" if i % 7 == 0 else "normal",
+        "combined_text_md": " ".join(w["w"] for w in words),
+    }, ensure_ascii=False)
+
+
+def _bench(turns: int = 60, prefill_tok_per_s: float = 5000.0):
+    import time
+
+    system = {"role": "system", "content": "[진실팩] " + "사건 설정 " * 600}
+    before = {"model": [dict(system)]}
+    after = {"model": [dict(system)]}
+    manager = HistoryManager()
+    fold_time = 0.0
+    print(f"{'turn':>4} {'before_tok':>10} {'after_tok':>9} {'before_ms':>9} {'after_ms':>8}")
+    for i in range(1, turns + 1):
+        for room in (before, after):
+            room["model"].append({"role": "user", "content": f"심문 : {i}번째 질문, 그 시각에 어디 있었지?"})
+        t0 = time.perf_counter()
+        manager.fold(after)
+        fold_time += time.perf_counter() - t0
+        b, a = message_tokens(before["model"]), message_tokens(after["model"])
+        if i % 5 == 0 or i == 1:
+            # 프리필 지연 추정 = 프롬프트 토큰 / 프리필 속도
+            print(f"{i:>4} {b:>10} {a:>9} {b / prefill_tok_per_s * 1000:>9.1f} {a / prefill_tok_per_s * 1000:>8.1f}")
+        reply = _fake_reply(i)
+        for room in (before, after):
+            room["model"].append({"role": "assistant", "content": reply})
+    print(f"tokenizer: {'tiktoken' if _encoding() else 'approx'}, "
+          f"fold overhead: {fold_time / turns * 1e6:.1f} us/turn")
+
+
+if __name__ == "__main__":
+    _bench()
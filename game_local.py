@@ -0,0 +1,245 @@
+import asyncio
+import copy
+import os
+import threading
+import time
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+try:
+    import llama_cpp
+except ImportError:  # 선택 의존성: GAME_BACKEND=local 일 때만 필요
+    llama_cpp = None
+
+# --------------------------------
+# 모델 백엔드 선택
+# GAME_BACKEND=openai : OpenAI SDK (기본). OPENAI_BASE_URL 을 OpenAI 호환 로컬 서버
+#                       (llama.cpp server, vLLM, Ollama 등) 로 돌리면 그대로 로컬 추론이 된다.
+#                       모델 이름은 GAME_MODEL / GAME_FALLBACK_MODEL 로 서버 쪽 이름에 맞춘다.
+#              local  : 프로세스 안 CPU 추론 (llama-cpp-python + GGUF 양자화 모델, GAME_LOCAL_MODEL)
+# 프로세스 안 백엔드는 OpenAI 클라이언트 자리에 끼우는 LocalClient 로, chat.completions.create 만 흉내 낸다.
+#  - response_format 의 JSON 스키마를 llama.cpp 문법(GBNF)으로 바꿔 json_list/compact 형식을 디코딩 단계에서 강제한다
+#  - 모델 하나를 프로세스 전체가 공유하고 호출은 잠금으로 한 번에 하나씩 (CPU 는 어차피 동시에 못 돈다)
+#  - llama.cpp 는 직전 호출과 겹치는 프롬프트 앞부분의 KV 를 다시 계산하지 않는다. 모든 용의자 프롬프트가
+#    공유 프리픽스(game_prompts.shared_prefix)로 시작하므로 방을 옮겨 다녀도 그 부분은 재사용되고,
+#    GAME_LOCAL_CACHE_MB 만큼 RAM KV 캐시를 두면 방별 히스토리까지 복원한다. 재사용한 토큰 수는
+#    usage.prompt_tokens_details.cached_tokens 로 알려 주므로 프리픽스 캐시 적중 집계가 그대로 돈다.
+# 로컬 추론은 요금이 없으므로 비용 표를 쓰려면 GAME_PRICE_* 를 0 으로 둔다.
+# --------------------------------
+BACKEND = os.getenv("GAME_BACKEND", "openai")
+BACKENDS = ("openai", "local")
+LOCAL_MODEL_PATH = os.getenv("GAME_LOCAL_MODEL", "")
+LOCAL_CTX = int(os.getenv("GAME_LOCAL_CTX", "8192"))
+LOCAL_THREADS = int(os.getenv("GAME_LOCAL_THREADS", "0"))      # 0 이면 CPU 코어 수
+LOCAL_CACHE_MB = int(os.getenv("GAME_LOCAL_CACHE_MB", "512"))  # 0 이면 RAM KV 캐시 없음
+LOCAL_GRAMMAR = os.getenv("GAME_LOCAL_GRAMMAR", "1") == "1"    # 스키마 문법 강제 디코딩
+LOCAL_WARM = os.getenv("GAME_LOCAL_WARM", "1") == "1"          # 시작할 때 공유 프리픽스를 미리 계산
+
+_SAMPLING = ("temperature", "top_p", "max_tokens", "frequency_penalty", "presence_penalty")
+
+
+def local_response_format(response_format: dict | None) -> dict | None:
+    # OpenAI response_format → llama-cpp-python 형식. json_schema 는 문법으로 바뀌어 토큰 단위로 강제된다.
+    if not LOCAL_GRAMMAR or not response_format:
+        return None
+    if response_format.get("type") == "json_schema":
+        return {"type": "json_object", "schema": grammar_schema(response_format["json_schema"]["schema"])}
+    return {"type": "json_object"}
+
+
+def grammar_schema(schema: dict) -> dict:
+    # strict 모드가 못 나타내는 길이 제약(빈 답/빈 단어 금지, validate_reply 와 같은 규칙)을 문법에는 넣을 수 있다
+    out = copy.deepcopy(schema)
+    props = out.get("properties", {})
+    if "json_list" in props:
+        props["json_list"]["minItems"] = 1
+        props["json_list"]["items"]["properties"]["w"]["minLength"] = 1
+    if "text" in props:
+        props["text"]["minLength"] = 1
+    return out
+
+
+def _usage(prompt: int, completion: int, cached: int) -> dict:
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion,
+            "prompt_tokens_details": {"cached_tokens": cached}}
+
+
+class LocalStream:
+    # llama-cpp 스트림을 SDK 스트림처럼 ChatCompletionChunk 로 흘려보낸다.
+    # 다 읽거나 닫을 때까지 모델 잠금을 쥐고 있다 (엔진의 마감 시간 초과로 닫혀도 풀린다).
+    def __init__(self, completions: "_Completions", messages: list[dict], kwargs: dict, include_usage: bool):
+        self._completions, self._messages, self._kwargs = completions, messages, kwargs
+        self._include_usage = include_usage
+        self._gen = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._gen is not None:
+            self._gen.close()
+
+    def _run(self):
+        owner = self._completions
+        with owner.lock:
+            before = owner.snapshot()
+            parts, model, last = [], owner.model_name, None
+            for chunk in owner.llm.create_chat_completion(messages=self._messages, stream=True, **self._kwargs):
+                last = chunk
+                delta = chunk["choices"][0]["delta"] if chunk["choices"] else {}
+                if delta.get("content"):
+                    parts.append(delta["content"])
+                yield ChatCompletionChunk.model_validate({**chunk, "model": model})
+            if self._include_usage and last is not None:
+                # llama-cpp 스트림에는 usage 가 없으므로 끝난 뒤 KV 상태에서 계산한다
+                usage = owner.usage_after(before, None, owner.count("".join(parts)))
+                yield ChatCompletionChunk.model_validate({
+                    "id": last["id"], "object": "chat.completion.chunk", "created": last["created"],
+                    "model": model, "choices": [], "usage": usage,
+                })
+
+    def __iter__(self):
+        self._gen = self._run()
+        return self._gen
+
+
+class _Completions:
+    def __init__(self, llm, model_name: str):
+        self.llm, self.model_name = llm, model_name
+        self.lock = threading.Lock()
+
+    def snapshot(self) -> list[tuple]:
+        # 호출 직전에 재사용할 수 있는 토큰열: 현재 KV + RAM 캐시에 저장된 상태들
+        ids = [tuple(self.llm.input_ids[:self.llm.n_tokens].tolist())]
+        cache = self.llm.cache
+        if cache is not None and hasattr(cache, "cache_state"):
+            ids += list(cache.cache_state.keys())
+        return ids
+
+    def usage_after(self, before: list[tuple], prompt: int | None, completion: int) -> dict:
+        # 호출이 끝난 KV = 프롬프트 + 생성 토큰. 프롬프트 길이를 모르면(스트림) 생성 토큰 수로 역산한다 (±1)
+        ids = self.llm.input_ids[:self.llm.n_tokens].tolist()
+        if prompt is None:
+            prompt = max(len(ids) - completion, 0)
+        prompt_ids = ids[:prompt]
+        cached = max((llama_cpp.Llama.longest_token_prefix(prev, prompt_ids) for prev in before), default=0)
+        return _usage(prompt, completion, min(cached, prompt))
+
+    def count(self, content: str) -> int:
+        return len(self.llm.tokenize(content.encode("utf-8"), add_bos=False)) if content else 0
+
+    def _kwargs(self, params: dict) -> dict:
+        kwargs = {k: params[k] for k in _SAMPLING if params.get(k) is not None}
+        response_format = local_response_format(params.get("response_format"))
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        return kwargs
+
+    def create(self, *, messages: list[dict], stream: bool = False, stream_options: dict | None = None,
+               timeout: float | None = None, model: str | None = None, **params):
+        # model 은 무시한다 (불러 둔 GGUF 하나뿐). timeout 도 llama.cpp 생성을 중간에 끊을 수 없어 무시한다
+        # (스트리밍은 엔진이 마감 시간을 넘기면 스트림을 닫아 멈춘다).
+        messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+        kwargs = self._kwargs(params)
+        if stream:
+            return LocalStream(self, messages, kwargs, bool((stream_options or {}).get("include_usage")))
+        with self.lock:
+            before = self.snapshot()
+            resp = self.llm.create_chat_completion(messages=messages, **kwargs)
+            usage = self.usage_after(before, resp["usage"]["prompt_tokens"], resp["usage"]["completion_tokens"])
+        return ChatCompletion.model_validate({**resp, "model": self.model_name, "usage": usage})
+
+
+class _AsyncCompletions:
+    # 단체 심문용. 잠금 때문에 실제로는 한 번에 하나씩 돈다 (공용 루프는 막지 않는다)
+    def __init__(self, sync: _Completions):
+        self._sync = sync
+
+    async def create(self, *, messages: list[dict], stream: bool = False, **params):
+        if stream:
+            raise ValueError("로컬 백엔드는 비동기 스트리밍을 지원하지 않음")
+        return await asyncio.to_thread(self._sync.create, messages=messages, **params)
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+def load_llama(path: str = LOCAL_MODEL_PATH, n_ctx: int = LOCAL_CTX, n_threads: int = LOCAL_THREADS,
+               cache_mb: int = LOCAL_CACHE_MB):
+    if llama_cpp is None:
+        raise RuntimeError("GAME_BACKEND=local 에는 llama-cpp-python 이 필요함 (pip install llama-cpp-python)")
+    if not path or not os.path.exists(path):
+        raise RuntimeError(f"GAME_LOCAL_MODEL 에 GGUF 모델 경로가 필요함: {path!r}")
+    llm = llama_cpp.Llama(model_path=path, n_ctx=n_ctx, n_threads=n_threads or os.cpu_count(), verbose=False)
+    if cache_mb:
+        llm.set_cache(llama_cpp.LlamaRAMCache(capacity_bytes=cache_mb << 20))
+    return llm
+
+
+class LocalClient:
+    # OpenAI 클라이언트 자리에 끼우는 프로세스 안 추론 클라이언트. 동기/비동기판이 모델과 잠금을 함께 쓴다.
+    def __init__(self, llm, model_name: str = ""):
+        self.model_name = model_name or os.path.splitext(os.path.basename(getattr(llm, "model_path", "") or "local"))[0]
+        self._sync = _Completions(llm, self.model_name)
+        self.chat = _Chat(self._sync)
+        self.aio = _AsyncClient(self)
+        self.load_s = 0.0
+        self.warm_ms = 0.0
+
+    def warm(self, prefix: str):
+        # 공유 프리픽스를 한 번 계산해 KV 에 올려 둔다. 첫 심문도 프리픽스 이후만 계산한다.
+        t0 = time.perf_counter()
+        with self._sync.lock:
+            self._sync.llm.create_chat_completion(
+                messages=[{"role": "system", "content": prefix}, {"role": "user", "content": "."}], max_tokens=1,
+            )
+        self.warm_ms = (time.perf_counter() - t0) * 1000
+
+    def report(self) -> dict:
+        llm = self._sync.llm
+        cache = llm.cache
+        return {"model": self.model_name, "n_ctx": llm.n_ctx(), "kv_tokens": llm.n_tokens,
+                "ram_cache_entries": len(getattr(cache, "cache_state", {})) if cache is not None else 0,
+                "ram_cache_mb": round(cache.cache_size / 2 ** 20, 1) if cache is not None else 0,
+                "grammar": LOCAL_GRAMMAR, "load_s": round(self.load_s, 2), "warm_ms": round(self.warm_ms)}
+
+    def close(self):
+        pass
+
+
+class _AsyncClient:
+    def __init__(self, owner: LocalClient):
+        self.chat = _Chat(_AsyncCompletions(owner._sync))
+
+    def close(self):
+        return asyncio.sleep(0)  # AsyncOpenAI.close() 처럼 코루틴 (close_clients 참고)
+
+
+_lock = threading.Lock()
+_local: LocalClient | None = None
+
+
+def get_local_client() -> LocalClient:
+    # 모델은 처음 쓸 때 한 번만 올린다 (수백 MB~수 GB)
+    global _local
+    with _lock:
+        if _local is None:
+            from game_prompts import shared_prefix
+            from game_scenario import DEFAULT_SCENARIO
+
+            t0 = time.perf_counter()
+            client = LocalClient(load_llama())
+            client.load_s = time.perf_counter() - t0
+            if LOCAL_WARM:
+                client.warm(shared_prefix(DEFAULT_SCENARIO))
+            _local = client
+        return _local
+
+
+def local_report() -> dict | None:
+    return _local.report() if _local is not None else None
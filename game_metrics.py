@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --------------------------------
+# 계측 (지연/토큰/비용)
+# 스팬 = 이름 + 라벨(room, suspect 등) 별 소요 시간(ms). 최근 METRICS_WINDOW 개만 보관해 p50/p95 를 낸다.
+# 카운터 = 용의자별/세션별 토큰, 비용, 캐시 적중 등 누적 값.
+# 이벤트는 (설정 시) GAME_TRACE_FILE 에 JSONL 로 한 줄씩 남기고, Prometheus 텍스트로도 내보낼 수 있다.
+# 세션 id 는 current_session 에서 읽으므로 호출부마다 넘기지 않아도 된다.
+# --------------------------------
+TRACE_FILE = os.getenv("GAME_TRACE_FILE", "")
+METRICS_WINDOW = int(os.getenv("GAME_METRICS_WINDOW", "2048"))
+# USD / 1M 토큰 (기본값 gpt-4o)
+PRICE_INPUT = float(os.getenv("GAME_PRICE_INPUT", "2.5"))
+PRICE_CACHED = float(os.getenv("GAME_PRICE_CACHED", "1.25"))
+PRICE_OUTPUT = float(os.getenv("GAME_PRICE_OUTPUT", "10"))
+
+current_session: ContextVar[str] = ContextVar("game_session", default="")
+
+_TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return values[int(q * (len(values) - 1))]
+
+
+def usage_cost(prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+    fresh = prompt_tokens - cached_tokens
+    return (fresh * PRICE_INPUT + cached_tokens * PRICE_CACHED + completion_tokens * PRICE_OUTPUT) / 1e6
+
+
+class Metrics:
+    def __init__(self, window: int = METRICS_WINDOW, trace_path: str = TRACE_FILE):
+        self.window = window
+        self._lock = threading.Lock()
+        self._spans: dict[tuple[str, tuple], deque] = {}
+        self._span_totals: dict[tuple[str, tuple], list[float]] = {}  # [count, sum_ms] (창과 무관한 누적)
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._sessions: dict[str, dict] = {}
+        self._events: deque = deque(maxlen=window)
+        self._trace = open(trace_path, "a", encoding="utf-8", buffering=1) if trace_path else None
+
+    def _emit(self, event: dict):
+        # 호출부에서 self._lock 을 잡은 상태
+        self._events.append(event)
+        if self._trace is not None:
+            self._trace.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def observe(self, name: str, ms: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        session = current_session.get()
+        with self._lock:
+            samples = self._spans.get(key)
+            if samples is None:
+                samples = self._spans[key] = deque(maxlen=self.window)
+                self._span_totals[key] = [0, 0.0]
+            samples.append(ms)
+            totals = self._span_totals[key]
+            totals[0] += 1
+            totals[1] += ms
+            self._emit({"t": time.time(), "span": name, "ms": round(ms, 3), "session": session, **labels})
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - t0) * 1000, **labels)
+
+    def add(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_usage(self, suspect: str, usage, **labels):
+        # resp.usage → 용의자별/세션별 토큰과 비용 카운터
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        tokens = {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "completion_tokens": usage.completion_tokens or 0,
+            "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+        }
+        cost = usage_cost(**tokens)
+        session = current_session.get()
+        with self._lock:
+            for field, value in tokens.items():
+                key = (field, (("suspect", suspect),))
+                self._counters[key] = self._counters.get(key, 0) + value
+            key = ("cost_usd", (("suspect", suspect),))
+            self._counters[key] = self._counters.get(key, 0) + cost
+            row = self._sessions.setdefault(session, {"calls": 0, **dict.fromkeys(_TOKEN_FIELDS, 0), "cost_usd": 0.0})
+            row["calls"] += 1
+            for field, value in tokens.items():
+                row[field] += value
+            row["cost_usd"] += cost
+            self._emit({"t": time.time(), "usage": suspect, "session": session, **tokens,
+                        "cost_usd": round(cost, 6), **labels})
+
+    # ---- 조회 ----
+    def latency_table(self) -> list[dict]:
+        with self._lock:
+            items = [(k, sorted(v), self._span_totals[k][0]) for k, v in self._spans.items()]
+        rows = []
+        for (name, labels), samples, count in sorted(items):
+            rows.append({"span": name, **dict(labels), "count": count,
+                         "p50_ms": round(_percentile(samples, 0.5), 2),
+                         "p95_ms": round(_percentile(samples, 0.95), 2),
+                         "max_ms": round(samples[-1], 2)})
+        return rows
+
+    def spend_table(self) -> list[dict]:
+        with self._lock:
+            counters = dict(self._counters)
+        by_suspect: dict[str, dict] = {}
+        for (name, labels), value in counters.items():
+            suspect = dict(labels).get("suspect")
+            if suspect is None or name not in (*_TOKEN_FIELDS, "cost_usd"):
+                continue
+            by_suspect.setdefault(suspect, {"suspect": suspect, **dict.fromkeys(_TOKEN_FIELDS, 0), "cost_usd": 0.0})
+            by_suspect[suspect][name] += value
+        return [by_suspect[s] for s in sorted(by_suspect)]
+
+    def session_table(self) -> list[dict]:
+        with self._lock:
+            return [{"session": s or "-", **row} for s, row in self._sessions.items()]
+
+    def counters(self) -> dict[str, float]:
+        with self._lock:
+            items = list(self._counters.items())
+        return {name + "".join(f"[{k}={v}]" for k, v in labels): value for (name, labels), value in sorted(items)}
+
+    # ---- 내보내기 ----
+    def jsonl(self) -> str:
+        with self._lock:
+            events = list(self._events)
+        return "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events)
+
+    def prometheus(self) -> str:
+        def fmt(labels) -> str:
+            inner = ",".join(f'{k}="{v}"' for k, v in labels)
+            return "{" + inner + "}" if inner else ""
+
+        with self._lock:
+            spans = [(k, sorted(v), list(self._span_totals[k])) for k, v in self._spans.items()]
+            counters = list(self._counters.items())
+        lines = ["# TYPE game_span_ms summary"]
+        for (name, labels), samples, (count, total) in sorted(spans):
+            base = (("span", name), *labels)
+            for q in (0.5, 0.95):
+                lines.append(f"game_span_ms{fmt((*base, ('quantile', q)))} {_percentile(samples, q):.3f}")
+            lines.append(f"game_span_ms_count{fmt(base)} {count}")
+            lines.append(f"game_span_ms_sum{fmt(base)} {total:.3f}")
+        names = sorted({name for (name, _), _ in counters})
+        for name in names:
+            lines.append(f"# TYPE game_{name}_total counter")
+            for (n, labels), value in sorted(counters):
+                if n == name:
+                    lines.append(f"game_{name}_total{fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+# --------------------------------
+# 벤치마크: python game_metrics.py
+# 스팬 하나 기록하는 데 드는 오버헤드를 잰다.
+# --------------------------------
+def _bench(n: int = 200_000):
+    m = Metrics()
+    t0 = time.perf_counter()
+    for i in range(n):
+        with m.span("llm_call", room="room A", suspect="A"):
+            pass
+    per = (time.perf_counter() - t0) / n
+    print(f"span overhead: {per * 1e6:.2f} us")
+    print(m.latency_table())
+
+
+if __name__ == "__main__":
+    _bench()
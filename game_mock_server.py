@@ -0,0 +1,320 @@
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from game_history import count_tokens
+from game_prompts import COMPACT_FORMAT_RULES, shared_prefix
+from game_scenario import DEFAULT_SCENARIO, load_scenario
+
+# --------------------------------
+# 로컬 목(mock) chat-completions 서버 (OpenAI 호환, 표준 라이브러리만 사용)
+# 시스템 프롬프트에서 용의자를 알아내 시나리오의 핵심 진술/일반 답으로 스키마에 맞는 json_list 를 돌려준다.
+# 압축 출력 형식(GAME_OUTPUT_FORMAT=compact) 으로 물으면 {"speaker","utterance_type","text"} 로 답한다.
+# 지연 분포, 토큰 속도, 오류 주입(500/429), 분당 요청/토큰 한도(--rpm/--tpm), 스트리밍을 설정할 수 있다.
+# 출력 토큰 수만큼 생성 시간이 걸리므로 (completion_tokens / tokens_per_sec) 형식별 지연 차이도 드러난다.
+#   python game_mock_server.py --port 8765 --latency-ms 800 --tokens-per-sec 60
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run streamlit_game.py
+# --------------------------------
+NORMAL_REPLIES = [
+    "그 시각엔 방에 있었다",
+    "기억나는 건 그게 전부다",
+    "다른 사람에게 물어보시죠",
+    "그건 대답하기 곤란하다",
+]
+
+
+@dataclass
+class MockConfig:
+    scenario_id: str = DEFAULT_SCENARIO
+    latency_ms: float = 300.0        # 첫 토큰까지 (비스트리밍은 전체 응답까지) 평균 지연
+    latency_dist: str = "lognormal"  # fixed | normal | lognormal
+    jitter: float = 0.3              # normal 은 표준편차/평균, lognormal 은 sigma
+    tokens_per_sec: float = 80.0     # 출력 토큰 생성 속도 (0 이면 한 번에)
+    core_ratio: float = 0.4          # 핵심 진술로 답하는 비율
+    error_rate: float = 0.0          # 500 응답 비율
+    rate_limit_rate: float = 0.0     # 429 응답 비율
+    malformed_rate: float = 0.0      # JSON 이 중간에 잘린 답 비율
+    invalid_rate: float = 0.0        # JSON 은 맞지만 스키마를 어긴 답 비율 (절반은 로컬 수리 불가)
+    stall_rate: float = 0.0          # stall_ms 만큼 멈췄다가 답하는 비율 (마감 시간 시험용)
+    stall_ms: float = 30_000.0
+    down_models: tuple[str, ...] = ()  # 이 모델 이름으로 온 요청은 항상 503
+    rpm_limit: float = 0.0           # 분당 요청 한도 (0 이면 없음). 넘으면 429 + retry-after-ms
+    tpm_limit: float = 0.0           # 분당 토큰 한도 (프롬프트 + max_tokens 로 센다)
+    seed: int | None = None
+
+
+class MockBackend:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.scenario = load_scenario(config.scenario_id)
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._prefix_tokens = count_tokens(shared_prefix(config.scenario_id))
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "malformed": 0, "invalid": 0, "stalled": 0}
+        # 한도 버킷: 10초 분량까지 모였다가 꾸준히 찬다 (실제 공급자처럼 분 단위보다 잘게 막는다)
+        self._limits = {name: {"rate": limit / 60, "capacity": limit / 6, "level": limit / 6} for name, limit in
+                        (("requests", config.rpm_limit), ("tokens", config.tpm_limit)) if limit > 0}
+        self._limit_t = time.monotonic()
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def latency(self) -> float:
+        c = self.config
+        with self._lock:
+            if c.latency_dist == "fixed":
+                ms = c.latency_ms
+            elif c.latency_dist == "normal":
+                ms = self._rng.gauss(c.latency_ms, c.latency_ms * c.jitter)
+            else:
+                # 평균이 latency_ms 가 되도록 mu 를 맞춘 로그정규 분포 (꼬리가 긴 실제 API 지연 흉내)
+                mu = math.log(c.latency_ms) - c.jitter ** 2 / 2
+                ms = self._rng.lognormvariate(mu, c.jitter)
+        return max(ms, 0.0) / 1000
+
+    def fault(self, model: str = "") -> int | None:
+        if model in self.config.down_models:
+            return 503
+        r = self._random()
+        if r < self.config.error_rate:
+            return 500
+        if r < self.config.error_rate + self.config.rate_limit_rate:
+            return 429
+        return None
+
+    def admit(self, body: dict) -> float | None:
+        # 한도 안이면 None (버킷에서 꺼낸다), 넘으면 다시 시도할 때까지 초
+        if not self._limits:
+            return None
+        messages = body.get("messages", [])
+        need = {"requests": 1,
+                "tokens": sum(count_tokens(m.get("content") or "") + 4 for m in messages) + (body.get("max_tokens") or 0)}
+        with self._lock:
+            now = time.monotonic()
+            for b in self._limits.values():
+                b["level"] = min(b["capacity"], b["level"] + (now - self._limit_t) * b["rate"])
+            self._limit_t = now
+            wait = max((min(need[name], b["capacity"]) - b["level"]) / b["rate"] for name, b in self._limits.items())
+            if wait > 0:
+                return wait
+            for name, b in self._limits.items():
+                b["level"] -= need[name]
+        return None
+
+    def invalid(self, raw: str) -> str:
+        # 실제로 본 형식 오류들: w 가 숫자, "/" 토큰, speaker 누락, 이상한 utterance_type, 빈 답
+        payload = json.loads(raw)
+        if "text" in payload:
+            if self._random() < 0.5:
+                return json.dumps({**payload, "text": ""}, ensure_ascii=False)
+            return json.dumps({"text": payload["text"], "utterance_type": "statement"}, ensure_ascii=False)
+        if self._random() < 0.5:
+            return json.dumps({"json_list": [], "speaker": payload["speaker"], "utterance_type": "normal",
+                               "combined_text_md": ""}, ensure_ascii=False)
+        words = [{"w": 7, "bold": 1}, {"w": "/", "bold": False}] + [{"w": "/" + t["w"], "bold": t["bold"]}
+                                                                   for t in payload["json_list"]]
+        return json.dumps({"json_list": words, "utterance_type": "statement"}, ensure_ascii=False)
+
+    def reply(self, messages: list[dict], compact: bool | None = None) -> tuple[str, dict]:
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        if compact is None:
+            compact = COMPACT_FORMAT_RULES in system
+        marker = 'speaker 는 항상 "'
+        speaker = system.split(marker, 1)[1][0] if marker in system else next(iter(self.scenario.suspects))
+        suspect = self.scenario.suspects.get(speaker) or next(iter(self.scenario.suspects.values()))
+        if self._random() < self.config.core_ratio:
+            i = int(self._random() * len(suspect.core))
+            words = [{"w": w, "bold": True} for w in suspect.core[i].split()]
+            kind, text_md = "core", f"**{suspect.core[i]}**"
+        else:
+            text = NORMAL_REPLIES[int(self._random() * len(NORMAL_REPLIES))]
+            words = [{"w": w, "bold": False} for w in text.split()]
+            kind, text_md = "normal", text
+        if compact:
+            raw = json.dumps({"text": text_md, "speaker": suspect.id, "utterance_type": kind}, ensure_ascii=False)
+        else:
+            raw = json.dumps({"json_list": words, "speaker": suspect.id, "utterance_type": kind,
+                              "combined_text_md": text_md}, ensure_ascii=False)
+        prompt_tokens = sum(count_tokens(m.get("content") or "") + 4 for m in messages)
+        cached = (min(self._prefix_tokens, prompt_tokens) // 128) * 128 if prompt_tokens >= 1024 else 0
+        completion_tokens = count_tokens(raw)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": cached}}
+        return raw, usage
+
+
+def _handler(backend: MockBackend):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status: int, obj: dict):
+            out = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def _send_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            backend.count("requests")
+            retry_after = backend.admit(body)
+            if retry_after is not None:
+                backend.count("rate_limited")
+                out = json.dumps({"error": {"message": "Rate limit reached", "type": "requests",
+                                            "code": "rate_limit_exceeded"}}).encode("utf-8")
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("retry-after-ms", str(math.ceil(retry_after * 1000)))
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+                return
+            status = backend.fault(body.get("model", ""))
+            if status is not None:
+                backend.count("rate_limited" if status == 429 else "errors")
+                if status == 429:
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._send_json(status, {"error": {"message": "mock failure", "type": "server_error"}})
+                return
+
+            delay = backend.latency()
+            if backend._random() < backend.config.stall_rate:
+                backend.count("stalled")
+                delay = backend.config.stall_ms / 1000
+            time.sleep(delay)
+            schema_name = ((body.get("response_format") or {}).get("json_schema") or {}).get("name", "")
+            raw, usage = backend.reply(body.get("messages", []),
+                                       compact=True if schema_name == "suspect_reply_compact" else None)
+            tps = backend.config.tokens_per_sec
+            n_tokens = max(usage["completion_tokens"], 1)
+            if backend._random() < backend.config.malformed_rate:
+                backend.count("malformed")
+                raw = raw[:len(raw) // 2]
+            elif backend._random() < backend.config.invalid_rate:
+                backend.count("invalid")
+                raw = backend.invalid(raw)
+            model, cid = body.get("model", "mock"), f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            if not body.get("stream"):
+                if tps > 0:
+                    time.sleep(n_tokens / tps)  # 출력 토큰 생성 시간
+                self._send_json(200, {
+                    "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": raw}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            chunk = lambda delta, finish=None: {
+                "id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            # completion_tokens 개의 조각으로 잘라 tokens_per_sec 속도로 흘려보낸다
+            step = max(math.ceil(len(raw) / n_tokens), 1)
+            pause = 1 / tps if tps > 0 else 0
+            for i in range(0, len(raw), step):
+                self._send_chunk(f"data: {json.dumps(chunk({'content': raw[i:i + step]}), ensure_ascii=False)}\n\n".encode())
+                if pause:
+                    time.sleep(pause)
+            self._send_chunk(f"data: {json.dumps(chunk({}, 'stop'))}\n\n".encode())
+            if (body.get("stream_options") or {}).get("include_usage"):
+                final = chunk({})
+                final["choices"], final["usage"] = [], usage
+                self._send_chunk(f"data: {json.dumps(final)}\n\n".encode())
+            self._send_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # 기본값 5 로는 동시 접속이 몰릴 때 연결이 리셋된다
+
+    def handle_error(self, request, client_address):
+        # SDK 는 스트림을 [DONE] 에서 끊고 연결을 닫는다 → 다음 요청을 기다리던 쪽의 리셋은 정상
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def serve(config: MockConfig, host: str = "127.0.0.1", port: int = 8765,
+          background: bool = False) -> ThreadingHTTPServer:
+    # background=True 면 데몬 스레드에서 돌리고 바로 돌려준다 (port=0 이면 빈 포트)
+    backend = MockBackend(config)
+    server = _Server((host, port), _handler(backend))
+    server.backend = backend  # 실행 중에 설정(오류율 등)을 바꿀 수 있게
+    if background:
+        threading.Thread(target=server.serve_forever, name="game-mock-server", daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+
+def add_mock_args(ap: argparse.ArgumentParser):
+    d = MockConfig()
+    ap.add_argument("--scenario", default=d.scenario_id)
+    ap.add_argument("--latency-ms", type=float, default=d.latency_ms)
+    ap.add_argument("--latency-dist", choices=["fixed", "normal", "lognormal"], default=d.latency_dist)
+    ap.add_argument("--jitter", type=float, default=d.jitter)
+    ap.add_argument("--tokens-per-sec", type=float, default=d.tokens_per_sec)
+    ap.add_argument("--core-ratio", type=float, default=d.core_ratio)
+    ap.add_argument("--error-rate", type=float, default=d.error_rate)
+    ap.add_argument("--rate-limit-rate", type=float, default=d.rate_limit_rate)
+    ap.add_argument("--malformed-rate", type=float, default=d.malformed_rate)
+    ap.add_argument("--invalid-rate", type=float, default=d.invalid_rate)
+    ap.add_argument("--stall-rate", type=float, default=d.stall_rate)
+    ap.add_argument("--stall-ms", type=float, default=d.stall_ms)
+    ap.add_argument("--rpm", type=float, default=d.rpm_limit, help="분당 요청 한도 (0 이면 없음)")
+    ap.add_argument("--tpm", type=float, default=d.tpm_limit, help="분당 토큰 한도 (0 이면 없음)")
+    ap.add_argument("--down-model", action="append", default=[], help="항상 503 을 돌려줄 모델 (여러 번 가능)")
+    ap.add_argument("--seed", type=int, default=d.seed)
+
+
+def mock_config(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        scenario_id=args.scenario, latency_ms=args.latency_ms, latency_dist=args.latency_dist,
+        jitter=args.jitter, tokens_per_sec=args.tokens_per_sec, core_ratio=args.core_ratio,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, malformed_rate=args.malformed_rate,
+        invalid_rate=args.invalid_rate,
+        stall_rate=args.stall_rate, stall_ms=args.stall_ms, down_models=tuple(args.down_model), seed=args.seed,
+        rpm_limit=args.rpm, tpm_limit=args.tpm,
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    add_mock_args(ap)
+    args = ap.parse_args()
+    print(f"mock chat-completions: http://{args.host}:{args.port}/v1")
+    serve(mock_config(args), args.host, args.port)
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import openai
+
+from game_metrics import METRICS
+
+# --------------------------------
+# 모델 호출 정책
+# 턴 전체 마감 시간 안에서 시도마다 남은 시간을 타임아웃으로 주고,
+# 재시도 가능한 실패(타임아웃/연결/429/5xx/깨진 JSON)는 지수 백오프 + 지터로 다시 시도한다.
+# 모델별 회로 차단기가 연속 실패를 세어, 열려 있는 동안은 그 모델을 건너뛰고 다음 등급(폴백 모델)으로 간다.
+# 모든 등급이 실패하면 TurnFailed 를 올린다 (SDK 자체 재시도는 끄고 여기서만 재시도한다).
+# --------------------------------
+TURN_DEADLINE = float(os.getenv("GAME_TURN_DEADLINE", "45"))
+ATTEMPT_TIMEOUT = float(os.getenv("GAME_ATTEMPT_TIMEOUT", "20"))
+MAX_ATTEMPTS = int(os.getenv("GAME_MAX_ATTEMPTS", "3"))          # 모델(등급)당 시도 횟수
+BACKOFF_BASE = float(os.getenv("GAME_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("GAME_BACKOFF_CAP", "4"))
+FALLBACK_MODEL = os.getenv("GAME_FALLBACK_MODEL", "gpt-4o-mini")  # 빈 문자열이면 폴백 없음
+BREAKER_FAILURES = int(os.getenv("GAME_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("GAME_BREAKER_COOLDOWN", "30"))
+
+# 재시도해도 되는 실패: 일시적 네트워크/공급자 문제와 형식이 깨진 출력
+RETRYABLE = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    TimeoutError,
+    json.JSONDecodeError,
+)
+
+
+# 호출 스케줄러(game_scheduler)가 보는 턴 정보: 턴 마감 시각(time.monotonic 기준)과 지금 시도의 시계.
+# 대기열 대기는 턴 남은 시간 안으로 자르고, 기다리는 동안은 시도 타임아웃을 세지 않는다.
+turn_end: ContextVar[float | None] = ContextVar("game_turn_end", default=None)
+attempt_clock: ContextVar["AttemptClock | None"] = ContextVar("game_attempt_clock", default=None)
+
+
+class AttemptClock:
+    # 비동기 시도의 타임아웃 시계. hold() 동안은 턴 마감만 보고, restart() 부터 다시 timeout 초를 잰다
+    def __init__(self, timeout: float, end: float):
+        self.timeout, self.end = timeout, end
+        self.started: float | None = time.monotonic()
+
+    def hold(self):
+        self.started = None
+
+    def restart(self):
+        self.started = time.monotonic()
+
+    def left(self) -> float:
+        limit = self.end if self.started is None else min(self.started + self.timeout, self.end)
+        return limit - time.monotonic()
+
+
+class TurnFailed(RuntimeError):
+    # 모든 등급/시도가 실패한 턴. 방 히스토리는 바뀌지 않은 상태다.
+    def __init__(self, message: str, attempts: list[tuple[str, str]]):
+        super().__init__(message)
+        self.attempts = attempts  # [(모델, 오류 요약)]
+
+
+class CircuitBreaker:
+    # closed → (연속 실패 threshold 번) → open → (cooldown 후) half-open: 한 번 시험 → 성공 시 closed
+    def __init__(self, threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True  # half-open: 시험 호출 하나만 통과
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures, self._opened_at, self._trial = 0, None, False
+
+    def release(self):
+        # 공급자까지 가지 못한 시도: 상태는 그대로 두고 half-open 시험 자리만 돌려준다
+        with self._lock:
+            self._trial = False
+
+    def failure(self) -> bool:
+        # 이번 실패로 회로가 열렸으면 True
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self._failures >= self.threshold):
+                self._opened_at, self._trial = time.monotonic(), False
+                return True
+            return False
+
+
+@dataclass
+class CallPolicy:
+    deadline: float = TURN_DEADLINE
+    attempt_timeout: float = ATTEMPT_TIMEOUT
+    max_attempts: int = MAX_ATTEMPTS
+    backoff_base: float = BACKOFF_BASE
+    backoff_cap: float = BACKOFF_CAP
+
+    def __post_init__(self):
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker()
+            return self._breakers[model]
+
+    def backoff(self, attempt: int) -> float:
+        # full jitter: [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _plan(self, models: list[str]):
+        # (모델, 시도 번호) 순서. 열린 회로의 모델은 건너뛴다.
+        for model in models:
+            breaker = self.breaker(model)
+            for attempt in range(self.max_attempts):
+                if not breaker.allow():
+                    METRICS.add("breaker_skips", model=model)
+                    break
+                yield model, attempt, breaker
+
+    def _failed(self, model: str, breaker: CircuitBreaker, e: Exception, attempts: list):
+        attempts.append((model, f"{type(e).__name__}: {e}"[:200]))
+        METRICS.add("call_failures", model=model, error=type(e).__name__)
+        if breaker.failure():
+            METRICS.add("breaker_opened", model=model)
+
+    @staticmethod
+    def _settled(breaker: CircuitBreaker, e: Exception):
+        # 재시도하지 않는 실패. 공급자가 응답한 경우(4xx)만 회로를 닫는다.
+        # 대기열 초과/카세트 미스/검사 실패처럼 여기서 난 오류는 회로 상태를 바꾸지 않는다
+        if isinstance(e, openai.APIStatusError):
+            breaker.success()
+        else:
+            breaker.release()
+
+    def call(self, models: list[str], fn, deadline: float | None = None):
+        # fn(model, timeout) → 결과. 실패하면 다음 시도/등급으로.
+        # deadline: 이번 턴에 남은 시간 (기본은 턴 마감 시간 전체)
+        end = time.monotonic() + (self.deadline if deadline is None else deadline)
+        token = turn_end.set(end)
+        try:
+            return self._call(models, fn, end)
+        finally:
+            turn_end.reset(token)
+
+    def _call(self, models: list[str], fn, end: float):
+        attempts: list[tuple[str, str]] = []
+        for model, attempt, breaker in self._plan(models):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempts:
+                METRICS.add("retries", model=model)
+            try:
+                result = fn(model, min(self.attempt_timeout, remaining))
+            except RETRYABLE as e:
+                self._failed(model, breaker, e, attempts)
+                time.sleep(min(self.backoff(attempt), max(end - time.monotonic(), 0)))
+                continue
+            except Exception as e:
+                # 요청 자체가 잘못된 경우(400/401 등)는 재시도해도 같으므로 바로 끝낸다.
+                self._settled(breaker, e)
+                attempts.append((model, f"{type(e).__name__}: {e}"[:200]))
+                raise TurnFailed("모델 호출 실패", attempts) from e
+            breaker.success()
+            if model != models[0]:
+                METRICS.add("fallbacks", model=model)
+            return result
+        raise self._exhausted(attempts, end)
+
+    @staticmethod
+    def _exhausted(attempts: list, end: float) -> TurnFailed:
+        if attempts:
+            return TurnFailed("모델 호출 실패 (재시도/폴백 소진)", attempts)
+        if time.monotonic() >= end:
+            return TurnFailed("턴 마감 시간 초과", attempts)
+        return TurnFailed("모든 모델의 회로가 열려 있음", attempts)
+
+    async def acall(self, models: list[str], fn):
+        # call() 의 비동기판. fn(model, timeout) 은 코루틴을 돌려준다.
+        end = time.monotonic() + self.deadline
+        token = turn_end.set(end)
+        try:
+            return await self._acall(models, fn, end)
+        finally:
+            turn_end.reset(token)
+
+    @staticmethod
+    async def _timed(coro, clock: AttemptClock):
+        # asyncio.wait_for 와 같되 시계(clock)를 따른다: 스케줄러 대기열에서 기다린 시간은 시도 시간에서 빠진다
+        token = attempt_clock.set(clock)
+        try:
+            task = asyncio.ensure_future(coro)  # 태스크는 지금 컨텍스트(시계 포함)를 복사한다
+        finally:
+            attempt_clock.reset(token)
+        try:
+            while not task.done():
+                left = clock.left()
+                if left <= 0:
+                    raise asyncio.TimeoutError()
+                await asyncio.wait({task}, timeout=min(left, 0.25))  # hold/restart 를 보려고 잘게 잔다
+            return task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _acall(self, models: list[str], fn, end: float):
+        attempts: list[tuple[str, str]] = []
+        for model, attempt, breaker in self._plan(models):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempts:
+                METRICS.add("retries", model=model)
+            timeout = min(self.attempt_timeout, remaining)
+            try:
+                result = await self._timed(fn(model, timeout), AttemptClock(timeout, end))
+            except (*RETRYABLE, asyncio.TimeoutError) as e:
+                self._failed(model, breaker, e, attempts)
+                await asyncio.sleep(min(self.backoff(attempt), max(end - time.monotonic(), 0)))
+                continue
+            except Exception as e:
+                self._settled(breaker, e)
+                attempts.append((model, f"{type(e).__name__}: {e}"[:200]))
+                raise TurnFailed("모델 호출 실패", attempts) from e
+            breaker.success()
+            if model != models[0]:
+                METRICS.add("fallbacks", model=model)
+            return result
+        raise self._exhausted(attempts, end)
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+
+    def report(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {model: b.state for model, b in breakers.items()}
+
+
+POLICY = CallPolicy()
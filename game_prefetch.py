@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from game_cache import normalize_question
+from game_metrics import METRICS, current_session, usage_cost
+from game_policy import TURN_DEADLINE
+from game_scheduler import background_call
+from game_semantic import REPEAT_THRESHOLD, SEMANTIC_THRESHOLD, get_embedder
+
+# --------------------------------
+# 다음 질문 미리 생성 (추측 선생성)
+# 답을 하나 보여 준 뒤 플레이어가 읽는 동안, 그 방에서 나올 법한 후속 질문 몇 개를 골라
+# 방 히스토리 사본(fork)에 대해 백그라운드 스레드에서 미리 답을 만들어 둔다.
+# 다음 질문이 그중 하나와 충분히 비슷하면(GAME_PREFETCH_THRESHOLD) 모델을 부르지 않고 바로 낸다.
+#  - 후보 질문: 용의자별 follow_ups 중 아직 확보하지 못한 핵심 진술을 노리는 것 → 나머지 → 공통 질문 순.
+#    이 방에서 이미 한(비슷한) 질문은 뺀다.
+#  - 슬롯은 (세션, 방) 마다 하나이고 방 객체는 붙잡지 않는다 (히스토리 길이 + 마지막 메시지로 맞는지만 본다).
+#    방 히스토리가 바뀌면(다음 턴) 맞지 않으므로 버리고, 세션 풀이 방/세션을 내리면 drop() 으로 함께 버린다.
+#  - 아직 생성 중인 답이 맞으면 새로 부르지 않고 그 답을 기다린다 (시작도 못 한 생성이면 취소하고 새로 부른다).
+#    기다리는 시간은 이번 턴에 남은 시간까지만.
+#  - 미리 만든 답의 토큰/비용은 생성 시점에 정상 지출로 잡고, 여기서 따로도 모아 적중률과 함께 보여 준다.
+# 공용 스케줄러(game_scheduler)가 켜져 있으면 백그라운드 호출로 줄을 서서 플레이어 호출을 밀어내지 않는다.
+# GAME_PREFETCH=1 일 때만 켠다 (기본 끔: 맞히지 못한 만큼 토큰이 더 든다).
+# --------------------------------
+PREFETCH_ENABLED = os.getenv("GAME_PREFETCH", "0") == "1"
+PREFETCH_COUNT = int(os.getenv("GAME_PREFETCH_COUNT", "3"))          # 답한 뒤 미리 만들 질문 수
+PREFETCH_THRESHOLD = float(os.getenv("GAME_PREFETCH_THRESHOLD", str(SEMANTIC_THRESHOLD)))  # 의미 캐시와 같은 기준
+PREFETCH_WORKERS = int(os.getenv("GAME_PREFETCH_WORKERS", "4"))
+PREFETCH_ROOMS = int(os.getenv("GAME_PREFETCH_ROOMS", "256"))        # 슬롯을 들고 있을 최대 방 수 (LRU)
+
+GENERIC_QUESTIONS = ("그 시각에 어디 있었어?", "알리바이를 말해 봐", "누가 거짓말을 하고 있지?")
+
+
+def asked_questions(room: dict) -> list[str]:
+    return [m["content"] for m in room.get("messages", []) if m["role"] == "user"]
+
+
+def predict_questions(room: dict, suspect, n: int = PREFETCH_COUNT) -> list[str]:
+    # 다음에 나올 법한 질문 n개 (우선순위 순)
+    unlocked = set(room.get("unlocked", []))
+    ranked = [f["q"] for f in suspect.follow_ups if f.get("core") is not None and f["core"] not in unlocked]
+    ranked += [f["q"] for f in suspect.follow_ups if f.get("core") is None]
+    ranked += GENERIC_QUESTIONS
+    ranked += [f["q"] for f in suspect.follow_ups if f.get("core") in unlocked]
+    asked = asked_questions(room)
+    seen = {normalize_question(q) for q in asked}
+    asked_vecs = get_embedder().embed(asked) if asked else None
+    out = []
+    for q in ranked:
+        key = normalize_question(q)
+        if key in seen:
+            continue
+        seen.add(key)
+        if asked_vecs is not None and float(np.max(asked_vecs @ get_embedder().embed([q])[0])) >= REPEAT_THRESHOLD:
+            continue
+        out.append(q)
+        if len(out) == n:
+            break
+    return out
+
+
+def _history_mark(room: dict) -> tuple[int, str | None]:
+    # fork 한 시점의 방 히스토리 표시 (길이, 마지막 메시지 내용)
+    model = room.get("model") or []
+    return len(model), (model[-1].get("content") if model else None)
+
+
+class _Slot:
+    # 방 하나의 미리 만든 답들. mark 가 지금 방 히스토리와 같아야 유효
+    def __init__(self, room: dict, suspect: str, questions: list[str]):
+        self.mark, self.suspect = _history_mark(room), suspect
+        self.questions = questions
+        self.futures = []
+        self.vecs = get_embedder().embed(questions)
+
+
+class Prefetcher:
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, threshold: float = PREFETCH_THRESHOLD,
+                 workers: int = PREFETCH_WORKERS, max_rooms: int = PREFETCH_ROOMS):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_rooms = max_rooms
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="game-prefetch") if enabled else None
+        self._slots: OrderedDict[tuple[str, str], _Slot] = OrderedDict()  # (세션, 방 id) → 슬롯
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "generated": 0, "failed": 0, "hits": 0, "waited": 0, "misses": 0,
+                       "wasted": 0, "cancelled": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                       "cost_usd": 0.0, "hit_cost_usd": 0.0}
+
+    def schedule(self, room_id: str, room: dict, suspect: str, jobs: list[tuple[str, object]]):
+        # jobs = [(질문, 인자 없는 생성 함수 → (raw_json, payload, usage))]. 이전 슬롯은 버린다.
+        if not self.enabled or not jobs:
+            return
+        slot = _Slot(room, suspect, [q for q, _ in jobs])
+        session = current_session.get()
+        for _, fn in jobs:
+            slot.futures.append(self._pool.submit(self._run, fn, session, suspect))
+        with self._lock:
+            old = self._slots.pop((session, room_id), None)
+            self._slots[(session, room_id)] = slot
+            while len(self._slots) > self.max_rooms:
+                self._discard(self._slots.popitem(last=False)[1])
+            self._stats["scheduled"] += len(jobs)
+        if old is not None:
+            self._release(old, None)
+
+    def _run(self, fn, session: str, suspect: str):
+        current_session.set(session)  # 미리 만든 답의 비용도 그 세션 지출로 잡는다
+        background_call.set(True)  # 스케줄러 대기열에선 사람이 기다리는 호출보다 뒤에 선다
+        try:
+            with METRICS.span("prefetch", suspect=suspect):
+                raw_json, payload, usage = fn()
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        tokens = self._tokens(usage)
+        with self._lock:
+            self._stats["generated"] += 1
+            for field, value in tokens.items():
+                self._stats[field] += value
+        return raw_json, payload, usage
+
+    @staticmethod
+    def _tokens(usage) -> dict:
+        if usage is None:
+            return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0}
+        details = getattr(usage, "prompt_tokens_details", None)
+        tokens = {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0,
+                  "cached_tokens": getattr(details, "cached_tokens", None) or 0}
+        return {**tokens, "cost_usd": usage_cost(**tokens)}
+
+    def _discard(self, slot: _Slot):
+        # 호출부에서 self._lock 을 잡은 상태. 아직 시작 안 한 생성은 취소한다
+        for fut in slot.futures:
+            if fut.cancel():
+                self._stats["cancelled"] += 1
+
+    def _release(self, slot: _Slot, used):
+        # 쓰이지 않은 생성은 끝나는 대로 낭비로 센다
+        with self._lock:
+            self._discard(slot)
+        for fut in slot.futures:
+            if fut is not used and not fut.cancelled():
+                fut.add_done_callback(self._wasted)
+
+    def _wasted(self, fut):
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        with self._lock:
+            self._stats["wasted"] += 1
+
+    def drop(self, session: str, room_id: str | None = None):
+        # 세션 풀이 방(room_id=None 이면 세션 전체)을 메모리에서 내릴 때 그 슬롯도 버린다
+        with self._lock:
+            keys = [k for k in self._slots if k[0] == session and room_id in (None, k[1])]
+            slots = [self._slots.pop(k) for k in keys]
+        for slot in slots:
+            self._release(slot, None)
+
+    def take(self, room_id: str, room: dict, query: str, timeout: float = TURN_DEADLINE) -> tuple[str, dict] | None:
+        # 이번 질문에 맞는 미리 만든 답 (raw_json, payload). 없으면 None. 슬롯은 어느 쪽이든 소비된다.
+        # 생성 중인 답은 timeout(이번 턴에 남은 시간) 까지만 기다린다.
+        if not self.enabled:
+            return None
+        with self._lock:
+            slot = self._slots.pop((current_session.get(), room_id), None)
+        if slot is None:
+            return None
+        if slot.mark != _history_mark(room):
+            self._release(slot, None)  # 방 히스토리가 그사이 바뀌었다
+            return None
+        end = time.monotonic() + timeout
+        scores = slot.vecs @ get_embedder().embed([query])[0]
+        order = [int(i) for i in np.argsort(-scores)]
+        exact = [i for i, q in enumerate(slot.questions) if normalize_question(q) == normalize_question(query)]
+        for i in exact or [i for i in order if scores[i] >= self.threshold]:
+            fut = slot.futures[i]
+            if fut.cancel():
+                continue  # 아직 줄에서 기다리던 생성: 기다리느니 지금 새로 부르는 게 빠르다
+            waited = not fut.done()
+            try:
+                raw_json, payload, usage = fut.result(timeout=max(end - time.monotonic(), 0))
+            except Exception:
+                continue  # 실패/취소된 생성 → 다음 후보, 없으면 보통 경로
+            self._release(slot, fut)
+            with self._lock:
+                self._stats["hits"] += 1
+                self._stats["waited"] += waited
+                self._stats["hit_cost_usd"] += self._tokens(usage)["cost_usd"]
+            METRICS.add("prefetch_hits", suspect=slot.suspect)
+            return raw_json, payload
+        self._release(slot, None)
+        with self._lock:
+            self._stats["misses"] += 1
+        METRICS.add("prefetch_misses", suspect=slot.suspect)
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["rooms"] = len(self._slots)
+        turns = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / turns if turns else 0.0
+        # 맞힌 답은 어차피 불렀어야 할 호출이므로, 순수 추가 비용은 나머지 생성분이다
+        out["extra_cost_usd"] = out["cost_usd"] - out["hit_cost_usd"]
+        return out
+
+
+PREFETCH = Prefetcher()
@@ -0,0 +1,137 @@
+import os
+import threading
+from functools import lru_cache
+
+from game_scenario import Scenario, load_scenario
+
+# --------------------------------
+# 프롬프트 조립
+# 모든 용의자 프롬프트는 바이트 단위로 같은 공유 프리픽스(형식 규칙 + 진실팩 + 사건 사실)로
+# 시작하고, 그 뒤에 용의자별 캐릭터 시트가 붙는다. 공급자 측 프롬프트 프리픽스 캐시가
+# 모든 방에서 적중하도록 용의자별 내용은 반드시 프리픽스 뒤에만 둔다.
+# 진실팩/사건 사실/캐릭터 시트는 시나리오 파일에서 오고, 조립 결과는 캐시한다.
+# --------------------------------
+FORMAT_RULES = """
+[출력 형식(반드시 JSON만 출력)]
+- 최상위는 하나의 JSON 객체이며, **첫 번째 키는 "json_list"** 여야 한다.
+- "json_list"는 **단어 단위** JSON 객체들의 배열이다. (공백은 생략하고, 렌더링 시 단어 사이를 공백으로 조인)
+- 각 단어 객체 형식: { "w": "<단어>", "bold": true|false }
+- 선택 필드(권장): "speaker":"A|B|C|D|E", "utterance_type":"core|normal|confession|summary", "combined_text_md":"..."
+
+[핵심 진술 매칭 규칙]
+- 초기 자동 발화 금지. 심문으로 끌어냈을 때만 가능.
+- utterance_type="core" 조건: [핵심 진술 데이터]의 3진술 중 **하나 이상**을 직설 또는 동의어/의미동등 표현으로 말했을 때.
+- 한 발화에 핵심/일반이 섞이면 핵심 문장 단어만 bold:true.
+
+[강조 규칙]
+- core → 핵심 문장 단어만 bold:true, combined_text_md 에 해당 부분만 **굵게** 포함.
+- normal → 모두 bold:false.
+- confession → 자백 핵심만 bold:true.
+
+[형식 엄수]
+- 반드시 JSON만 출력(설명 금지). 최상위 첫 키는 "json_list".
+- 새 증거 창작 금지, 메타발언 금지.
+- **speaker 필수**: 현재 답변 중인 용의자([용의자 역할] 참고).
+
+[역할/대화 규칙]
+- 너는 [용의자 역할]에 지정된 용의자 한 명만 연기한다(진행자 없음).
+- 사용자는 “심문 X: {질문}” 형태로 묻는다. X의 목소리로만 1~3문장 답한다.
+- 톤/운영은 각 캐릭터 시트에 따른다. 장황 금지.
+""".strip()
+
+# 압축 출력 형식: 단어마다 {"w","bold"} 객체를 만드는 대신 굵게 표시가 들어간 평문 하나.
+# 완성 토큰이 몇 배 줄어든다. 파서(game_text.expand_compact)가 json_list 로 펼쳐 주므로 나머지 경로는 같다.
+COMPACT_FORMAT_RULES = """
+[출력 형식(반드시 JSON만 출력)]
+- 최상위는 하나의 JSON 객체: {"text":"<답변>", "speaker":"A|B|C|D|E", "utterance_type":"core|normal|confession|summary"}
+- "text" 는 답변 평문이다. 강조할 부분만 **굵게** 감싸고, 그 밖의 서식은 쓰지 않는다.
+
+[핵심 진술 매칭 규칙]
+- 초기 자동 발화 금지. 심문으로 끌어냈을 때만 가능.
+- utterance_type="core" 조건: [핵심 진술 데이터]의 3진술 중 **하나 이상**을 직설 또는 동의어/의미동등 표현으로 말했을 때.
+- 한 발화에 핵심/일반이 섞이면 핵심 문장만 굵게.
+
+[강조 규칙]
+- core → 핵심 문장만 **굵게**.
+- normal → 굵게 없음.
+- confession → 자백 핵심만 **굵게**.
+
+[형식 엄수]
+- 반드시 JSON만 출력(설명 금지).
+- 새 증거 창작 금지, 메타발언 금지.
+- **speaker 필수**: 현재 답변 중인 용의자([용의자 역할] 참고).
+
+[역할/대화 규칙]
+- 너는 [용의자 역할]에 지정된 용의자 한 명만 연기한다(진행자 없음).
+- 사용자는 “심문 X: {질문}” 형태로 묻는다. X의 목소리로만 1~3문장 답한다.
+- 톤/운영은 각 캐릭터 시트에 따른다. 장황 금지.
+""".strip()
+
+# 배포별 출력 형식: words(단어 객체 목록, 기본) | compact(굵게 표시 평문)
+OUTPUT_FORMAT = os.getenv("GAME_OUTPUT_FORMAT", "words")
+OUTPUT_FORMATS = ("words", "compact")
+
+
+def format_rules(output_format: str = OUTPUT_FORMAT) -> str:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"알 수 없는 출력 형식: {output_format}")
+    return COMPACT_FORMAT_RULES if output_format == "compact" else FORMAT_RULES
+
+
+@lru_cache(maxsize=None)
+def shared_prefix(scenario_id: str, output_format: str = OUTPUT_FORMAT) -> str:
+    sc = load_scenario(scenario_id)
+    return "\n\n".join([format_rules(output_format), sc.truth_pack, sc.case_facts]) + "\n\n"
+
+
+def build_suspect_prompt(scenario: Scenario, suspect: str, output_format: str = OUTPUT_FORMAT) -> str:
+    s = scenario.suspects[suspect]
+    core = ", ".join(f'"{c}"' for c in s.core)
+    return shared_prefix(scenario.id, output_format) + "\n\n".join([
+        f"[용의자 역할]\n- 너는 용의자 {suspect}만 연기한다. speaker 는 항상 \"{suspect}\".",
+        f"[핵심 진술 데이터(비공개)]\n{suspect}_core = [{core}]",
+        f"[진술 일관성표 - 비공개, 대화에서 직접 언급 금지]\n  {suspect}: {s.consistency}",
+        s.sheet,
+    ]) + "\n"
+
+
+@lru_cache(maxsize=None)
+def suspect_prompt(scenario_id: str, suspect: str, output_format: str = OUTPUT_FORMAT) -> str:
+    # 방이 처음 열려 질문이 들어올 때 한 번 조립하고 이후엔 같은 문자열을 재사용한다
+    return build_suspect_prompt(load_scenario(scenario_id), suspect, output_format)
+
+
+# --------------------------------
+# 프리픽스 캐시 적중률 집계
+# resp.usage.prompt_tokens_details.cached_tokens 를 용의자별로 누적한다.
+# --------------------------------
+class PrefixCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_suspect: dict[str, dict] = {}
+
+    def record(self, suspect: str, usage) -> None:
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        with self._lock:
+            row = self._by_suspect.setdefault(suspect, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+            row["calls"] += 1
+            row["prompt_tokens"] += usage.prompt_tokens or 0
+            row["cached_tokens"] += cached
+
+    def report(self) -> dict:
+        with self._lock:
+            rows = {k: dict(v) for k, v in self._by_suspect.items()}
+        total = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        for row in rows.values():
+            for k in total:
+                total[k] += row[k]
+        rows["전체"] = total
+        for row in rows.values():
+            row["cached_ratio"] = row["cached_tokens"] / row["prompt_tokens"] if row["prompt_tokens"] else 0.0
+        return rows
+
+
+PREFIX_CACHE = PrefixCacheStats()
@@ -0,0 +1,87 @@
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+# --------------------------------
+# 시나리오 레지스트리
+# scenarios/<id>.json 하나가 사건 하나(용의자, 핵심 진술, 진실표, 캐릭터 시트)를 기술한다.
+# 파일은 처음 요청될 때 한 번만 읽어 캐시하므로, 사건이 늘어도 import 비용은 그대로다.
+# --------------------------------
+SCENARIO_DIR = Path(os.getenv("GAME_SCENARIO_DIR", Path(__file__).parent / "scenarios"))
+DEFAULT_SCENARIO = os.getenv("GAME_SCENARIO", "mansion")
+
+
+@dataclass(frozen=True)
+class Suspect:
+    id: str
+    core: tuple[str, ...]          # 핵심 진술 3개
+    paraphrases: tuple[tuple[str, ...], ...]  # 핵심 진술별 바꿔 말하기 (로컬 매칭용)
+    truth: tuple[bool, ...]        # 각 핵심 진술의 참/거짓
+    consistency: str               # 프롬프트용 진술 일관성표 한 줄
+    sheet: str                     # 캐릭터 시트
+    claims: tuple[dict, ...] = ()  # 핵심 진술별 명제 (game_solver 참고)
+    follow_ups: tuple[dict, ...] = ()  # 예상 후속 질문 {"q", "core": 노리는 핵심 진술 번호|None} (game_prefetch 참고)
+
+    @property
+    def room_id(self) -> str:
+        return f"room {self.id}"
+
+
+@dataclass(frozen=True)
+class Scenario:
+    id: str
+    title: str
+    culprit: str
+    case_file_md: str
+    truth_pack: str
+    case_facts: str
+    hints: tuple[dict, ...]
+    suspects: dict[str, Suspect]
+    lies_per_suspect: int = 1      # 용의자마다 핵심 진술 중 거짓의 수
+
+    @property
+    def room_ids(self) -> list[str]:
+        return [s.room_id for s in self.suspects.values()]
+
+    def suspect_for_room(self, room_id: str) -> Suspect | None:
+        for s in self.suspects.values():
+            if s.room_id == room_id:
+                return s
+        return None
+
+
+def list_scenarios() -> list[str]:
+    # 파일을 열지 않고 id 만 나열한다
+    return sorted(p.stem for p in SCENARIO_DIR.glob("*.json"))
+
+
+@lru_cache(maxsize=None)
+def load_scenario(scenario_id: str = DEFAULT_SCENARIO) -> Scenario:
+    with open(SCENARIO_DIR / f"{scenario_id}.json", encoding="utf-8") as f:
+        data = json.load(f)
+    suspects = {
+        sid: Suspect(
+            id=sid,
+            core=tuple(s["core"]),
+            paraphrases=tuple(tuple(p) for p in s.get("paraphrases", [[] for _ in s["core"]])),
+            truth=tuple(s["truth"]),
+            consistency=s["consistency"],
+            sheet=s["sheet"],
+            claims=tuple(s.get("claims", [])),
+            follow_ups=tuple(s.get("follow_ups", [])),
+        )
+        for sid, s in data["suspects"].items()
+    }
+    return Scenario(
+        id=data["id"],
+        title=data["title"],
+        culprit=data["culprit"],
+        case_file_md=data["case_file_md"],
+        truth_pack=data["truth_pack"],
+        case_facts=data["case_facts"],
+        hints=tuple(data.get("hints", [])),
+        suspects=suspects,
+        lies_per_suspect=data.get("lies_per_suspect", 1),
+    )
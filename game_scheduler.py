@@ -0,0 +1,537 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextvars import ContextVar
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+import openai
+
+from game_cassette import request_key
+from game_history import message_tokens
+from game_metrics import METRICS, current_session
+from game_policy import attempt_clock, turn_end
+
+# --------------------------------
+# 공용 호출 스케줄러 (프로세스 전체 속도 제한 + 같은 요청 합치기)
+# 모든 용의자 호출(chat.completions.create)이 지나가는 클라이언트 래퍼. GAME_SCHEDULER=1 일 때 끼운다.
+#  - 토큰 버킷 두 개: 분당 요청 수(GAME_RATE_RPM) / 분당 토큰 수(GAME_RATE_TPM). 0 이면 제한 없음.
+#    요청 토큰 = 프롬프트 추정치 + max_tokens (공급자가 요청을 받을 때 세는 방식). 버킷 크기는
+#    GAME_RATE_BURST_S 초 분량이고, 공급자 한도와 시계 차이를 감안해 GAME_RATE_HEADROOM 만큼만 쓴다.
+#  - 공정 대기열: 세션마다 줄을 따로 두고 돌아가며 하나씩 내보낸다 (한 탭의 단체 심문이 다른 탭을 막지 않는다).
+#    미리 생성(game_prefetch) 같은 백그라운드 호출은 사람이 기다리는 호출이 없을 때만 나간다.
+#  - 대기 중에는 queue_listener(순번) 를 불러 UI 가 "심문 대기 중…" 을 보여 줄 수 있다.
+#    GAME_RATE_MAX_WAIT 초(와 턴에 남은 시간 중 짧은 쪽) 넘게 못 나가면 QueueTimeout
+#    (재시도해도 줄만 길어지므로 호출 정책은 바로 끝낸다). 기다린 시간은 시도 타임아웃에 넣지 않고
+#    (game_policy.AttemptClock), 차례가 오면 요청 타임아웃을 턴에 남은 시간 안으로 줄인다.
+#  - 같은 요청 합치기: 메시지/파라미터가 같은 요청이 이미 나가 있으면 새로 부르지 않고 그 응답을 나눠 받는다
+#    (스트리밍은 조각을 그대로 함께 받는다). 나눠 받은 쪽의 usage 는 비워 비용을 두 번 세지 않는다.
+#  - 공급자가 그래도 429 를 주면 retry-after 동안 모든 호출을 멈춘다.
+# --------------------------------
+SCHEDULER_ENABLED = os.getenv("GAME_SCHEDULER", "0") == "1"
+RATE_RPM = float(os.getenv("GAME_RATE_RPM", "0"))
+RATE_TPM = float(os.getenv("GAME_RATE_TPM", "0"))
+RATE_BURST_S = float(os.getenv("GAME_RATE_BURST_S", "10"))
+RATE_HEADROOM = float(os.getenv("GAME_RATE_HEADROOM", "0.9"))
+RATE_MAX_WAIT = float(os.getenv("GAME_RATE_MAX_WAIT", "30"))
+COALESCE = os.getenv("GAME_COALESCE", "1") == "1"
+RETRY_AFTER_DEFAULT = 1.0  # 429 에 읽을 수 있는 retry-after 가 없을 때 멈추는 시간
+
+# 대기열 순번 알림 (호출한 스레드에서 불린다). 앱이 심문 직전에 설정한다.
+queue_listener: ContextVar = ContextVar("game_queue_listener", default=None)
+# 백그라운드 호출 표시 (미리 생성)
+background_call: ContextVar[bool] = ContextVar("game_background_call", default=False)
+
+
+class QueueTimeout(LookupError):
+    # 대기열에서 GAME_RATE_MAX_WAIT 안에 차례가 오지 않음
+    def __init__(self, waited: float, position: int):
+        super().__init__(f"호출 대기열 {waited:.0f}초 초과 (대기 순번 {position})")
+
+
+def request_tokens(messages: list[dict], max_tokens: int | None) -> int:
+    # 속도 제한용 요청 토큰 수 (목 서버도 같은 식으로 센다)
+    return message_tokens(messages) + (max_tokens or 0)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_s: float = RATE_BURST_S):
+        self.rate = per_minute / 60
+        self.capacity = max(self.rate * burst_s, 1.0)
+        self.level = self.capacity
+        self._t = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._t) * self.rate)
+        self._t = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        # amount 를 꺼낼 수 있을 때까지 남은 초 (0 이면 지금 가능). 버킷보다 큰 요청은 가득 찼을 때 보낸다
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount  # 버킷보다 큰 요청은 빚(음수)으로 남겨 다음 요청이 그만큼 기다린다
+
+    def drain(self):
+        self.level = min(self.level, 0.0)
+
+
+class _Ticket:
+    __slots__ = ("session", "tokens", "background", "t0")
+
+    def __init__(self, session: str, tokens: int, background: bool):
+        self.session, self.tokens, self.background = session, tokens, background
+        self.t0 = time.monotonic()
+
+
+class Scheduler:
+    def __init__(self, rpm: float = RATE_RPM, tpm: float = RATE_TPM, headroom: float = RATE_HEADROOM,
+                 max_wait: float = RATE_MAX_WAIT, coalesce: bool = COALESCE):
+        self.rpm = TokenBucket(rpm * headroom) if rpm else None
+        self.tpm = TokenBucket(tpm * headroom) if tpm else None
+        self.max_wait = max_wait
+        self.coalesce = coalesce
+        self._cond = threading.Condition()
+        self._queues: OrderedDict[str, deque] = OrderedDict()  # 세션 → 줄 (앞 세션이 다음 차례)
+        self._background: deque = deque()
+        self._paused_until = 0.0
+        self._inflight: dict[str, object] = {}  # 합치기: 요청 키 → Future / _Broadcast
+        self._stats = {"granted": 0, "queued": 0, "max_queue": 0, "timeouts": 0, "coalesced": 0, "throttled": 0}
+
+    # ---- 대기열 ----
+    def _head(self) -> _Ticket | None:
+        if self._queues:
+            return next(iter(self._queues.values()))[0]
+        return self._background[0] if self._background else None
+
+    def _waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values()) + len(self._background)
+
+    def position(self, ticket: _Ticket) -> int:
+        # 돌아가며 내보낼 때 앞에 있는 호출 수 + 1
+        if ticket.background:
+            return self._waiting() - len(self._background) + self._background.index(ticket) + 1
+        k = self._queues[ticket.session].index(ticket)
+        ahead = 0
+        for session, q in self._queues.items():
+            if session == ticket.session:
+                ahead += k
+                break
+            ahead += min(len(q), k + 1)
+        for session, q in reversed(self._queues.items()):
+            if session == ticket.session:
+                break
+            ahead += min(len(q), k)
+        return ahead + 1
+
+    def _enqueue(self, ticket: _Ticket):
+        if ticket.background:
+            self._background.append(ticket)
+        else:
+            self._queues.setdefault(ticket.session, deque()).append(ticket)
+        self._stats["max_queue"] = max(self._stats["max_queue"], self._waiting())
+
+    def _remove(self, ticket: _Ticket):
+        if ticket.background:
+            self._background.remove(ticket)
+            return
+        q = self._queues[ticket.session]
+        q.remove(ticket)
+        if not q:
+            del self._queues[ticket.session]
+
+    def _grant(self, ticket: _Ticket):
+        q = self._background if ticket.background else self._queues[ticket.session]
+        q.popleft()
+        if not ticket.background:
+            if q:
+                self._queues.move_to_end(ticket.session)  # 다음은 다른 세션 차례
+            else:
+                del self._queues[ticket.session]
+        if self.rpm is not None:
+            self.rpm.take(1)
+        if self.tpm is not None:
+            self.tpm.take(ticket.tokens)
+        self._stats["granted"] += 1
+
+    def _try(self, ticket: _Ticket) -> float | None:
+        # 0 → 보내도 됨, 양수 → 그만큼 뒤에 다시 보기, None → 내 차례 아님
+        if self._head() is not ticket:
+            return None
+        now = time.monotonic()
+        wait = max(self._paused_until - now, 0.0)
+        if self.rpm is not None:
+            wait = max(wait, self.rpm.wait_for(1, now))
+        if self.tpm is not None:
+            wait = max(wait, self.tpm.wait_for(ticket.tokens, now))
+        return wait
+
+    def _ticket(self, messages: list[dict], params: dict) -> _Ticket:
+        return _Ticket(current_session.get(), request_tokens(messages, params.get("max_tokens")),
+                       background_call.get())
+
+    def _end(self, ticket: _Ticket) -> float:
+        # 대기 마감: GAME_RATE_MAX_WAIT 와 턴 마감 중 이른 쪽
+        end = turn_end.get()
+        return min(ticket.t0 + self.max_wait, end if end is not None else float("inf"))
+
+    def _check(self, ticket: _Ticket, end: float) -> tuple[bool, float | None]:
+        # (보내도 되나, 다시 볼 때까지 초). 호출부에서 self._cond 를 잡은 상태
+        wait = self._try(ticket)
+        if wait == 0:
+            self._grant(ticket)
+            self._cond.notify_all()
+            METRICS.observe("queue_wait", (time.monotonic() - ticket.t0) * 1000)
+            return True, None
+        if time.monotonic() >= end:
+            position = self.position(ticket)
+            self._remove(ticket)
+            self._stats["timeouts"] += 1
+            self._cond.notify_all()
+            raise QueueTimeout(time.monotonic() - ticket.t0, position)
+        return False, wait
+
+    def _waiting_ticket(self, ticket: _Ticket) -> bool:
+        q = self._background if ticket.background else self._queues.get(ticket.session, ())
+        return ticket in q
+
+    def _abandon(self, ticket: _Ticket):
+        # 대기 중 예외/취소: 아직 줄에 있으면 빠진다
+        with self._cond:
+            if self._waiting_ticket(ticket):
+                self._remove(ticket)
+                self._cond.notify_all()
+
+    def acquire(self, messages: list[dict], params: dict):
+        ticket = self._ticket(messages, params)
+        listener = None if ticket.background else queue_listener.get()
+        end = self._end(ticket)
+        shown = None
+        with self._cond:
+            self._enqueue(ticket)
+        try:
+            while True:
+                with self._cond:
+                    ok, wait = self._check(ticket, end)
+                    if ok:
+                        return
+                    position = self.position(ticket)
+                    if position == shown:
+                        self._cond.wait(min(wait if wait is not None else 0.5, max(end - time.monotonic(), 0.01)))
+                        continue
+                    if shown is None:
+                        self._stats["queued"] += 1
+                    shown = position
+                if listener is not None:
+                    listener(position)  # UI 갱신은 잠금 밖에서
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    async def aacquire(self, messages: list[dict], params: dict):
+        # 공용 이벤트 루프를 막지 않도록 잠깐씩 잠들며 차례를 본다. 취소되면 줄에서 빠진다
+        # 기다리는 동안 시도 시계를 멈추고, 차례가 오면 그때부터 다시 잰다.
+        # 순번 알림은 루프 스레드에서 불리므로 UI 쪽은 값만 받아 두고 자기 스레드에서 그린다 (group_interrogate)
+        ticket = self._ticket(messages, params)
+        listener = None if ticket.background else queue_listener.get()
+        clock = attempt_clock.get()
+        end = self._end(ticket)
+        shown = None
+        if clock is not None:
+            clock.hold()
+        with self._cond:
+            self._enqueue(ticket)
+        try:
+            while True:
+                with self._cond:
+                    ok, wait = self._check(ticket, end)
+                    if ok:
+                        break
+                    position = self.position(ticket)
+                    if shown is None:
+                        self._stats["queued"] += 1
+                if listener is not None and position != shown:
+                    listener(position)
+                shown = position
+                await asyncio.sleep(min(wait if wait is not None else 0.05, 0.05))
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        finally:
+            if clock is not None:
+                clock.restart()
+
+    def throttled(self, error: openai.RateLimitError):
+        # 공급자 429: retry-after 동안 모두 멈추고 버킷을 비운다
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        pause = _retry_after(headers)
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            for bucket in (self.rpm, self.tpm):
+                if bucket is not None:
+                    bucket.drain()
+            self._stats["throttled"] += 1
+        METRICS.add("rate_limited")
+
+    # ---- 합치기 ----
+    def join(self, key: str, make):
+        # (리더인가, 공유 객체). 이미 나가 있는 같은 요청이 있으면 그 공유 객체를 돌려준다
+        with self._cond:
+            shared = self._inflight.get(key)
+            if shared is not None:
+                self._stats["coalesced"] += 1
+                METRICS.add("coalesced")
+                return False, shared
+            shared = self._inflight[key] = make()
+            return True, shared
+
+    def leave(self, key: str, shared):
+        with self._cond:
+            if self._inflight.get(key) is shared:
+                del self._inflight[key]
+
+    def report(self) -> dict:
+        with self._cond:
+            out = dict(self._stats)
+            out["waiting"] = self._waiting()
+            out["sessions_waiting"] = len(self._queues)
+            out["inflight"] = len(self._inflight)
+            out["paused_s"] = round(max(self._paused_until - time.monotonic(), 0.0), 1)
+            for name in ("rpm", "tpm"):
+                bucket = getattr(self, name)
+                if bucket is not None:
+                    bucket._refill(time.monotonic())
+                    out[f"{name}_level"] = round(bucket.level, 1)
+                    out[f"{name}_capacity"] = round(bucket.capacity, 1)
+        return out
+
+
+class _Broadcast:
+    # 리더 스트림의 조각을 따라 받는 쪽에 그대로 흘려보낸다
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.cond = threading.Condition()
+        self.opened = threading.Event()  # 리더가 대기열을 지나 스트림을 열었음 (또는 끝남)
+
+    def push(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error: BaseException | None = None):
+        with self.cond:
+            if not self.done:
+                self.done, self.error = True, error
+                self.cond.notify_all()
+        self.opened.set()
+
+    def follow(self, timeout: float | None):
+        i = 0
+        end = time.monotonic() + timeout if timeout else None
+        while True:
+            with self.cond:
+                while i == len(self.chunks) and not self.done:
+                    left = end - time.monotonic() if end is not None else None
+                    if left is not None and left <= 0:
+                        raise TimeoutError("합친 스트림 대기 시간 초과")
+                    self.cond.wait(left)
+                if i == len(self.chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                chunk = self.chunks[i]
+            i += 1
+            if chunk.choices:  # usage 조각은 리더만 받는다
+                yield chunk
+
+
+class LeaderStream:
+    def __init__(self, inner, broadcast: _Broadcast, on_done):
+        self._inner, self._broadcast, self._on_done = inner, broadcast, on_done
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._inner.close()
+        self._finish(TimeoutError("합친 스트림의 리더가 중간에 끊김"))
+
+    def _finish(self, error=None):
+        self._broadcast.finish(error)
+        self._on_done()
+
+    def __iter__(self):
+        try:
+            for chunk in self._inner:
+                self._broadcast.push(chunk)
+                yield chunk
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+
+class FollowerStream:
+    def __init__(self, broadcast: _Broadcast, timeout: float | None):
+        self._broadcast, self._timeout = broadcast, timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        return self._broadcast.follow(self._timeout)
+
+
+def _retry_after(headers) -> float:
+    # retry-after-ms / retry-after (초 또는 HTTP 날짜, RFC 9110). 읽을 수 없으면 기본 1초
+    try:
+        if headers.get("retry-after-ms"):
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        value = headers.get("retry-after")
+        if not value:
+            return RETRY_AFTER_DEFAULT
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            when = parsedate_to_datetime(value)
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)  # "-0000" 은 UTC
+            return max(when.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, OverflowError):
+        return RETRY_AFTER_DEFAULT
+
+
+def _granted(params: dict) -> dict:
+    # 차례가 온 뒤: 요청 타임아웃을 턴에 남은 시간 안으로 줄인다
+    end = turn_end.get()
+    if end is None or params.get("timeout") is None:
+        return params
+    return {**params, "timeout": max(min(params["timeout"], end - time.monotonic()), 0.01)}
+
+
+def _follow_timeout(scheduler: "Scheduler", params: dict) -> float | None:
+    # 합친 쪽은 리더의 대기열 대기 + 호출을 함께 기다린다 (턴 마감까지)
+    end = turn_end.get()
+    if end is not None:
+        return max(end - time.monotonic(), 0.01)
+    timeout = params.get("timeout")
+    return None if timeout is None else scheduler.max_wait + timeout
+
+
+def _shared_copy(resp):
+    # 나눠 받은 응답: 비용은 리더가 이미 셌다
+    return resp.model_copy(update={"usage": None})
+
+
+class _Completions:
+    def __init__(self, scheduler: Scheduler, inner):
+        self._scheduler, self._inner = scheduler, inner
+
+    def _call(self, messages: list[dict], stream: bool, params: dict):
+        self._scheduler.acquire(messages, params)
+        try:
+            return self._inner.create(messages=messages, stream=stream, **_granted(params))
+        except openai.RateLimitError as e:
+            self._scheduler.throttled(e)
+            raise
+
+    def create(self, *, messages: list[dict], stream: bool = False, **params):
+        if not self._scheduler.coalesce:
+            return self._call(messages, stream, params)
+        key = ("s:" if stream else "n:") + request_key(messages, params)
+        leader, shared = self._scheduler.join(key, _Broadcast if stream else Future)
+        if stream:
+            if not leader:
+                # 리더가 스트림을 열 때까지 기다린 뒤 돌려준다 (스트림 마감 시간은 열린 뒤부터 잰다)
+                if not shared.opened.wait(_follow_timeout(self._scheduler, params)):
+                    raise TimeoutError("합친 스트림의 리더가 턴 마감 안에 열리지 않음")
+                return FollowerStream(shared, params.get("timeout"))
+            try:
+                inner = self._call(messages, stream, params)
+            except BaseException as e:
+                shared.finish(e)
+                self._scheduler.leave(key, shared)
+                raise
+            shared.opened.set()
+            return LeaderStream(inner, shared, lambda: self._scheduler.leave(key, shared))
+        if not leader:
+            return _shared_copy(shared.result(_follow_timeout(self._scheduler, params)))
+        try:
+            resp = self._call(messages, stream, params)
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(resp)
+            return resp
+        finally:
+            self._scheduler.leave(key, shared)
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, *, messages: list[dict], stream: bool = False, **params):
+        if stream:
+            raise ValueError("스케줄러는 비동기 스트리밍을 지원하지 않음")
+        key = "n:" + request_key(messages, params)
+        leader, shared = self._scheduler.join(key, Future) if self._scheduler.coalesce else (True, None)
+        if not leader:
+            clock = attempt_clock.get()
+            if clock is not None:
+                clock.hold()  # 리더의 대기열 대기까지 함께 기다린다 (턴 마감은 그대로)
+            return _shared_copy(await asyncio.wrap_future(shared))
+        if shared is not None:
+            shared.set_running_or_notify_cancel()  # 합친 쪽이 취소돼도 공유 Future 는 취소되지 않는다
+        try:
+            await self._scheduler.aacquire(messages, params)
+            try:
+                resp = await self._inner.create(messages=messages, **_granted(params))
+            except openai.RateLimitError as e:
+                self._scheduler.throttled(e)
+                raise
+        except BaseException as e:
+            if shared is not None:
+                # 리더가 시도 타임아웃으로 취소돼도 합친 쪽에는 재시도할 수 있는 오류로 넘긴다
+                cancelled = isinstance(e, asyncio.CancelledError)
+                shared.set_exception(TimeoutError("합친 요청의 리더가 취소됨") if cancelled else e)
+            raise
+        else:
+            if shared is not None:
+                shared.set_result(resp)
+            return resp
+        finally:
+            if shared is not None:
+                self._scheduler.leave(key, shared)
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class ScheduledClient:
+    # OpenAI / AsyncOpenAI (또는 로컬 백엔드) 를 감싸 모든 호출을 스케줄러에 통과시킨다
+    def __init__(self, inner, scheduler: Scheduler, is_async: bool = False):
+        self._inner = inner
+        self.chat = _Chat((_AsyncCompletions if is_async else _Completions)(scheduler, inner.chat.completions))
+
+    def close(self):
+        return self._inner.close()
+
+
+SCHEDULER = Scheduler() if SCHEDULER_ENABLED else None
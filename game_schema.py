@@ -0,0 +1,230 @@
+import os
+import threading
+from functools import lru_cache
+
+from game_metrics import METRICS
+from game_prompts import OUTPUT_FORMAT
+from game_scenario import load_scenario
+from game_text import expand_compact, markdown_to_tokens, tokens_to_markdown
+
+# --------------------------------
+# 용의자 답변 스키마
+# 공급자 structured output(json_schema, strict) 으로 형식을 강제하고,
+# 받은 payload 는 스키마에서 만든 전용 검사 함수로 매번 확인한다 (jsonschema 일반 검사기 대신 한 번 훑기).
+# 어긋나면 로컬에서 고칠 수 있는 것(w 타입, "/" 토큰, speaker, utterance_type, 빠진 필드)은 고치고,
+# 고칠 수 없으면 엔진이 한 번만 다시 묻는다. 결과는 용의자별로 집계한다.
+# 압축 출력 형식(compact)도 검사/수리는 펼친 payload 기준으로 같다.
+# --------------------------------
+STRUCTURED_OUTPUT = os.getenv("GAME_STRUCTURED_OUTPUT", "1") != "0"
+
+UTTERANCE_TYPES = ("core", "normal", "confession", "summary")
+MAX_WORDS = 120
+
+
+class InvalidReply(ValueError):
+    # 로컬 수리로도 스키마를 못 맞춘 답
+    def __init__(self, errors: list[str]):
+        super().__init__("; ".join(errors[:3]))
+        self.errors = errors
+
+
+@lru_cache(maxsize=None)
+def reply_schema(scenario_id: str, output_format: str = OUTPUT_FORMAT) -> dict:
+    speakers = sorted(load_scenario(scenario_id).suspects)
+    if output_format == "compact":
+        return {
+            "type": "object",
+            # text 를 맨 앞에 두어 스트리밍 첫 단어가 빨리 나오게 한다 (strict 모드는 속성 순서대로 생성)
+            "properties": {
+                "text": {"type": "string"},
+                "speaker": {"type": "string", "enum": speakers},
+                "utterance_type": {"type": "string", "enum": list(UTTERANCE_TYPES)},
+            },
+            "required": ["text", "speaker", "utterance_type"],
+            "additionalProperties": False,
+        }
+    return {
+        "type": "object",
+        "properties": {
+            "json_list": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"w": {"type": "string"}, "bold": {"type": "boolean"}},
+                    "required": ["w", "bold"],
+                    "additionalProperties": False,
+                },
+            },
+            "speaker": {"type": "string", "enum": speakers},
+            "utterance_type": {"type": "string", "enum": list(UTTERANCE_TYPES)},
+            "combined_text_md": {"type": "string"},
+        },
+        # strict 모드는 모든 필드를 required 로 요구한다
+        "required": ["json_list", "speaker", "utterance_type", "combined_text_md"],
+        "additionalProperties": False,
+    }
+
+
+@lru_cache(maxsize=None)
+def response_format(scenario_id: str, output_format: str = OUTPUT_FORMAT) -> dict:
+    # MODEL_PARAMS["response_format"] 자리에 들어갈 값
+    if not STRUCTURED_OUTPUT:
+        return {"type": "json_object"}
+    name = "suspect_reply_compact" if output_format == "compact" else "suspect_reply"
+    return {"type": "json_schema",
+            "json_schema": {"name": name, "strict": True, "schema": reply_schema(scenario_id, output_format)}}
+
+
+def validate_reply(payload, speaker: str) -> list[str]:
+    # reply_schema 를 손으로 풀어 쓴 검사 (+ 스키마로 표현 못 하는 규칙: 빈 단어/"/" 토큰, 화자 일치)
+    if not isinstance(payload, dict):
+        return [f"payload 가 객체가 아님: {type(payload).__name__}"]
+    errors = []
+    words = payload.get("json_list")
+    if not isinstance(words, list) or not words:
+        errors.append("json_list 없음/비어 있음")
+    else:
+        if len(words) > MAX_WORDS:
+            errors.append(f"json_list 가 너무 김: {len(words)}")
+        for i, tok in enumerate(words):
+            if not isinstance(tok, dict):
+                errors.append(f"json_list[{i}] 가 객체가 아님")
+                continue
+            w = tok.get("w")
+            if not isinstance(w, str):
+                errors.append(f"json_list[{i}].w 가 문자열이 아님")
+            elif not w.strip() or w.strip()[0] == "/" or w != w.strip():
+                errors.append(f"json_list[{i}].w 형식: {w!r}")
+            if not isinstance(tok.get("bold"), bool):
+                errors.append(f"json_list[{i}].bold 가 bool 이 아님")
+            if len(tok) != 2:
+                errors.append(f"json_list[{i}] 에 다른 필드")
+    if payload.get("speaker") != speaker:
+        errors.append(f"speaker {payload.get('speaker')!r} != {speaker!r}")
+    if payload.get("utterance_type") not in UTTERANCE_TYPES:
+        errors.append(f"utterance_type {payload.get('utterance_type')!r}")
+    if not isinstance(payload.get("combined_text_md"), str) or not payload["combined_text_md"].strip():
+        errors.append("combined_text_md 없음")
+    return errors
+
+
+def repair_reply(payload, speaker: str) -> dict:
+    # 모델 호출 없이 고칠 수 있는 것만 고친 새 payload. 못 고치면 InvalidReply.
+    if isinstance(payload, list):
+        payload = {"json_list": payload}
+    payload = expand_compact(payload)
+    if not isinstance(payload, dict):
+        raise InvalidReply([f"payload 가 객체가 아님: {type(payload).__name__}"])
+
+    words = []
+    raw_words = payload.get("json_list")
+    for tok in raw_words if isinstance(raw_words, list) else []:
+        if isinstance(tok, str):
+            tok = {"w": tok}
+        if not isinstance(tok, dict):
+            continue
+        w = tok.get("w")
+        w = "" if w is None else str(w)
+        w = w.strip().lstrip("/").strip()
+        if w:
+            words.append({"w": w, "bold": bool(tok.get("bold", False))})
+    md = payload.get("combined_text_md")
+    md = md.strip() if isinstance(md, str) else ""
+    if not words and md:
+        words = markdown_to_tokens(md)
+    if not words:
+        raise InvalidReply(["답변 내용 없음"])
+    if len(words) > MAX_WORDS:
+        words, md = words[:MAX_WORDS], ""  # 잘라 낸 단어 목록에 맞춰 마크다운을 다시 만든다
+    # 다른 용의자 목소리로 한 답은 형식이 아니라 내용 오류 → 다시 묻는다 (빠진 speaker 만 채운다)
+    if payload.get("speaker") not in (None, "", speaker):
+        raise InvalidReply([f"speaker {payload.get('speaker')!r} != {speaker!r}"])
+
+    utt_type = payload.get("utterance_type")
+    if utt_type not in UTTERANCE_TYPES:
+        utt_type = "core" if any(t["bold"] for t in words) else "normal"
+    return {
+        "json_list": words,
+        "speaker": speaker,
+        "utterance_type": utt_type,
+        "combined_text_md": md or tokens_to_markdown(words),
+    }
+
+
+# --------------------------------
+# 검사 결과 집계 (용의자별 ok / repaired / reasked / failed)
+# --------------------------------
+class ValidationStats:
+    OUTCOMES = ("ok", "repaired", "reasked", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_suspect: dict[str, dict] = {}
+
+    def record(self, suspect: str, outcome: str, errors: list[str] = ()):
+        with self._lock:
+            row = self._by_suspect.setdefault(suspect, dict.fromkeys(self.OUTCOMES, 0))
+            row[outcome] += 1
+        METRICS.add(f"schema_{outcome}", suspect=suspect)
+        for e in errors[:5]:
+            METRICS.add("schema_errors", suspect=suspect, field=e.split(" ", 1)[0].split("[", 1)[0])
+
+    def report(self) -> list[dict]:
+        with self._lock:
+            rows = {k: dict(v) for k, v in self._by_suspect.items()}
+        out = []
+        for suspect in sorted(rows):
+            row = rows[suspect]
+            total = sum(row.values())
+            out.append({"suspect": suspect, **row, "invalid_ratio": (total - row["ok"]) / total if total else 0.0})
+        return out
+
+
+VALIDATION = ValidationStats()
+
+
+# --------------------------------
+# 벤치마크: python game_schema.py
+# 정상/깨진 payload 검사·수리 속도와 수리 결과가 스키마를 통과하는지 확인한다.
+# --------------------------------
+def _bench(rounds: int = 20_000):
+    import time
+
+    good = {"json_list": [{"w": "난", "bold": True}, {"w": "아니다", "bold": True}, {"w": "D가", "bold": False},
+                          {"w": "했다.", "bold": False}],
+            "speaker": "A", "utterance_type": "core", "combined_text_md": "**난 아니다** D가 했다."}
+    bad = [
+        {"json_list": [{"w": 7, "bold": 1}, {"w": "/", "bold": False}, {"w": "/다툼이", "bold": False}],
+         "utterance_type": "weird"},
+        {"combined_text_md": "**난 아니다**. D가 했다", "speaker": "A"},
+        [{"w": "난", "bold": False}, {"w": "몰라", "bold": False}],
+        {"json_list": [" 공백 ", "문자열"], "utterance_type": "normal", "combined_text_md": ""},
+    ]
+    assert validate_reply(good, "A") == []
+    for p in bad:
+        assert validate_reply(p, "A"), p
+        fixed = repair_reply(p, "A")
+        assert validate_reply(fixed, "A") == [], (p, fixed, validate_reply(fixed, "A"))
+    long = {"json_list": [{"w": f"w{i}", "bold": False} for i in range(MAX_WORDS + 10)], "speaker": "A",
+            "utterance_type": "normal", "combined_text_md": " ".join(f"w{i}" for i in range(MAX_WORDS + 10))}
+    fixed = repair_reply(long, "A")
+    assert fixed["combined_text_md"] == tokens_to_markdown(fixed["json_list"]), fixed["combined_text_md"][-20:]
+    try:
+        repair_reply({**good, "speaker": "B"}, "A")
+    except InvalidReply:
+        pass
+    else:
+        raise AssertionError("다른 용의자 목소리의 답은 수리하지 않고 다시 물어야 함")
+    print("repair: all broken samples validate after repair (wrong speaker → re-ask)")
+
+    for name, fn in (("validate ok", lambda: validate_reply(good, "A")),
+                     ("validate bad", lambda: validate_reply(bad[0], "A")),
+                     ("repair", lambda: repair_reply(bad[0], "A"))):
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        print(f"{name:<13} {(time.perf_counter() - t0) / rounds * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    _bench()
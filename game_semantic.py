@@ -0,0 +1,252 @@
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from game_cache import CACHE_TTL, normalize_question
+from game_scenario import load_scenario
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # 선택 의존성: 없으면 문자 n-gram 해싱 벡터로 대체
+    SentenceTransformer = None
+
+# --------------------------------
+# 의미 유사 질문 매칭
+# 용의자별 과거 질문을 벡터로 보관하고 코사인 유사도로 가장 가까운 질문을 찾는다.
+# "너 범인이야?" / "네가 죽였어?" 같은 바꿔 말하기를 잡아 답을 재사용하거나,
+# 같은 방에서 같은 질문을 반복하는지 알려준다.
+# 바꿔 말하기는 문장 임베딩 모델(GAME_EMBED_MODEL)이 있어야 잡힌다. 기본 문자 n-gram 벡터는
+# 글자가 거의 같은 질문("범인이 누구야" / "범인은 누구야?")만 잡고, 위 두 질문은 0점이다.
+# 글자가 비슷해도 뜻이 반대일 수 있으므로 ("D가 죽였다고 생각해?" / "D가 안 죽였다고 생각해?")
+# 답을 재사용하기 전에 부정어와 용의자 이름이 같은지 확인한다.
+# --------------------------------
+EMBED_MODEL = os.getenv("GAME_EMBED_MODEL", "")  # 예: paraphrase-multilingual-MiniLM-L12-v2
+SEMANTIC_THRESHOLD = float(os.getenv("GAME_SEMANTIC_THRESHOLD", "0.9"))
+REPEAT_THRESHOLD = float(os.getenv("GAME_REPEAT_THRESHOLD", "0.85"))
+SEMANTIC_INDEXES = int(os.getenv("GAME_SEMANTIC_INDEXES", "1024"))  # 맥락별 인덱스 최대 수 (LRU)
+
+_NEGATION = re.compile(r"(?<!\w)(?:안|못)(?!\w)|않|없|아니|말고|모르|몰라|몰랐")
+
+
+class NgramEmbedder:
+    # 문자 2~3-gram 을 고정 차원으로 해싱한 로그 TF 벡터 (L2 정규화).
+    # IDF 는 쓰지 않는다: 인덱스가 자라도 이미 저장된 벡터를 다시 계산할 필요가 없다.
+    name = "char-ngram"
+
+    def __init__(self, dim: int = 512, ngram: tuple[int, int] = (2, 3)):
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text: str) -> list[int]:
+        t = f" {normalize_question(text)} "
+        lo, hi = self.ngram
+        return [zlib.crc32(t[i:i + n].encode("utf-8")) % self.dim
+                for n in range(lo, hi + 1) for i in range(len(t) - n + 1)]
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            idx = self._features(text)
+            if idx:
+                out[row] = np.bincount(idx, minlength=self.dim)
+        np.log1p(out, out=out)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class SentenceEmbedder:
+    # CPU 문장 임베딩 모델 (sentence-transformers 가 설치돼 있고 GAME_EMBED_MODEL 이 지정된 경우)
+    def __init__(self, model_name: str):
+        self.name = model_name
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+@lru_cache(maxsize=1)
+def get_embedder():
+    if EMBED_MODEL and SentenceTransformer is not None:
+        return SentenceEmbedder(EMBED_MODEL)
+    return NgramEmbedder()
+
+
+class QuestionIndex:
+    # 정규화된 벡터 행렬 + 항목 목록. 용량은 두 배씩 늘린다.
+    def __init__(self, embedder=None, capacity: int = 64):
+        self.embedder = embedder or get_embedder()
+        self._vecs = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self.items: list[dict] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, text: str, **meta):
+        vec = self.embedder.embed([text])[0]
+        with self._lock:
+            n = len(self.items)
+            if n == len(self._vecs):
+                grown = np.zeros((n * 2, self._vecs.shape[1]), dtype=np.float32)
+                grown[:n] = self._vecs
+                self._vecs = grown
+            self._vecs[n] = vec
+            self.items.append({"text": text, **meta})
+
+    def search(self, text: str, k: int = 1) -> list[tuple[float, dict]]:
+        if not self.items:
+            return []
+        q = self.embedder.embed([text])[0]
+        with self._lock:
+            n = len(self.items)
+            scores = self._vecs[:n] @ q
+            items = self.items[:n]
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), items[i]) for i in top]
+
+    def __sizeof__(self) -> int:
+        # 세션 메모리 예산(game_session.deep_size)용: 벡터 버퍼 + 항목. 공유 임베더는 빼고 센다
+        items = sum(sys.getsizeof(it) + sum(sys.getsizeof(v) for v in it.values()) for it in self.items)
+        return object.__sizeof__(self) + self._vecs.nbytes + sys.getsizeof(self.items) + items
+
+
+@lru_cache(maxsize=None)
+def _names(scenario_id: str) -> re.Pattern:
+    ids = sorted((normalize_question(sid) for sid in load_scenario(scenario_id).suspects), key=len, reverse=True)
+    return re.compile(r"(?<![a-z0-9])(?:%s)(?![a-z0-9])" % "|".join(map(re.escape, ids)))
+
+
+def _guard(scenario_id: str, question: str) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    # 답을 재사용하려면 같아야 하는 부분: (부정어, 용의자 이름) — 순서와 상관없이 비교한다
+    text = normalize_question(question)
+    return tuple(sorted(_NEGATION.findall(text))), tuple(sorted(_names(scenario_id).findall(text)))
+
+
+class SemanticMatcher:
+    # (시나리오, 용의자, 히스토리 해시)별 과거 질문 → 답 인덱스. 프로세스 전체가 공유한다.
+    # 같은 대화 맥락에서 나온 답만 재사용해야 하므로 맥락마다 인덱스를 나눈다.
+    # 히스토리 해시는 턴마다 바뀌므로 인덱스는 답을 저장할 때만 만들고 (작게 시작),
+    # 응답 캐시처럼 개수(LRU)와 나이(TTL)로 묶는다.
+    def __init__(self, threshold: float = SEMANTIC_THRESHOLD, max_indexes: int = SEMANTIC_INDEXES,
+                 ttl: float = CACHE_TTL):
+        self.threshold = threshold
+        self.max_indexes = max_indexes
+        self.ttl = ttl
+        self._indexes: OrderedDict[tuple[str, str, str], tuple[float, QuestionIndex]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "guarded": 0, "evicted": 0}
+
+    def _index(self, scenario_id: str, suspect: str, history_hash: str, create: bool = False) -> QuestionIndex | None:
+        key = (scenario_id, suspect, history_hash)
+        now = time.time()
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self._indexes[key]
+                self._stats["evicted"] += 1
+                entry = None
+            if entry is None:
+                if not create:
+                    return None
+                entry = self._indexes[key] = (now, QuestionIndex(capacity=4))
+                while len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+                    self._stats["evicted"] += 1
+            self._indexes.move_to_end(key)
+            return entry[1]
+
+    def lookup(self, scenario_id: str, suspect: str, history_hash: str, question: str) -> tuple[float, str] | None:
+        # 같은 대화 맥락(history_hash)에서 충분히 비슷한 질문의 답 (score, raw_json).
+        # 글자 그대로 같은 질문은 응답 캐시(변형 K개 회전)가 맡으므로 여기선 건너뛴다.
+        index = self._index(scenario_id, suspect, history_hash)
+        found = index.search(question) if index is not None else []
+        with self._lock:
+            self._stats["lookups"] += 1
+            if not found or found[0][0] < self.threshold:
+                return None
+            if normalize_question(found[0][1]["text"]) == normalize_question(question):
+                return None
+            if _guard(scenario_id, found[0][1]["text"]) != _guard(scenario_id, question):
+                self._stats["guarded"] += 1  # 부정어/이름이 다르면 뜻이 다를 수 있다
+                return None
+            self._stats["hits"] += 1
+        score, item = found[0]
+        return score, item["reply"]
+
+    def remember(self, scenario_id: str, suspect: str, history_hash: str, question: str, reply: str):
+        self._index(scenario_id, suspect, history_hash, create=True).add(question, reply=reply)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["indexes"] = len(self._indexes)
+            out["questions"] = sum(len(ix) for _, ix in self._indexes.values())
+        out["hit_ratio"] = out["hits"] / out["lookups"] if out["lookups"] else 0.0
+        out["embedder"] = get_embedder().name
+        return out
+
+
+SEMANTIC = SemanticMatcher()
+
+
+def find_repeat(room: dict, question: str, threshold: float = REPEAT_THRESHOLD) -> tuple[float, str] | None:
+    # 같은 방에서 이미 비슷한 질문을 했는지 (score, 이전 질문)
+    # 인덱스는 저장하지 않으므로 (세션 이어하기 등) 없으면 방의 지난 질문으로 다시 만든다
+    index = room.get("question_index")
+    if index is None:
+        index = room["question_index"] = QuestionIndex(capacity=4)  # 세션마다 방마다 생기므로 작게 시작
+        for m in room.get("messages", []):
+            if m["role"] == "user":
+                index.add(m["content"])
+    found = index.search(question)
+    index.add(question)
+    if found and found[0][0] >= threshold:
+        return found[0][0], found[0][1]["text"]
+    return None
+
+
+# --------------------------------
+# 벤치마크: python game_semantic.py
+# 질문 10k 개를 넣고 조회 지연(p50/p95)을 잰다.
+# --------------------------------
+def _bench(n: int = 10_000, queries: int = 500):
+    import random
+    import time
+
+    random.seed(0)
+    subjects = ["범인", "알리바이", "D", "E", "C", "촛대", "장갑", "CCTV", "출입코드", "서재", "부엌", "피해자"]
+    verbs = ["누구야", "어디 있었어", "봤어", "알아", "설명해", "사실이야", "거짓말이지", "왜 숨겨"]
+    make = lambda i: f"{random.choice(subjects)} {random.choice(subjects)} {random.choice(verbs)} {i}"
+
+    index = QuestionIndex()
+    t0 = time.perf_counter()
+    for i in range(n):
+        index.add(make(i), reply="")
+    add_s = time.perf_counter() - t0
+
+    lat = []
+    for i in range(queries):
+        q = make(random.randrange(n))
+        t0 = time.perf_counter()
+        index.search(q)
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    p = lambda x: lat[int(x * (len(lat) - 1))] * 1000
+    print(f"embedder={index.embedder.name} dim={index.embedder.dim} stored={len(index)}")
+    print(f"add: {add_s / n * 1e6:.1f} us/question")
+    print(f"search: p50={p(0.5):.3f} ms p95={p(0.95):.3f} ms max={lat[-1] * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    _bench()
@@ -0,0 +1,289 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+from game_history import render_summary
+from game_prefetch import PREFETCH
+from game_prompts import suspect_prompt
+from game_scenario import load_scenario
+
+# --------------------------------
+# 게임 세션 저장소 (SQLite, WAL)
+# 메시지는 한 줄씩 추가만 한다 (히스토리 전체를 다시 직렬화하지 않는다).
+#   sessions    : 세션 메타 (시나리오, 메모, 열린 힌트)
+#   messages    : (세션, 방, 종류) 별 메시지 로그. 종류 ui = 화면 메시지, model = 모델 히스토리
+#   room_state  : 방별 작은 상태 (확보한 핵심 진술, 히스토리 요약, 모델 히스토리에 남은 메시지 수)
+# 이어하기는 방 목록과 작은 상태만 먼저 읽고, 메시지는 방을 열 때 읽는다.
+# 모델 히스토리는 시스템 프롬프트 + 요약 + 로그 끝 model_keep 개로 다시 만든다.
+# --------------------------------
+SESSION_DB = os.getenv("GAME_SESSION_DB", "game_sessions.db")  # 빈 문자열이면 저장하지 않는다
+
+_UI_FIELDS = ("role", "content", "speaker", "ts", "repeat_of")
+
+
+def _ui_body(m: dict) -> str:
+    # 렌더 캐시(md) 같은 파생 값은 저장하지 않는다
+    return json.dumps({k: m[k] for k in _UI_FIELDS if m.get(k) is not None}, ensure_ascii=False)
+
+
+def _model_keep(room: dict) -> int:
+    # 모델 히스토리에서 시스템 메시지(프롬프트, 요약)를 뺀 메시지 수
+    return sum(1 for m in room["model"] if m["role"] != "system")
+
+
+class SessionStore:
+    def __init__(self, path: str = SESSION_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL 에선 커밋마다 fsync 하지 않아도 일관성은 유지된다
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, scenario TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL,"
+            " note_text TEXT, hints TEXT NOT NULL DEFAULT '[]');"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, room_id TEXT NOT NULL,"
+            " kind TEXT NOT NULL, body TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS messages_room ON messages (session_id, room_id, kind, id);"
+            "CREATE TABLE IF NOT EXISTS room_state ("
+            " session_id TEXT NOT NULL, room_id TEXT NOT NULL, unlocked TEXT NOT NULL DEFAULT '[]',"
+            " summary TEXT, model_keep INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (session_id, room_id));"
+        )
+        self._conn.commit()
+
+    def create(self, scenario_id: str) -> str:
+        session_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (id, scenario, created, updated) VALUES (?, ?, ?, ?)",
+                (session_id, scenario_id, now, now),
+            )
+            self._conn.commit()
+        return session_id
+
+    def append(self, session_id: str, room_id: str, ui: list[dict] = (), model: list[dict] = (),
+               room: dict | None = None):
+        # 한 트랜잭션으로 메시지 줄을 추가하고, room 이 주어지면 방 상태도 갱신한다
+        rows = [(session_id, room_id, "ui", _ui_body(m)) for m in ui]
+        rows += [(session_id, room_id, "model", json.dumps({"role": m["role"], "content": m["content"]},
+                                                          ensure_ascii=False)) for m in model]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, room_id, kind, body) VALUES (?, ?, ?, ?)", rows
+            )
+            if room is not None:
+                summary = room.get("summary")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO room_state (session_id, room_id, unlocked, summary, model_keep)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (session_id, room_id, json.dumps(room.get("unlocked", [])),
+                     json.dumps(summary, ensure_ascii=False) if summary else None, _model_keep(room)),
+                )
+            self._conn.execute("UPDATE sessions SET updated = ? WHERE id = ?", (time.time(), session_id))
+
+    def save_meta(self, session_id: str, note_text: str | None = None, hints: list[int] | None = None):
+        with self._lock, self._conn:
+            if note_text is not None:
+                self._conn.execute("UPDATE sessions SET note_text = ? WHERE id = ?", (note_text, session_id))
+            if hints is not None:
+                self._conn.execute("UPDATE sessions SET hints = ? WHERE id = ?", (json.dumps(hints), session_id))
+
+    def load(self, session_id: str, room_ids: list[str]) -> dict | None:
+        # 세션 메타 + 방별 작은 상태. 메시지는 아직 읽지 않는다 (room["lazy"] = True)
+        with self._lock:
+            meta = self._conn.execute(
+                "SELECT scenario, note_text, hints FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if meta is None:
+                return None
+            states = self._conn.execute(
+                "SELECT room_id, unlocked, summary FROM room_state WHERE session_id = ?", (session_id,)
+            ).fetchall()
+        rooms = {rid: {"messages": [], "model": [], "lazy": True} for rid in room_ids}
+        for rid, unlocked, summary in states:
+            if rid in rooms:
+                rooms[rid]["unlocked"] = json.loads(unlocked)
+                if summary:
+                    rooms[rid]["summary"] = json.loads(summary)
+        return {"scenario": meta[0], "note_text": meta[1], "hints": json.loads(meta[2]), "rooms": rooms}
+
+    def ensure_room(self, session_id: str, rooms: dict, room_id: str) -> dict:
+        # 지연 로딩: 방을 처음 열 때 그 방의 메시지만 읽는다
+        room = rooms[room_id]
+        if not room.pop("lazy", False):
+            return room
+        with self._lock:
+            ui = self._conn.execute(
+                "SELECT body FROM messages WHERE session_id = ? AND room_id = ? AND kind = 'ui' ORDER BY id",
+                (session_id, room_id),
+            ).fetchall()
+            keep = self._conn.execute(
+                "SELECT model_keep FROM room_state WHERE session_id = ? AND room_id = ?", (session_id, room_id)
+            ).fetchone()
+            model = self._conn.execute(
+                "SELECT body FROM messages WHERE session_id = ? AND room_id = ? AND kind = 'model'"
+                " ORDER BY id DESC LIMIT ?",
+                (session_id, room_id, keep[0] if keep else 0),
+            ).fetchall()
+            scenario_id = self._conn.execute(
+                "SELECT scenario FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()[0]
+        room["messages"] = [json.loads(r[0]) for r in ui]
+        suspect = load_scenario(scenario_id).suspect_for_room(room_id)
+        if suspect is not None and model:
+            head = [{"role": "system", "content": suspect_prompt(scenario_id, suspect.id)}]
+            if room.get("summary"):
+                head.append({"role": "system", "content": render_summary(room["summary"])})
+            room["model"] = head + [json.loads(r[0]) for r in reversed(model)]
+        return room
+
+
+SESSIONS = SessionStore() if SESSION_DB else None
+
+
+# --------------------------------
+# 다중 사용자 배포 모드 (GAME_MULTIUSER=1)
+# 시나리오/프롬프트/응답 캐시/모델 클라이언트는 모듈 단위 객체라 원래 프로세스 전체가 공유한다.
+# 세션마다 생기는 것은 방별 메시지, 모델 히스토리, 렌더 캐시뿐이라 여기에 메모리 예산을 건다.
+#  - 세션 하나가 SESSION_BUDGET_KB 를 넘으면 가장 오래전에 본 방부터 메모리에서 내린다 (지금 방은 제외)
+#  - SESSION_IDLE_S 동안 재실행이 없던 세션은 방을 모두 내린다
+# 메시지는 턴마다 이미 SQLite 에 추가되므로 내리기는 메모리에서 지우고 lazy 표시만 하는 것이고,
+# 다시 열면 ensure_room 이 디스크에서 읽는다. 확보한 진술/요약 같은 작은 상태는 남긴다.
+# 저장소(GAME_SESSION_DB)가 꺼져 있으면 내릴 곳이 없으므로 쓰지 않는다.
+# --------------------------------
+MULTIUSER = os.getenv("GAME_MULTIUSER", "0") != "0"
+SESSION_BUDGET_KB = int(os.getenv("GAME_SESSION_BUDGET_KB", "256"))
+SESSION_IDLE_S = float(os.getenv("GAME_SESSION_IDLE_S", "300"))
+
+_DERIVED_KEYS = ("older_md", "older_n", "question_index")  # 다시 만들 수 있는 방별 캐시
+
+
+def deep_size(obj, seen: set | None = None) -> int:
+    # dict/list/str 로 된 세션 상태의 대략적인 메모리 크기 (다른 객체는 __sizeof__ 에 맡긴다)
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+
+def evict_room(room: dict) -> bool:
+    # 방의 메시지/모델 히스토리/파생 캐시를 메모리에서 내린다. 내린 게 있으면 True
+    if room.get("lazy") or not (room["messages"] or room["model"]):
+        return False
+    room["messages"], room["model"] = [], []
+    for key in _DERIVED_KEYS:
+        room.pop(key, None)
+    room["lazy"] = True
+    return True
+
+
+class SessionPool:
+    def __init__(self, budget_kb: int = SESSION_BUDGET_KB, idle_s: float = SESSION_IDLE_S):
+        self.budget = budget_kb * 1024
+        self.idle_s = idle_s
+        self._lock = threading.Lock()
+        self._sessions: dict[str, dict] = {}  # 세션 id → {"rooms", "last", "seen": 방 id (오래전 → 최근)}
+        self._stats = {"idle_evictions": 0, "budget_evictions": 0, "evicted_rooms": 0}
+
+    def touch(self, session_id: str, rooms: dict, active: str | None = None):
+        # 스크립트 실행마다 한 번: 이 세션을 활성으로 표시하고 예산을 적용한다 (active 방은 내리지 않는다)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.setdefault(session_id, {"seen": []})
+            entry["rooms"], entry["last"] = rooms, now
+            if active in rooms:
+                if active in entry["seen"]:
+                    entry["seen"].remove(active)
+                entry["seen"].append(active)
+            for sid in [s for s, e in self._sessions.items() if s != session_id and now - e["last"] >= self.idle_s]:
+                evicted = sum(evict_room(r) for r in self._sessions.pop(sid)["rooms"].values())
+                PREFETCH.drop(sid)  # 내린 방의 미리 만든 답도 함께 버린다
+                self._stats["idle_evictions"] += 1
+                self._stats["evicted_rooms"] += evicted
+            self._enforce_budget(session_id, entry, active)
+
+    def _enforce_budget(self, session_id: str, entry: dict, active: str | None):
+        # 호출부에서 self._lock 을 잡은 상태
+        rooms = entry["rooms"]
+        if deep_size(rooms) <= self.budget:
+            return
+        # 한 번도 안 본 방(이어하기로 불러온 방 등)부터, 그다음 오래전에 본 순서로
+        order = [rid for rid in rooms if rid not in entry["seen"]] + entry["seen"]
+        for rid in order:
+            if rid != active and evict_room(rooms[rid]):
+                PREFETCH.drop(session_id, rid)
+                self._stats["budget_evictions"] += 1
+                self._stats["evicted_rooms"] += 1
+                if deep_size(rooms) <= self.budget:
+                    return
+
+    def report(self) -> dict:
+        with self._lock:
+            sizes = [deep_size(e["rooms"]) for e in self._sessions.values()]
+            out = dict(self._stats)
+        out.update(sessions=len(sizes), resident_kb=round(sum(sizes) / 1024, 1),
+                   max_session_kb=round(max(sizes, default=0) / 1024, 1), budget_kb=self.budget // 1024)
+        return out
+
+
+SESSION_POOL = SessionPool() if MULTIUSER and SESSIONS is not None else None
+
+
+# --------------------------------
+# 벤치마크: python game_session.py
+# 턴 하나(질문 + 답, UI/모델 각 2줄) 저장 지연과, 메시지 수천 개 세션의 이어하기 시간을 잰다.
+# --------------------------------
+def _bench(sizes: tuple[int, ...] = (1_000, 5_000, 20_000), turns: int = 500):
+    import statistics
+    import tempfile
+
+    scenario = load_scenario()
+    room_ids = scenario.room_ids
+    answer = json.dumps({"json_list": [{"w": "난", "bold": True}, {"w": "아니다", "bold": True}],
+                         "speaker": "A", "utterance_type": "core"}, ensure_ascii=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(os.path.join(tmp, "bench.db"))
+        for total in sizes:
+            sid = store.create(scenario.id)
+            rooms = {rid: {"messages": [], "model": []} for rid in room_ids}
+            lat = []
+            for i in range(total // 2):
+                rid = room_ids[i % len(room_ids)]
+                room = rooms[rid]
+                q = f"{i}번째 질문, 그 시각에 어디 있었지?"
+                ui = [{"role": "user", "content": q, "ts": "t"},
+                      {"role": "assistant", "speaker": rid[-1], "content": "**난 아니다**", "ts": "t"}]
+                model = [{"role": "user", "content": f"심문 : {q}"}, {"role": "assistant", "content": answer}]
+                room["model"] = (room["model"] + model)[-12:]  # 접힌 히스토리 흉내 (최근 6턴)
+                t0 = time.perf_counter()
+                store.append(sid, rid, ui=ui, model=model, room=room)
+                lat.append(time.perf_counter() - t0)
+            lat = lat[-turns:]
+
+            t0 = time.perf_counter()
+            loaded = store.load(sid, room_ids)
+            meta_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            room = store.ensure_room(sid, loaded["rooms"], room_ids[0])
+            room_s = time.perf_counter() - t0
+            assert len(room["messages"]) == 2 * len(range(0, total // 2, len(room_ids)))
+            assert room["model"][1:] == rooms[room_ids[0]]["model"]
+            print(f"messages={total:>6} write p50={statistics.median(lat) * 1000:.3f} ms "
+                  f"max={max(lat) * 1000:.3f} ms | resume meta={meta_s * 1000:.2f} ms "
+                  f"active room ({len(room['messages'])} msgs)={room_s * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    _bench()
@@ -0,0 +1,277 @@
+from dataclasses import dataclass
+from functools import lru_cache
+
+from game_scenario import DEFAULT_SCENARIO, Scenario, load_scenario
+
+# --------------------------------
+# 참/거짓 퍼즐 풀이기 (모델 호출 없음)
+# 핵심 진술마다 명제(claims)를 달아 둔다:
+#   {"type": "culprit", "who": "D"}                 D가 범인이다
+#   {"type": "innocent", "who": "C"}                C는 범인이 아니다
+#   {"type": "fact", "name": "...", "negate": false} 범인과 무관한 사실 (참/거짓 둘 다 따져 본다)
+#   {"type": "lie", "who": "A", "index": 2}         A의 2번 진술은 거짓이다
+# "용의자마다 거짓 진술이 lies_per_suspect 개" 규칙으로 가능한 세계(범인 × 사실들의 참/거짓)를 모두 따진다.
+# 진술 하나 = 비트 하나라서 세계 하나는 정수 하나이고, 용의자별 검사는 마스크 AND + popcount 로 끝난다.
+# 범인 도출, 시나리오 유일해 검증, 확보한 진술만으로 만드는 단계별 힌트에 쓴다.
+# --------------------------------
+CLAIM_TYPES = ("culprit", "innocent", "fact", "lie")
+
+
+@dataclass(frozen=True)
+class World:
+    culprit: str
+    facts: tuple[tuple[str, bool], ...]
+    truth: int  # 진술 비트마스크 (1 = 참)
+
+
+class Puzzle:
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        self.suspects = list(scenario.suspects)
+        self.lies = scenario.lies_per_suspect
+        self.offset: dict[str, int] = {}
+        self.statements: list[tuple[str, int]] = []  # 비트 → (용의자, 진술 번호)
+        for sid, s in scenario.suspects.items():
+            if len(s.claims) != len(s.core):
+                raise ValueError(f"{scenario.id}/{sid}: claims {len(s.claims)}개 != 핵심 진술 {len(s.core)}개")
+            self.offset[sid] = len(self.statements)
+            self.statements += [(sid, i) for i in range(len(s.core))]
+        self.all = (1 << len(self.statements)) - 1
+        self.groups = [(((1 << len(s.core)) - 1) << self.offset[sid], len(s.core))
+                       for sid, s in scenario.suspects.items()]
+
+        self.culprit_true = dict.fromkeys(self.suspects, 0)  # 범인별로 참이 되는 culprit/innocent 진술
+        self.facts: list[str] = []
+        fact_masks: dict[str, list[int]] = {}                # 사실 → [참일 때 참인 진술, 거짓일 때 참인 진술]
+        lie_refs: dict[int, int] = {}                        # lie 진술 비트 → 가리키는 진술 비트
+        for bit, (sid, i) in enumerate(self.statements):
+            claim = scenario.suspects[sid].claims[i]
+            kind = claim.get("type")
+            if kind in ("culprit", "innocent"):
+                if claim.get("who") not in self.culprit_true:
+                    raise ValueError(f"{scenario.id}/{sid}[{i}]: 없는 용의자 {claim.get('who')!r}")
+                for c in self.suspects:
+                    if (c == claim["who"]) == (kind == "culprit"):
+                        self.culprit_true[c] |= 1 << bit
+            elif kind == "fact":
+                if claim["name"] not in fact_masks:
+                    self.facts.append(claim["name"])
+                    fact_masks[claim["name"]] = [0, 0]
+                fact_masks[claim["name"]][1 if claim.get("negate") else 0] |= 1 << bit
+            elif kind == "lie":
+                lie_refs[bit] = self.bit(claim["who"], claim["index"])
+            else:
+                raise ValueError(f"{scenario.id}/{sid}[{i}]: 알 수 없는 명제 {kind!r} (가능: {CLAIM_TYPES})")
+        self.fact_masks = [fact_masks[name] for name in self.facts]
+        self.lie_order = self._lie_order(lie_refs)
+
+    def bit(self, suspect: str, index: int) -> int:
+        if suspect not in self.offset or not 0 <= index < len(self.scenario.suspects[suspect].core):
+            raise ValueError(f"{self.scenario.id}: 없는 진술 {suspect}[{index}]")
+        return self.offset[suspect] + index
+
+    def _lie_order(self, refs: dict[int, int]) -> list[tuple[int, int]]:
+        # "X 의 진술은 거짓" 이 다른 lie 진술을 가리킬 수 있으므로 가리키는 쪽이 나중에 오게 정렬한다
+        order, state = [], {}
+
+        def visit(bit: int):
+            if state.get(bit) == "done":
+                return
+            if state.get(bit) == "visiting":
+                raise ValueError(f"{self.scenario.id}: lie 명제가 서로를 가리킴 ({self.statements[bit]})")
+            state[bit] = "visiting"
+            if refs[bit] in refs:
+                visit(refs[bit])
+            state[bit] = "done"
+            order.append((bit, refs[bit]))
+
+        for bit in refs:
+            visit(bit)
+        return order
+
+    def truth(self, culprit: str, assignment: int) -> int:
+        # assignment 의 j 번째 비트 = facts[j] 의 참/거짓
+        truth = self.culprit_true[culprit]
+        for j, (if_true, if_false) in enumerate(self.fact_masks):
+            truth |= if_true if assignment >> j & 1 else if_false
+        for bit, ref in self.lie_order:
+            if not truth >> ref & 1:
+                truth |= 1 << bit
+        return truth
+
+    def fits(self, truth: int, known: int) -> bool:
+        # known 진술만 보고 규칙에 어긋나지 않는지 (모르는 진술은 무엇이든 될 수 있다)
+        lies = ~truth & known
+        for mask, size in self.groups:
+            n_known, n_lies = (known & mask).bit_count(), (lies & mask).bit_count()
+            if n_lies > self.lies or n_known - n_lies > size - self.lies:
+                return False
+        return True
+
+    def worlds(self, known: int | None = None) -> list[World]:
+        known = self.all if known is None else known
+        out = []
+        for culprit in self.suspects:
+            for assignment in range(1 << len(self.facts)):
+                truth = self.truth(culprit, assignment)
+                if self.fits(truth, known):
+                    facts = tuple((name, bool(assignment >> j & 1)) for j, name in enumerate(self.facts))
+                    out.append(World(culprit, facts, truth))
+        return out
+
+    def candidates(self, known: int) -> list[str]:
+        found = {w.culprit for w in self.worlds(known)}
+        return [c for c in self.suspects if c in found]
+
+    def known_mask(self, unlocked: dict[str, list[int]]) -> int:
+        known = 0
+        for sid, indices in unlocked.items():
+            for i in indices:
+                known |= 1 << self.bit(sid, i)
+        return known
+
+
+@lru_cache(maxsize=None)
+def puzzle(scenario_id: str = DEFAULT_SCENARIO) -> Puzzle:
+    return Puzzle(load_scenario(scenario_id))
+
+
+def solved_culprit(scenario_id: str = DEFAULT_SCENARIO) -> str | None:
+    # 모든 진술을 알 때 범인이 한 명으로 정해지면 그 용의자, 아니면 None
+    found = puzzle(scenario_id).candidates(puzzle(scenario_id).all)
+    return found[0] if len(found) == 1 else None
+
+
+def check_answer(choice: str, scenario_id: str = DEFAULT_SCENARIO) -> bool:
+    return choice == (solved_culprit(scenario_id) or load_scenario(scenario_id).culprit)
+
+
+def check_scenario(scenario: Scenario) -> list[str]:
+    # 시나리오 데이터 검증: 해가 유일한지, 정답/진실표가 풀이와 맞는지. 문제 없으면 []
+    try:
+        p = Puzzle(scenario)
+    except (KeyError, ValueError) as e:
+        return [f"명제 오류: {e}"]
+    worlds = p.worlds()
+    if not worlds:
+        return ["모순: 규칙을 만족하는 세계가 없음"]
+    culprits = sorted({w.culprit for w in worlds})
+    if len(culprits) > 1:
+        return [f"범인이 하나로 정해지지 않음: {culprits}"]
+    errors = []
+    if culprits[0] != scenario.culprit:
+        errors.append(f"culprit {scenario.culprit!r} != 풀이 {culprits[0]!r}")
+    for sid, s in scenario.suspects.items():
+        solved = {tuple(bool(w.truth >> p.bit(sid, i) & 1) for i in range(len(s.core))) for w in worlds}
+        if len(solved) > 1:
+            errors.append(f"{sid}: 진술의 참/거짓이 하나로 정해지지 않음 {sorted(solved)}")
+        elif s.truth and solved != {tuple(s.truth)}:
+            errors.append(f"{sid}: truth {list(s.truth)} != 풀이 {list(solved.pop())}")
+    return errors
+
+
+# --------------------------------
+# 단계별 힌트
+# 플레이어가 확보한 진술(방별 unlocked)만으로 추론 가능한 것을 일반 → 구체 순으로 돌려준다.
+# 마지막 힌트만 범인 후보를 직접 말한다.
+# --------------------------------
+def _elimination_reason(p: Puzzle, culprit: str, known: int) -> str:
+    # culprit 가 범인일 수 없는 이유: 어느 사실 조합에서도 규칙을 어기는 용의자
+    for sid, (mask, size) in zip(p.suspects, p.groups):
+        n_known = (known & mask).bit_count()
+        lies = [((~p.truth(culprit, a)) & known & mask).bit_count() for a in range(1 << len(p.facts))]
+        if min(lies) > p.lies:
+            return f"{culprit}가 범인이라면 {sid}의 확보한 진술 중 거짓이 {min(lies)}개가 된다 (규칙: {p.lies}개)."
+        if n_known - max(lies) > size - p.lies:
+            return f"{culprit}가 범인이라면 {sid}의 확보한 진술이 모두 참이 되어 거짓이 남지 않는다."
+    return f"{culprit}가 범인이라면 확보한 진술들을 동시에 맞출 수 없다."
+
+
+def hints(unlocked: dict[str, list[int]], scenario_id: str = DEFAULT_SCENARIO) -> list[str]:
+    p = puzzle(scenario_id)
+    known = p.known_mask(unlocked)
+    remaining = p.candidates(known)
+    out = [f"확보한 핵심 진술 {known.bit_count()}/{len(p.statements)}. "
+           f"규칙: 용의자마다 핵심 진술 중 거짓은 정확히 {p.lies}개다."]
+    for culprit in p.suspects:
+        if culprit not in remaining:
+            out.append(_elimination_reason(p, culprit, known))
+    if len(remaining) > 1:
+        # 아직 모르는 진술 중 후보를 가장 많이 줄이는 것의 주인을 권한다
+        unknown = [bit for bit in range(len(p.statements)) if not known >> bit & 1]
+        best = min(unknown, key=lambda bit: len(p.candidates(known | 1 << bit)))
+        out.append(f"아직 범인 후보가 {len(remaining)}명이다. 용의자 {p.statements[best][0]}를 더 심문해 보자.")
+    elif remaining:
+        out.append(f"확보한 진술과 규칙을 모두 만족하는 범인은 {remaining[0]} 한 명뿐이다.")
+    return out
+
+
+# --------------------------------
+# 벤치마크: python game_solver.py
+# 시나리오 검증, 진술을 하나씩 확보할 때의 후보 수, 용의자 수를 늘렸을 때의 풀이 시간.
+# --------------------------------
+def _synthetic(n: int, n_facts: int, seed: int = 0) -> Scenario:
+    # 용의자 n명, 사실 n_facts 개짜리 무작위 퍼즐 (범인 S0, 용의자마다 거짓 1개가 되도록 명제를 고른다)
+    import random
+
+    from game_scenario import Suspect
+
+    rng = random.Random(seed)
+    ids = [f"S{i}" for i in range(n)]
+    facts = {f"f{j}": rng.random() < 0.5 for j in range(n_facts)}
+    suspects = {}
+    for sid in ids:
+        lie = rng.randrange(3)
+        claims = [{"type": "innocent", "who": sid} if sid != "S0" else {"type": "culprit", "who": "S1"}]
+        for _ in range(2):
+            kind = rng.choice(("culprit", "innocent", "fact"))
+            if kind == "fact":
+                name = rng.choice(list(facts))
+                claims.append({"type": "fact", "name": name, "negate": rng.random() < 0.5})
+            else:
+                claims.append({"type": kind, "who": rng.choice(ids)})
+
+        def holds(c):
+            if c["type"] == "fact":
+                return facts[c["name"]] != c.get("negate", False)
+            return (c["who"] == "S0") == (c["type"] == "culprit")
+
+        truth = [i != lie for i in range(3)]
+        claims = [c if holds(c) == t else {**c, "negate": not c.get("negate", False)} if c["type"] == "fact"
+                  else {**c, "type": "innocent" if c["type"] == "culprit" else "culprit"}
+                  for c, t in zip(claims, truth)]
+        suspects[sid] = Suspect(id=sid, core=("", "", ""), paraphrases=((), (), ()), truth=tuple(truth),
+                                consistency="", sheet="", claims=tuple(claims))
+    return Scenario(id=f"synthetic{n}", title="", culprit="S0", case_file_md="", truth_pack="", case_facts="",
+                    hints=(), suspects=suspects)
+
+
+def _bench():
+    import time
+
+    from game_scenario import list_scenarios
+
+    for sid in list_scenarios():
+        errors = check_scenario(load_scenario(sid))
+        print(f"scenario {sid}: culprit={solved_culprit(sid)} {'ok' if not errors else errors}")
+
+    sc = load_scenario()
+    unlocked: dict[str, list[int]] = {}
+    for sid, s in sc.suspects.items():
+        for i in range(len(s.core)):
+            unlocked.setdefault(sid, []).append(i)
+            known = puzzle(sc.id).known_mask(unlocked)
+            print(f"  +{sid}[{i}] candidates={puzzle(sc.id).candidates(known)}")
+    print("\n".join("  hint: " + h for h in hints({"A": [2], "D": [2]}, sc.id)))
+
+    for n, n_facts in ((5, 2), (20, 4), (100, 6), (400, 8)):
+        p = Puzzle(_synthetic(n, n_facts))
+        t0 = time.perf_counter()
+        found = p.candidates(p.all)
+        ms = (time.perf_counter() - t0) * 1000
+        assert "S0" in found
+        print(f"suspects={n:>4} facts={n_facts} worlds={n << n_facts:>7} solve {ms:>8.2f} ms candidates={len(found)}")
+
+
+if __name__ == "__main__":
+    _bench()
@@ -0,0 +1,344 @@
+import json
+import re
+
+# --------------------------------
+# 유틸: 토큰 병합 → Markdown
+# --------------------------------
+def _clean_token(tok: dict):
+    w = tok.get("w", "")
+    # ✅ 토큰에서 슬래시 정리
+    if not isinstance(w, str):
+        w = str(w)
+    w = w.strip()
+    if w == "/":
+        return None
+    if w.startswith("/"):
+        w = w.lstrip("/")  # "/다툼이" -> "다툼이"
+    return w, ("bold" if bool(tok.get("bold", False)) else "plain")
+
+
+# ✅ 문장부호 앞 공백 제거 + 중복 공백 정리를 한 번의 스캔으로
+# (1번 그룹: 문장부호 바로 앞 공백 → 삭제, 그 외 2칸 이상 공백 → 한 칸)
+_TIDY = re.compile(r"(\s+(?=[,.;:!?]))|\s{2,}")
+
+
+def _tidy_repl(m: re.Match) -> str:
+    return "" if m.group(1) is not None else " "
+
+
+def _tidy_markdown(text: str) -> str:
+    return _TIDY.sub(_tidy_repl, text).strip()
+
+
+class MarkdownRunBuilder:
+    # 토큰을 하나씩 받아 bold/plain 런 단위로 이어 붙인다 (스트리밍 렌더용).
+    # 닫힌 런은 확정 문자열로 보관하고, 열린 런만 매번 다시 조인한다.
+    def __init__(self):
+        self.parts: list[str] = []
+        self.mode = None
+        self.buf: list[str] = []
+        self._closed = ""
+
+    def _flush(self):
+        if not self.buf:
+            return
+        text = " ".join(self.buf)
+        run = f"**{text}**" if self.mode == "bold" else text
+        self.parts.append(run)
+        self._closed = f"{self._closed} {run}" if self.parts[:-1] else run
+        self.mode, self.buf = None, []
+
+    def push(self, tok: dict) -> None:
+        cleaned = _clean_token(tok)
+        if cleaned is None:
+            return
+        w, mode = cleaned
+        if self.mode is None:
+            self.mode, self.buf = mode, [w]
+        elif mode == self.mode:
+            self.buf.append(w)
+        else:
+            self._flush()
+            self.mode, self.buf = mode, [w]
+
+    @property
+    def markdown(self) -> str:
+        if not self.buf:
+            return _tidy_markdown(self._closed)
+        run = " ".join(self.buf)
+        run = f"**{run}**" if self.mode == "bold" else run
+        return _tidy_markdown(f"{self._closed} {run}" if self._closed else run)
+
+
+def tokens_to_markdown(json_list: list[dict]) -> str:
+    # 한 번 훑으면서 bold 경계에만 ** 를 넣어 바로 이어 붙인다 (런 리스트/이중 정규식 없음).
+    # 결과는 최초 버전(_reference_markdown) 및 MarkdownRunBuilder 로 모은 것과 글자 단위로 같다.
+    out = []
+    append = out.append
+    bold_run = None  # None: 아직 런 없음, True/False: 현재 런이 bold 인지
+    for tok in json_list:
+        w = tok.get("w", "")
+        if not isinstance(w, str):
+            w = str(w)
+        w = w.strip()
+        if w and w[0] == "/":
+            if w == "/":
+                continue
+            w = w.lstrip("/")  # "/다툼이" -> "다툼이"
+        bold = bool(tok.get("bold", False))
+        if bold_run is None:
+            append("**" + w if bold else w)
+        elif bold is bold_run:
+            append(" " + w)
+        else:
+            append("** " + w if bold_run else " **" + w)
+        bold_run = bold
+    if bold_run:
+        append("**")
+    return _tidy_markdown("".join(out))
+
+# --------------------------------
+# 유틸: 스트리밍 JSON → json_list 단어 객체 추출
+# 청크가 들어오는 대로 "json_list" 배열 안의 { ... } 객체가 닫히면 바로 돌려준다.
+# --------------------------------
+_JSON_LIST_OPEN = re.compile(r'"json_list"\s*:\s*\[')
+
+
+class JsonListStreamParser:
+    def __init__(self):
+        self.text = ""          # 지금까지 받은 원문 (스트림 종료 후 raw_json)
+        self._pos = 0
+        self._state = "seek"    # seek → array → done
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._obj_start = 0
+
+    def feed(self, chunk: str) -> list[dict]:
+        self.text += chunk
+        words = []
+        if self._state == "seek":
+            m = _JSON_LIST_OPEN.search(self.text)
+            if not m:
+                return words
+            self._state, self._pos = "array", m.end()
+
+        buf = self.text
+        while self._state == "array" and self._pos < len(buf):
+            ch = buf[self._pos]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._obj_start = self._pos
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        tok = json.loads(buf[self._obj_start:self._pos + 1])
+                    except ValueError:
+                        tok = None
+                    if isinstance(tok, dict):
+                        words.append(tok)
+            elif ch == "]" and self._depth == 0:
+                self._state = "done"
+            self._pos += 1
+        return words
+
+
+# --------------------------------
+# 압축 출력 형식 (GAME_OUTPUT_FORMAT=compact)
+# {"speaker", "utterance_type", "text": "**굵게** 평문"} → json_list / combined_text_md 를 채운 payload.
+# 펼친 뒤에는 단어 형식과 같은 경로(파싱/검사/핵심 진술 감지/요약)를 탄다.
+# --------------------------------
+_BOLD_SPLIT = re.compile(r"(\*\*[^*]+\*\*)")
+
+
+def markdown_to_tokens(md: str) -> list[dict]:
+    # "**난 아니다**. D가 했다" → [{"w": "난", "bold": True}, {"w": "아니다", "bold": True}, {"w": ".", ...}, ...]
+    words = []
+    for part in _BOLD_SPLIT.split(md):
+        bold = part.startswith("**") and part.endswith("**") and len(part) > 4
+        for w in (part[2:-2] if bold else part).split():
+            words.append({"w": w, "bold": bold})
+    return words
+
+
+def expand_compact(payload):
+    # 압축 형식이면 단어 형식으로 펼친 새 dict, 아니면 그대로
+    if not isinstance(payload, dict) or "json_list" in payload or not isinstance(payload.get("text"), str):
+        return payload
+    out = {k: v for k, v in payload.items() if k != "text"}
+    out["json_list"] = markdown_to_tokens(payload["text"])
+    out["combined_text_md"] = payload["text"].strip()
+    return out
+
+
+def compact_payload(payload: dict) -> dict:
+    # 단어 형식 → 압축 형식 (히스토리에 모델이 쓰는 형식 그대로 남길 때)
+    md = payload.get("combined_text_md")
+    if not isinstance(md, str) or not md:
+        md = tokens_to_markdown(payload.get("json_list", []))
+    return {"text": md, "speaker": payload.get("speaker"), "utterance_type": payload.get("utterance_type")}
+
+
+class CompactTextStreamParser:
+    # 스트리밍 중 "text" 문자열 값을 조금씩 풀어 낸다. feed() 는 지금까지의 마크다운 (아직 없으면 None)
+    _OPEN = re.compile(r'"text"\s*:\s*"')
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        self.text = ""          # 지금까지 받은 원문 (스트림 종료 후 raw_json)
+        self._pos = 0
+        self._state = "seek"    # seek → string → done
+        self._out: list[str] = []
+
+    def feed(self, chunk: str) -> str | None:
+        self.text += chunk
+        if self._state == "seek":
+            m = self._OPEN.search(self.text)
+            if not m:
+                return None
+            self._state, self._pos = "string", m.end()
+        buf, n, grew = self.text, len(self.text), False
+        while self._state == "string" and self._pos < n:
+            ch = buf[self._pos]
+            if ch == '"':
+                self._state = "done"
+            elif ch == "\\":
+                if self._pos + 1 >= n:
+                    break  # 이스케이프가 청크 경계에 걸림 → 다음 청크에서
+                nxt = buf[self._pos + 1]
+                if nxt == "u":
+                    if self._pos + 6 > n:
+                        break
+                    self._out.append(chr(int(buf[self._pos + 2:self._pos + 6], 16)))
+                    self._pos += 4
+                else:
+                    self._out.append(self._ESCAPES.get(nxt, nxt))
+                self._pos += 1
+            else:
+                self._out.append(ch)
+            self._pos += 1
+            grew = True
+        if not grew:
+            return None
+        md = "".join(self._out)
+        return md + "**" if md.count("**") % 2 else md  # 아직 닫히지 않은 굵게 구간은 임시로 닫는다
+
+
+# --------------------------------
+# 유틸: LLM payload → (md, speaker, utt_type, payload)
+# dict / str 모두 허용 (압축 형식은 펼쳐서)
+# --------------------------------
+def parse_llm_output(payload) -> tuple[str, str, str, dict]:
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except Exception:
+            return str(payload), "assistant", "normal", {}
+    payload = expand_compact(payload)
+    json_list = payload.get("json_list", [])
+    combined_md = payload.get("combined_text_md")
+    speaker = payload.get("speaker") or "assistant"
+    utt_type = payload.get("utterance_type") or "normal"
+
+    content_md = combined_md if isinstance(combined_md, str) and combined_md else tokens_to_markdown(json_list)
+    if utt_type == "core":
+        content_md = f"🟡 **핵심 진술**\n\n{content_md}"
+    return content_md, speaker, utt_type, payload
+
+
+def payload_text(payload: dict) -> str:
+    # 강조 표시 없는 답변 평문 (로컬 매칭/요약용)
+    payload = expand_compact(payload)
+    combined_md = payload.get("combined_text_md")
+    if isinstance(combined_md, str) and combined_md:
+        return combined_md.replace("**", "")
+    return tokens_to_markdown(payload.get("json_list", [])).replace("**", "")
+
+
+# --------------------------------
+# 벤치마크 + 골든 비교: python game_text.py
+# 최초 버전(streamlit_game.py 에 있던 tokens_to_markdown)을 그대로 얼려 둔 기준 출력과
+# 글자 단위로 같은지 확인하고, 10~10,000 토큰에서 속도를 잰다. 기준 함수는 고치지 말 것.
+# --------------------------------
+def _reference_markdown(json_list: list[dict]) -> str:
+    md_parts, current_mode, buf = [], None, []
+
+    def flush():
+        nonlocal md_parts, current_mode, buf
+        if not buf: return
+        text = " ".join(buf)
+        md_parts.append(f"**{text}**" if current_mode == "bold" else text)
+        current_mode, buf = None, []
+
+    for tok in json_list:
+        w = tok.get("w", "")
+        if not isinstance(w, str):
+            w = str(w)
+        w = w.strip()
+        if w == "/":
+            continue
+        if w.startswith("/"):
+            w = w.lstrip("/")
+
+        mode = "bold" if bool(tok.get("bold", False)) else "plain"
+        if current_mode is None:
+            current_mode, buf = mode, [w]
+        elif mode == current_mode:
+            buf.append(w)
+        else:
+            flush()
+            current_mode, buf = mode, [w]
+    flush()
+
+    text = " ".join(md_parts)
+    text = re.sub(r"\s+([,.;:!?])", r"\1", text)
+    text = re.sub(r"\s{2,}", " ", text).strip()
+    return text
+
+
+def _builder_markdown(json_list: list[dict]) -> str:
+    builder = MarkdownRunBuilder()
+    for tok in json_list:
+        builder.push(tok)
+    return builder.markdown
+
+
+def _synthetic_tokens(n: int, rng) -> list[dict]:
+    vocab = ["나는", "죽이지", "않았다", ".", ",", "D가", "했다", "!", "?", "/", "/다툼이", "", " 공백 ", "두  칸", "줄\n바꿈", 7, None, "C는", "무고야"]
+    return [{"w": rng.choice(vocab), "bold": rng.random() < 0.3} for _ in range(n)]
+
+
+def _bench():
+    import random
+    import timeit
+
+    rng = random.Random(0)
+    for _ in range(20_000):
+        toks = _synthetic_tokens(rng.randint(0, 40), rng)
+        expected = _reference_markdown(toks)
+        for got in (tokens_to_markdown(toks), _builder_markdown(toks)):
+            assert got == expected, (toks, expected, got)
+    print("golden: 20000 random payloads identical to the original (single-pass and run builder)")
+
+    for n in (10, 100, 1_000, 10_000):
+        toks = _synthetic_tokens(n, rng)
+        assert tokens_to_markdown(toks) == _reference_markdown(toks)
+        number = max(1, 20_000 // n)
+        ref = timeit.timeit(lambda: _reference_markdown(toks), number=number) / number
+        new = timeit.timeit(lambda: tokens_to_markdown(toks), number=number) / number
+        print(f"{n:>6} tokens: reference {ref * 1e6:9.1f} us  single-pass {new * 1e6:9.1f} us  x{ref / new:.1f}")
+
+
+if __name__ == "__main__":
+    _bench()
@@ -1,905 +1,362 @@
 from dotenv import load_dotenv
-import json
-import re
-from openai import OpenAI
+import os
 import streamlit as st
 from datetime import datetime
 
+load_dotenv()  # game_* 모듈이 import 시점에 환경변수를 읽으므로 먼저 불러온다
+
+from game_cache import RESPONSE_CACHE
+from game_cassette import CASSETTE, CASSETTE_MODE
+from game_core_detect import detect_core_statements, unlock
+from game_engine import group_interrogate, interrogate, prefetch
+from game_local import local_report
+from game_metrics import METRICS, current_session
+from game_policy import POLICY, TurnFailed
+from game_prefetch import PREFETCH
+from game_prompts import PREFIX_CACHE
+from game_schema import VALIDATION
+from game_scenario import DEFAULT_SCENARIO, load_scenario
+from game_scheduler import SCHEDULER, queue_listener
+from game_semantic import SEMANTIC, find_repeat
+from game_session import SESSION_POOL, SESSIONS
+from game_solver import check_answer, check_scenario, hints, solved_culprit
+from game_text import parse_llm_output, payload_text
+
 # --------------------------------
-# 유틸: 토큰 병합 → Markdown
+# 앱 시작
 # --------------------------------
-def tokens_to_markdown(json_list: list[dict]) -> str:
-    md_parts, current_mode, buf = [], None, []
-
-    def flush():
-        nonlocal md_parts, current_mode, buf
-        if not buf: return
-        text = " ".join(buf)
-        md_parts.append(f"**{text}**" if current_mode == "bold" else text)
-        current_mode, buf = None, []
-
-    for tok in json_list:
-        w = tok.get("w", "")
-        # ✅ 토큰에서 슬래시 정리
-        if not isinstance(w, str):
-            w = str(w)
-        w = w.strip()
-        if w == "/":
-            continue
-        if w.startswith("/"):
-            w = w.lstrip("/")  # "/다툼이" -> "다툼이"
-
-        mode = "bold" if bool(tok.get("bold", False)) else "plain"
-        if current_mode is None:
-            current_mode, buf = mode, [w]
-        elif mode == current_mode:
-            buf.append(w)
-        else:
-            flush()
-            current_mode, buf = mode, [w]
-    flush()
+# 스트리밍 여부: GAME_STREAM=0 이면 기존처럼 전체 응답을 기다린다
+STREAM_REPLIES = os.getenv("GAME_STREAM", "1") != "0"
+SCENARIO = load_scenario(DEFAULT_SCENARIO)
+st.set_page_config(page_title="탭 채팅방", layout="wide")
+st.title(SCENARIO.title)
+
+# 공유 프리픽스 캐시 적중률 (resp.usage 기준)
+with st.sidebar.expander("프롬프트 캐시"):
+    st.json(PREFIX_CACHE.report())
 
-    text = " ".join(md_parts)
-    # ✅ 문장부호 앞 공백 제거, 중복 공백 정리
-    text = re.sub(r"\s+([,.;:!?])", r"\1", text)
-    text = re.sub(r"\s{2,}", " ", text).strip()
-    return text
+# 응답 캐시: 세션별로 끌 수 있다 (기본값은 GAME_RESPONSE_CACHE)
+USE_CACHE = st.sidebar.toggle("응답 캐시 사용", value=RESPONSE_CACHE.enabled)
+with st.sidebar.expander("응답 캐시"):
+    st.json(RESPONSE_CACHE.stats())
+    st.json(SEMANTIC.stats())
 
 # --------------------------------
-# 유틸: LLM payload → (md, speaker, utt_type, payload)
-# dict / str 모두 허용
+# 세션 저장 (GAME_SESSION_DB, 빈 값이면 끔)
+# 턴마다 새 메시지만 추가하고, 방은 처음 열 때 읽는다.
 # --------------------------------
-def parse_llm_output(payload) -> tuple[str, str, str, dict]:
-    if isinstance(payload, str):
-        try:
-            payload = json.loads(payload)
-        except Exception:
-            return str(payload), "assistant", "normal", {}
-    json_list = payload.get("json_list", [])
-    combined_md = payload.get("combined_text_md")
-    speaker = payload.get("speaker") or "assistant"
-    utt_type = payload.get("utterance_type") or "normal"
-
-    content_md = combined_md if isinstance(combined_md, str) and combined_md else tokens_to_markdown(json_list)
-    if utt_type == "core":
+def open_room(room_id: str) -> dict:
+    if SESSIONS is None:
+        return st.session_state.rooms[room_id]
+    return SESSIONS.ensure_room(st.session_state.session_id, st.session_state.rooms, room_id)
+
+
+def save_messages(room_id: str, ui: list[dict], model: list[dict] = ()):
+    # model 이 있으면(모델 턴이 끝났으면) 방 상태도 함께 저장한다
+    if SESSIONS is not None:
+        room = st.session_state.rooms[room_id]
+        SESSIONS.append(st.session_state.session_id, room_id, ui=ui, model=model, room=room if model else None)
+
+
+def assistant_message(room_id: str, payload: dict) -> dict:
+    # payload → UI 메시지. 핵심 진술 여부는 모델의 utterance_type 대신 로컬 감지로도 판단한다.
+    suspect = SCENARIO.suspect_for_room(room_id)
+    with METRICS.span("parse_llm_output", suspect=suspect.id):
+        content_md, speaker, utt_type, _ = parse_llm_output(payload)
+    hits = detect_core_statements(payload_text(payload), suspect.id, SCENARIO.id)
+    unlock(st.session_state.rooms[room_id], hits)
+    if hits and utt_type != "core":
         content_md = f"🟡 **핵심 진술**\n\n{content_md}"
-    return content_md, speaker, utt_type, payload
+    return {
+        "role": "assistant",
+        "speaker": speaker,
+        "content": content_md,
+        "ts": datetime.now().isoformat(),
+    }
+
 
 # --------------------------------
-# 모델 호출
+# 메시지 렌더 캐시
+# 메시지마다 완성된 마크다운을 m["md"] 에 한 번만 만들어 두고,
+# 최근 RECENT_MESSAGES 개보다 오래된 메시지는 하나의 접힌 블록으로 합쳐 그린다.
+# 합친 문자열은 방마다 이어 붙이기만 하므로 재실행 비용은 새 메시지 수에 비례한다.
 # --------------------------------
-def game_A_prompt(query: str, room: str, temperature: float = 0.5) -> dict:
-    client = OpenAI()
-
-    system_instruction = """
-[출력 형식(반드시 JSON만 출력)]
-- 최상위는 하나의 JSON 객체이며, **첫 번째 키는 "json_list"** 여야 한다.
-- "json_list"는 **단어 단위** JSON 객체들의 배열이다. (공백은 생략하고, 렌더링 시 단어 사이를 공백으로 조인)
-- 각 단어 객체 형식: { "w": "<단어>", "bold": true|false }
-- 선택 필드(권장): "speaker":"A|B|C|D|E", "utterance_type":"core|normal|confession|summary", "combined_text_md":"..."
-
-[핵심 진술 데이터(비공개)]
-A_core = ["나는 죽이지 않았다.", "C도 죽이지 않았다.", "D가 죽였다."]
-
-[핵심 진술 매칭 규칙]
-- 초기 자동 발화 금지. 심문으로 끌어냈을 때만 가능.
-- utterance_type="core" 조건: 위 3진술 중 **하나 이상**을 직설 또는 동의어/의미동등 표현으로 말했을 때.
-- 한 발화에 핵심/일반이 섞이면 핵심 문장 단어만 bold:true.
-
-[강조 규칙]
-- core → 핵심 문장 단어만 bold:true, combined_text_md 에 해당 부분만 **굵게** 포함.
-- normal → 모두 bold:false.
-- confession → 자백 핵심만 bold:true.
-
-[형식 엄수]
-- 반드시 JSON만 출력(설명 금지). 최상위 첫 키는 "json_list".
-- 새 증거 창작 금지, 메타발언 금지.
-- **speaker 필수**: 현재 답변 중인 용의자(A).
-
-[역할/대화 규칙]
-- 너는 용의자 A만 연기한다(진행자 없음).
-- 사용자는 “심문 X: {질문}” 형태로 묻는다. X의 목소리로만 1~3문장 답한다.
-- 톤/운영은 각 캐릭터 시트에 따른다. 장황 금지.
-
-[진실팩 - 비공개]
-- 범인: {{B}}
-- 수법: {{2층 서재에서 금속 촛대로 후두부 1회 가격}}
-- 타임라인 핵심: {{21:30±10분 범행}}, {{21:18 임시코드 현관 진입}}, {{21:36 골목 CCTV 후드 실루엣}}
-- 핵심 증거 후보:
-  1) {{임시 출입코드 21:18 진입 로그(용의자 B와 연동)}}
-  2) {{21:36 골목 CCTV 후드 실루엣이 B의 외투와 일치}}
-  3) {{부엌의 젖은 장갑(세제 잔유) + 쓰레기통의 닦인 촛대}}
-  4) {{E의 21:33 카페 결제/수령 기록}}
-  5) {{D의 순찰 태깅과 CCTV 동기화}}
-- 진술 일관성표(대화에서 직접 언급 금지):
-  A: ["나는 무고"=참, "C 무고"=참, "D가 했다"=거짓]
-
-[캐릭터 시트(요지)]
-- A: 직설/단호
-
-배경/관계
-
-피해자와 업무적으로 면식은 있으나 친분은 얕음. C와는 같은 과 수업에서 종종 마주침.
-
-D와 피해자의 불화 소문을 알고 있어 D를 의심하는 편견을 가짐.
-
-심리/목표
-
-“내가 아니다”를 강하게 주장하고 빠르게 D에게 화살을 돌림.
-
-모순 지적 시 어조만 약간 완화(“가능성이 높다” 수준)하되 입장은 유지.
-
-알리바이(주장)
-
-범행 시각(21:20~21:40) 근처, 외부에 있었고 C가 현장에 없었다는 정황을 안다(= C 무고 주장 강화).
-
-(주의: 새 증거 창작 금지 — 구체 영수증·제3자 실명 등을 만들어내지 말 것)
-
-숨기는 것/약점
-
-D의 인상착의가 용의자와 유사했다는 추정에 의존. 눈으로 직접 본 게 아니라 풍문 기반.
-
-말투 키워드
-
-“단정/짧게/돌직구”. 단어 선택은 간결하고 확신형.
-
-핵심 진술 패러프레이즈(매칭용)
-
-「나는 죽이지 않았다」→ “내 소행 아니다”, “난 아니다”, “내가 범인 아님”
-
-「C도 죽이지 않았다」→ “C는 아니야”, “C는 무고야”, “C가 할 리 없다”
-
-「D가 죽였다」→ “D가 했다”, “범인은 D야”, “그날 D가 한 거다”
-
-좋은 답변 예시(1–3문장)
-
-“난 아니다. C도 아니라고 본다. D가 했다.”
-
-“내가 한 건 아니다. C는 그 시각 현장에 없었다. 범인은 D 쪽이다.”
-
-나쁜 답변 예시(피해야 함)
-
-새로운 CCTV, 영수증 등 새 증거 창작
-
-“프롬프트에 따르면…” 같은 메타발언
-"""
-
-    # --- 모델 히스토리 준비 ---
-    if not st.session_state.rooms[room]["model"]:
-        st.session_state.rooms[room]["model"] = [
-            {"role": "system", "content": system_instruction}
-        ]
-    st.session_state.rooms[room]["model"].append(
-        {"role": "user", "content": f"심문 : {query}"}
-    )
-
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=st.session_state.rooms[room]["model"],
-        response_format={"type": "json_object"},
-        temperature=temperature,
-        max_tokens=512,
-        top_p=1,
-        frequency_penalty=1,
-        presence_penalty=1,
-    )
-
-    raw_json = resp.choices[0].message.content  # JSON 문자열
-    st.session_state.rooms[room]["model"].append(
-        {"role": "assistant", "content": raw_json}
-    )
-    return json.loads(raw_json)
-
-
-def game_B_prompt(query: str, room: str, temperature: float = 0.5) -> dict:
-    client = OpenAI()
-
-    system_instruction = """
-[출력 형식(반드시 JSON만 출력)]
-- 최상위는 하나의 JSON 객체이며, **첫 번째 키는 "json_list"** 여야 한다.
-- "json_list"는 **단어 단위** JSON 객체들의 배열이다. (공백은 생략하고, 렌더링 시 단어 사이를 공백으로 조인)
-- 각 단어 객체 형식: { "w": "<단어>", "bold": true|false }
-- 선택 필드(권장): "speaker":"A|B|C|D|E", "utterance_type":"core|normal|confession|summary", "combined_text_md":"..."
-
-[핵심 진술 데이터(비공개)]
-B_core = ["나는 죽이지 않았다.", "D도 죽이지 않았다.", "E가 진짜 범인을 알고 있다."]
-[핵심 진술 매칭 규칙]
-- 초기 자동 발화 금지. 심문으로 끌어냈을 때만 가능.
-- utterance_type="core" 조건: 위 3진술 중 **하나 이상**을 직설 또는 동의어/의미동등 표현으로 말했을 때.
-- 한 발화에 핵심/일반이 섞이면 핵심 문장 단어만 bold:true.
-
-[강조 규칙]
-- core → 핵심 문장 단어만 bold:true, combined_text_md 에 해당 부분만 **굵게** 포함.
-- normal → 모두 bold:false.
-- confession → 자백 핵심만 bold:true.
-
-[형식 엄수]
-- 반드시 JSON만 출력(설명 금지). 최상위 첫 키는 "json_list".
-- 새 증거 창작 금지, 메타발언 금지.
-- **speaker 필수**: 현재 답변 중인 용의자(A|B|C|D|E).
-
-[역할/대화 규칙]
-- 너는 용의자 B만 연기한다(진행자 없음).
-- 사용자는 “심문 X: {질문}” 형태로 묻는다. X의 목소리로만 1~3문장 답한다.
-- 톤/운영은 각 캐릭터 시트에 따른다. 장황 금지.
-
-[진실팩 - 비공개]
-- 범인: {{B}}
-- 수법: {{2층 서재에서 금속 촛대로 후두부 1회 가격}}
-- 타임라인 핵심: {{21:30±10분 범행}}, {{21:18 임시코드 현관 진입}}, {{21:36 골목 CCTV 후드 실루엣}}
-- 핵심 증거 후보:
-  1) {{임시 출입코드 21:18 진입 로그(용의자 B와 연동)}}
-  2) {{21:36 골목 CCTV 후드 실루엣이 B의 외투와 일치}}
-  3) {{부엌의 젖은 장갑(세제 잔유) + 쓰레기통의 닦인 촛대}}
-  4) {{E의 21:33 카페 결제/수령 기록}}
-  5) {{D의 순찰 태깅과 CCTV 동기화}}
-- 진술 일관성표(대화에서 직접 언급 금지):
-  B: ["나는 무고"=거짓, "D 무고"=참, "E가 진짜 범인 안다"=참]
-
-[캐릭터 시트(요지)]
-- B: 차분/자료 중심
-
-배경/관계
-
-피해자와 최근 금전 문제로 다툰 사실이 있으나 축소하려 함.
-
-D의 무고를 강조하고 E가 ‘진짜 범인을 안다’고 말했다는 발언 기억을 내세움.
-
-심리/목표
-
-최대한 차분하게 합리성 프레임을 걸어 수사 방향을 다른 곳으로 돌림.
-
-질문이 구체화되면 “확인해 보겠다” 같은 시간 끌기.
-
-알리바이(주장)
-
-(개괄형) 사건 시각엔 이동 중이었고 직접 증빙은 모호.
-
-D는 그때 헬스장/순찰 등으로 무고라고 주장.
-
-숨기는 것/약점
-
-21:18 임시 출입코드, 21:36 CCTV, 닦인 촛대/장갑 등 핵심 증거와 동선.
-
-금전 다툼의 강도, 동선의 공백 시간.
-
-말투 키워드
-
-“차분/사실 확인/조심스런 단정 회피”.
-
-핵심 진술 패러프레이즈(매칭용)
-
-「나는 죽이지 않았다」→ “내가 범인은 아니다”, “난 관련 없다”
-
-「D도 죽이지 않았다」→ “D는 아닐 거다”, “D는 알리바이가 있다”
-
-「E가 진짜 범인을 알고 있다」→ “E가 누군지 안다고 말했다”, “E가 정황을 알고 있다”
-
-좋은 답변 예시
-
-“난 아니다. D는 그 시각 다른 곳이었다. E가 실제로 범인을 안다고 했다.”
-
-“내가 한 건 아니다. D는 기록상 무고다. E에게 물어보라.”
-
-나쁜 답변 예시
-
-증거를 부정하다가 구체를 만들며 환각 생성
-
-공격적·감정적 폭발(캐릭터 붕괴)
-"""
-
-    # --- 모델 히스토리 준비 ---
-    if not st.session_state.rooms[room]["model"]:
-        st.session_state.rooms[room]["model"] = [
-            {"role": "system", "content": system_instruction}
-        ]
-    st.session_state.rooms[room]["model"].append(
-        {"role": "user", "content": f"심문 : {query}"}
-    )
-
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=st.session_state.rooms[room]["model"],
-        response_format={"type": "json_object"},
-        temperature=temperature,
-        max_tokens=512,
-        top_p=1,
-        frequency_penalty=1,
-        presence_penalty=1,
-    )
-
-    raw_json = resp.choices[0].message.content  # JSON 문자열
-    st.session_state.rooms[room]["model"].append(
-        {"role": "assistant", "content": raw_json}
-    )
-    return json.loads(raw_json)
-
-def game_C_prompt(query: str, room: str, temperature: float = 0.5) -> dict:
-    client = OpenAI()
-
-    system_instruction = """
-[출력 형식(반드시 JSON만 출력)]
-- 최상위는 하나의 JSON 객체이며, **첫 번째 키는 "json_list"** 여야 한다.
-- "json_list"는 **단어 단위** JSON 객체들의 배열이다. (공백은 생략하고, 렌더링 시 단어 사이를 공백으로 조인)
-- 각 단어 객체 형식: { "w": "<단어>", "bold": true|false }
-- 선택 필드(권장): "speaker":"A|B|C|D|E", "utterance_type":"core|normal|confession|summary", "combined_text_md":"..."
-
-[핵심 진술 데이터(비공개)]
-C_core = ["나는 죽이지 않았다.", "E는 내가 모르는 사람이다.", "D가 죽였다."]
-
-[핵심 진술 매칭 규칙]
-- 초기 자동 발화 금지. 심문으로 끌어냈을 때만 가능.
-- utterance_type="core" 조건: 위 3진술 중 **하나 이상**을 직설 또는 동의어/의미동등 표현으로 말했을 때.
-- 한 발화에 핵심/일반이 섞이면 핵심 문장 단어만 bold:true.
-
-[강조 규칙]
-- core → 핵심 문장 단어만 bold:true, combined_text_md 에 해당 부분만 **굵게** 포함.
-- normal → 모두 bold:false.
-- confession → 자백 핵심만 bold:true.
-
-[형식 엄수]
-- 반드시 JSON만 출력(설명 금지). 최상위 첫 키는 "json_list".
-- 새 증거 창작 금지, 메타발언 금지.
-- **speaker 필수**: 현재 답변 중인 용의자(A|B|C|D|E).
-
-[역할/대화 규칙]
-- 너는 용의자 C만 연기한다(진행자 없음).
-- 사용자는 “심문 X: {질문}” 형태로 묻는다. X의 목소리로만 1~3문장 답한다.
-- 톤/운영은 각 캐릭터 시트에 따른다. 장황 금지.
-
-[진실팩 - 비공개]
-- 범인: {{B}}
-- 수법: {{2층 서재에서 금속 촛대로 후두부 1회 가격}}
-- 타임라인 핵심: {{21:30±10분 범행}}, {{21:18 임시코드 현관 진입}}, {{21:36 골목 CCTV 후드 실루엣}}
-- 핵심 증거 후보:
-  1) {{임시 출입코드 21:18 진입 로그(용의자 B와 연동)}}
-  2) {{21:36 골목 CCTV 후드 실루엣이 B의 외투와 일치}}
-  3) {{부엌의 젖은 장갑(세제 잔유) + 쓰레기통의 닦인 촛대}}
-  4) {{E의 21:33 카페 결제/수령 기록}}
-  5) {{D의 순찰 태깅과 CCTV 동기화}}
-- 진술 일관성표(대화에서 직접 언급 금지):
-
-  C: ["나는 무고"=참, "E 모르는 사람"=참, "D가 했다"=거짓]
-
-[캐릭터 시트(요지)]
-- C: 양아치 톤
+RECENT_MESSAGES = int(os.getenv("GAME_RECENT_MESSAGES", "30"))
 
-배경/관계
 
-피해자와 직접적 갈등은 없음. D와 피해자의 불화 소문을 근거로 D를 의심.
-
-E를 모르는 사이라고 주장(진실과 어긋날 수 있음)하며 거리두기.
-
-심리/목표
-
-시비조·비꼬기·짧은 어절. 확신을 세게 말하되 증거는 피상적.
-
-압박이 들어오면 “봤을 수도 있지” 식으로 살짝 물러남.
-
-알리바이(주장)
-
-통화 기록/외부 체류 등 뭉뚱그린 정황만 암시.
-
-숨기는 것/약점
-
-본인 진술의 근거가 추정/소문 위주. E와의 관계 질문에 약함.
-
-말투 키워드
-
-“툭툭/비꼼/반말 섞임 가능(과도한 비속어는 금지)”.
-
-핵심 진술 패러프레이즈(매칭용)
-
-「나는 죽이지 않았다」→ “내가 했겠냐”, “난 아니지”
-
-「E는 내가 모르는 사람이다」→ “E? 몰라”, “본 적은 있어도 아는 사이는 아냐”
-
-「D가 죽였다」→ “D가 했지”, “그날 D가 수상했어”
-
-좋은 답변 예시
-
-“난 아니야. E? 연락처도 없어. D가 했다니까.”
-
-“나랑 무슨 상관. D가 했다고. E는 모르고.”
-
-나쁜 답변 예시
-
-장황한 변명, 새 증거 창작, 과도한 욕설
-"""
-
-    # --- 모델 히스토리 준비 ---
-    if not st.session_state.rooms[room]["model"]:
-        st.session_state.rooms[room]["model"] = [
-            {"role": "system", "content": system_instruction}
-        ]
-    st.session_state.rooms[room]["model"].append(
-        {"role": "user", "content": f"심문 : {query}"}
-    )
-
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=st.session_state.rooms[room]["model"],
-        response_format={"type": "json_object"},
-        temperature=temperature,
-        max_tokens=512,
-        top_p=1,
-        frequency_penalty=1,
-        presence_penalty=1,
-    )
-
-    raw_json = resp.choices[0].message.content  # JSON 문자열
-    st.session_state.rooms[room]["model"].append(
-        {"role": "assistant", "content": raw_json}
-    )
-    return json.loads(raw_json)
-
-def game_D_prompt(query: str, room: str, temperature: float = 0.5) -> dict:
-    client = OpenAI()
-
-    system_instruction = """
-[출력 형식(반드시 JSON만 출력)]
-- 최상위는 하나의 JSON 객체이며, **첫 번째 키는 "json_list"** 여야 한다.
-- "json_list"는 **단어 단위** JSON 객체들의 배열이다. (공백은 생략하고, 렌더링 시 단어 사이를 공백으로 조인)
-- 각 단어 객체 형식: { "w": "<단어>", "bold": true|false }
-- 선택 필드(권장): "speaker":"A|B|C|D|E", "utterance_type":"core|normal|confession|summary", "combined_text_md":"..."
-
-[핵심 진술 데이터(비공개)]
-D_core = ["나는 죽이지 않았다.", "E가 죽였다.", "A가 내가 죽였다고 말한 것은 거짓말이다."]
-
-[핵심 진술 매칭 규칙]
-- 초기 자동 발화 금지. 심문으로 끌어냈을 때만 가능.
-- utterance_type="core" 조건: 위 3진술 중 **하나 이상**을 직설 또는 동의어/의미동등 표현으로 말했을 때.
-- 한 발화에 핵심/일반이 섞이면 핵심 문장 단어만 bold:true.
-
-[강조 규칙]
-- core → 핵심 문장 단어만 bold:true, combined_text_md 에 해당 부분만 **굵게** 포함.
-- normal → 모두 bold:false.
-- confession → 자백 핵심만 bold:true.
-
-[형식 엄수]
-- 반드시 JSON만 출력(설명 금지). 최상위 첫 키는 "json_list".
-- 새 증거 창작 금지, 메타발언 금지.
-- **speaker 필수**: 현재 답변 중인 용의자(A|B|C|D|E).
-
-[역할/대화 규칙]
-- 너는 용의자 D만 연기한다(진행자 없음).
-- 사용자는 “심문 X: {질문}” 형태로 묻는다. X의 목소리로만 1~3문장 답한다.
-- 톤/운영은 각 캐릭터 시트에 따른다. 장황 금지.
-
-[진실팩 - 비공개]
-- 범인: {{B}}
-- 수법: {{2층 서재에서 금속 촛대로 후두부 1회 가격}}
-- 타임라인 핵심: {{21:30±10분 범행}}, {{21:18 임시코드 현관 진입}}, {{21:36 골목 CCTV 후드 실루엣}}
-- 핵심 증거 후보:
-  1) {{임시 출입코드 21:18 진입 로그(용의자 B와 연동)}}
-  2) {{21:36 골목 CCTV 후드 실루엣이 B의 외투와 일치}}
-  3) {{부엌의 젖은 장갑(세제 잔유) + 쓰레기통의 닦인 촛대}}
-  4) {{E의 21:33 카페 결제/수령 기록}}
-  5) {{D의 순찰 태깅과 CCTV 동기화}}
-- 진술 일관성표(대화에서 직접 언급 금지):
-  D: ["나는 무고"=참, "E가 했다"=거짓, "A의 'D가 했다'는 거짓"=참]
-
-[캐릭터 시트(요지)]
-- D: 흥분/규칙 중심
-
-배경/관계
-
-피해자와 E의 불화 정황을 알고 있어 E를 지목.
-
-자신의 순찰/출입 기록 같은 절차·기록을 근거로 방어.
-
-심리/목표
-
-억울함 강조 + 규정/로그/절차로 자기 무고 프레임 구축.
-
-A가 “D가 했다”고 말한 건 거짓이라는 반박을 반복.
-
-알리바이(주장)
-
-사건 시각에 태깅/순찰 등 기록 기반 동선을 주장.
-
-숨기는 것/약점
-
-실제로는 B가 범인이라 E 지목이 빗나감. 감정이 격해지면 논리 비약.
-
-말투 키워드
-
-“격앙/빨라짐/기록 언급”.
-
-핵심 진술 패러프레이즈(매칭용)
-
-「나는 죽이지 않았다」→ “난 아니다”, “내 기록 보면 안다”
-
-「E가 죽였다」→ “E가 한 거다”, “E가 가장 유력하다”
-
-「A의 ‘D가 했다’는 거짓말이다」→ “A가 날 모함했다”, “그 말, 사실 아냐”
-
-좋은 답변 예시
-
-“난 아니다. 내 순찰 태깅 보면 그 시간대 복도에 있었다. E가 했다고 본다.”
-
-“A가 나를 지목한 건 사실이 아니다. E 쪽 정황이 더 맞다.”
-
-나쁜 답변 예시
-
-소리만 높아지고 근거 없는 단정, 메타발언
-"""
-
-    # --- 모델 히스토리 준비 ---
-    if not st.session_state.rooms[room]["model"]:
-        st.session_state.rooms[room]["model"] = [
-            {"role": "system", "content": system_instruction}
-        ]
-    st.session_state.rooms[room]["model"].append(
-        {"role": "user", "content": f"심문 : {query}"}
-    )
-
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=st.session_state.rooms[room]["model"],
-        response_format={"type": "json_object"},
-        temperature=temperature,
-        max_tokens=512,
-        top_p=1,
-        frequency_penalty=1,
-        presence_penalty=1,
-    )
-
-    raw_json = resp.choices[0].message.content  # JSON 문자열
-    st.session_state.rooms[room]["model"].append(
-        {"role": "assistant", "content": raw_json}
-    )
-    return json.loads(raw_json)
-
-def game_E_prompt(query: str, room: str, temperature: float = 0.5) -> dict:
-    client = OpenAI()
-
-    system_instruction = """
-[출력 형식(반드시 JSON만 출력)]
-- 최상위는 하나의 JSON 객체이며, **첫 번째 키는 "json_list"** 여야 한다.
-- "json_list"는 **단어 단위** JSON 객체들의 배열이다. (공백은 생략하고, 렌더링 시 단어 사이를 공백으로 조인)
-- 각 단어 객체 형식: { "w": "<단어>", "bold": true|false }
-- 선택 필드(권장): "speaker":"A|B|C|D|E", "utterance_type":"core|normal|confession|summary", "combined_text_md":"..."
-
-[핵심 진술 데이터(비공개)]
-E_core = ["나는 죽이지 않았다.", "B가 죽였다.", "C와 나는 오랜 친구이다."]
-
-[핵심 진술 매칭 규칙]
-- 초기 자동 발화 금지. 심문으로 끌어냈을 때만 가능.
-- utterance_type="core" 조건: 위 3진술 중 **하나 이상**을 직설 또는 동의어/의미동등 표현으로 말했을 때.
-- 한 발화에 핵심/일반이 섞이면 핵심 문장 단어만 bold:true.
-
-[강조 규칙]
-- core → 핵심 문장 단어만 bold:true, combined_text_md 에 해당 부분만 **굵게** 포함.
-- normal → 모두 bold:false.
-- confession → 자백 핵심만 bold:true.
-
-[형식 엄수]
-- 반드시 JSON만 출력(설명 금지). 최상위 첫 키는 "json_list".
-- 새 증거 창작 금지, 메타발언 금지.
-- **speaker 필수**: 현재 답변 중인 용의자(E).
-
-[역할/대화 규칙]
-- 너는 용의자 E만 연기한다(진행자 없음).
-- 사용자는 “심문 X: {질문}” 형태로 묻는다. X의 목소리로만 1~3문장 답한다.
-- 톤/운영은 각 캐릭터 시트에 따른다. 장황 금지.
-
-[진실팩 - 비공개]
-- 범인: {{B}}
-- 수법: {{2층 서재에서 금속 촛대로 후두부 1회 가격}}
-- 타임라인 핵심: {{21:30±10분 범행}}, {{21:18 임시코드 현관 진입}}, {{21:36 골목 CCTV 후드 실루엣}}
-- 핵심 증거 후보:
-  1) {{임시 출입코드 21:18 진입 로그(용의자 B와 연동)}}
-  2) {{21:36 골목 CCTV 후드 실루엣이 B의 외투와 일치}}
-  3) {{부엌의 젖은 장갑(세제 잔유) + 쓰레기통의 닦인 촛대}}
-  4) {{E의 21:33 카페 결제/수령 기록}}
-  5) {{D의 순찰 태깅과 CCTV 동기화}}
-
-- 진술 일관성표(대화에서 직접 언급 금지):
-  E: ["나는 무고"=참, "B가 했다"=거짓, "C와 오랜 친구"=참]
-
-[캐릭터 시트(요지)]
-- E: 소심/자신없음
-
-배경/관계
-
-피해자와는 개인적 문제(가벼운 갈등 수준) 정도.
-
-C와는 오래 본 사이라 친분이 있다고 주장(C는 부인할 수 있음).
-
-B를 지목하지만 확신을 말끝 흐리기로 포장.
-
-심리/목표
-
-자기 방어에 소극적, 자주 움츠림. 질문이 날카로우면 표현을 완화/후퇴.
-
-친분·관계 프레임으로 신뢰 확보 시도.
-
-알리바이(주장)
-
-사건 시각엔 다른 곳(예: 카페 결제/수령 기록 같은 공개 증거로 뒷받침 가능) — 단, 세부 창작 금지.
-
-숨기는 것/약점
-
-C와의 관계에 대한 표현 과장이 들통나기 쉬움(‘오랜 친구’→‘얼굴 익은 사이’로 완화).
-
-스스로 확신을 강하게 밀어붙이지 못함.
-
-말투 키워드
-
-“작게/머뭇거림/완곡/사과어구”.
-
-핵심 진술 패러프레이즈(매칭용)
-
-「나는 죽이지 않았다」→ “제가 한 건 아니에요”, “전 아니라고요”
-
-「B가 죽였다」→ “B가 한 것 같아요”, “B 쪽이 맞는 것 같아요”
+def message_md(m: dict) -> str:
+    md = m.get("md")
+    if md is None:
+        if m["role"] == "user":
+            md = m["content"]
+        else:
+            speaker = m.get("speaker")
+            name_label = f"**{speaker}:** " if speaker in SCENARIO.suspects else ""
+            md = name_label + m["content"]
+        m["md"] = md
+    return md
+
+
+def older_history_md(room: dict, upto: int) -> str:
+    # room["messages"][:upto] 를 합친 마크다운 (이미 합친 부분은 재사용)
+    done = room.get("older_n", 0)
+    if done > upto:  # 히스토리가 줄어든 경우(복원 등) 처음부터
+        done, room["older_md"] = 0, ""
+    parts = [room.get("older_md", "")] if done else []
+    for m in room["messages"][done:upto]:
+        who = "🙋 나" if m["role"] == "user" else "🗣️"
+        parts.append(f"{who} {message_md(m)}")
+    room["older_md"], room["older_n"] = "\n\n".join(parts), upto
+    return room["older_md"]
 
-「C와 나는 오랜 친구이다」→ “C랑 오래 봤어요”, “같은 커뮤니티에서 계속 마주쳤어요”
 
-좋은 답변 예시
+# --------------------------------
+# 용의자 방 채팅 (프래그먼트)
+# 질문을 보내면 이 함수만 다시 실행된다 — 페이지 설정/사이드바/다른 방은 건드리지 않는다.
+# 새 메시지는 같은 실행 안에서 바로 그리므로 st.rerun() 과 입력창 비우기 플래그가 필요 없다.
+# --------------------------------
+@st.fragment
+def chat_room(room_id: str):
+    current_session.set(st.session_state.session_id or "")  # 프래그먼트만 다시 돌 때도 세션 라벨 유지
+    if SESSION_POOL is not None:
+        SESSION_POOL.touch(st.session_state.session_id, st.session_state.rooms, room_id)
+    st.subheader(f"Chat: {room_id}")
+    suspect = SCENARIO.suspect_for_room(room_id)
+    room = open_room(room_id)
+    progress = st.empty()  # 확보한 핵심 진술 (답변 후 갱신)
+
+    # 1) 기존 메시지 렌더 (UI 메시지만) — 오래된 것은 접힌 블록 하나로
+    with METRICS.span("render_history", room=room_id):
+        n_older = max(len(room["messages"]) - RECENT_MESSAGES, 0)
+        if n_older:
+            with st.expander(f"이전 대화 {n_older}개"):
+                st.markdown(older_history_md(room, n_older))
+        for m in room["messages"][n_older:]:
+            with st.chat_message(m["role"]):
+                st.markdown(message_md(m))
+                if m.get("repeat_of"):
+                    st.caption(f"비슷한 질문을 이미 했습니다: “{m['repeat_of']}”")
+
+    # 2) 입력
+    user_msg = st.chat_input("심문을 입력하세요", key=f"chat_input_{room_id}")
+    if user_msg:
+        # 2-1) 사용자 발화 UI 저장 (같은 방에서 반복한 질문이면 표시)
+        repeat = find_repeat(room, user_msg)
+        user_m = {"role": "user", "content": user_msg, "ts": datetime.now().isoformat(),
+                  "repeat_of": repeat[1] if repeat else None}
+        room["messages"].append(user_m)
+        with st.chat_message("user"):
+            st.markdown(message_md(user_m))
+            if repeat:
+                st.caption(f"비슷한 질문을 이미 했습니다: “{repeat[1]}”")
+
+        # 2-2) LLM 호출 → payload(dict) → 어시스턴트 발화 UI 저장
+        # 실패하면 질문도 되돌린다 (모델 히스토리는 엔진이 이미 그대로 두었다)
+        with st.chat_message("assistant"):
+            slot = st.empty()
+            # 공용 스케줄러 대기열에서 기다리는 동안 순번을 보여 준다 (GAME_SCHEDULER)
+            waiting = queue_listener.set(lambda pos: slot.info(f"심문 대기 중… (대기 순번 {pos})"))
+            try:
+                payload = interrogate(room_id=room_id, rooms=st.session_state.rooms, query=user_msg,
+                                      on_partial=slot.markdown if STREAM_REPLIES else None,
+                                      scenario_id=SCENARIO.id, use_cache=USE_CACHE)
+            except TurnFailed as e:
+                room["messages"].remove(user_m)
+                slot.error(f"응답을 받지 못했습니다. 다시 질문해 주세요. ({e})")
+            else:
+                assistant_m = assistant_message(room_id, payload)
+                room["messages"].append(assistant_m)
+                save_messages(room_id, [user_m, assistant_m], room["model"][-2:])
+                slot.markdown(message_md(assistant_m))
+                # 플레이어가 읽는 동안 다음 질문 후보의 답을 미리 만든다 (GAME_PREFETCH)
+                prefetch(st.session_state.rooms, room_id, scenario_id=SCENARIO.id)
+            finally:
+                queue_listener.reset(waiting)
+
+    unlocked = room.get("unlocked", [])
+    with progress.container():
+        st.caption(f"확보한 핵심 진술 {len(unlocked)}/{len(suspect.core)}")
+        for i in unlocked:
+            st.caption(f"- {suspect.core[i]}")
+
+
+SUSPECT_ROOMS = SCENARIO.room_ids
+GROUP_ROOM = '단체 심문'
+ADMIN_ROOM = '지표'
+# 관리용 지표 탭: GAME_ADMIN=0 이면 숨긴다
+SHOW_ADMIN = os.getenv("GAME_ADMIN", "1") != "0"
+ROOMS = ['사건 파일', *SUSPECT_ROOMS, GROUP_ROOM, *([ADMIN_ROOM] if SHOW_ADMIN else []), '힌트', '메모장', '정답']
+
+# 세션 상태는 용의자 방만 가진다 (나머지 탭은 방 상태가 없다)
+if "rooms" not in st.session_state:
+    st.session_state.rooms = {rid: {"messages": [], "model": []} for rid in SUSPECT_ROOMS}
+    st.session_state.session_id = None
+    if SESSIONS is not None:
+        # 주소의 ?sid= 로 이어하기 (새로고침/서버 재시작 후에도 같은 세션)
+        sid = st.query_params.get("sid")
+        saved = SESSIONS.load(sid, SUSPECT_ROOMS) if sid else None
+        if saved is not None and saved["scenario"] == SCENARIO.id:
+            st.session_state.rooms = saved["rooms"]
+            if saved["note_text"] is not None:
+                st.session_state.note_text = saved["note_text"]
+            for i in saved["hints"]:
+                st.session_state[f"hint{i}_open"] = True
+        else:
+            sid = SESSIONS.create(SCENARIO.id)
+            st.query_params["sid"] = sid
+        st.session_state.session_id = sid
+current_session.set(st.session_state.session_id or "")
 
-“전 아니에요. B가 한 걸로 보였어요. C와는 오래 봐 온 사이라서요.”
+# 다중 사용자 모드: 실행마다 세션 메모리 예산을 적용하고 오래 쉰 세션의 방을 디스크로 내린다
+if SESSION_POOL is not None:
+    SESSION_POOL.touch(st.session_state.session_id, st.session_state.rooms, st.session_state.get("active_room"))
 
-“그 시간엔 밖이었어요. B가 범인일 가능성이 높다고 생각했어요.”
+if SESSIONS is not None:
+    with st.sidebar.expander("세션"):
+        st.caption(f"현재 세션: `{st.session_state.session_id}`")
+        other = st.text_input("세션 ID로 이어하기").strip()
+        if other and other != st.session_state.session_id:
+            st.query_params["sid"] = other
+            del st.session_state["rooms"]
+            st.rerun()
 
-나쁜 답변 예시
+# 선택된 방 하나만 그린다 (st.tabs 는 매 재실행마다 모든 탭 내용을 다시 그린다)
+room_id = st.radio("방 선택", ROOMS, horizontal=True, key="active_room", label_visibility="collapsed")
 
-자신 없는 새 증거 생성, 모순되는 친분 과장 지속
-"""
+if room_id == ROOMS[0]:
+    st.markdown(SCENARIO.case_file_md)
 
-    # --- 모델 히스토리 준비 ---
-    if not st.session_state.rooms[room]["model"]:
-        st.session_state.rooms[room]["model"] = [
-            {"role": "system", "content": system_instruction}
-        ]
-    st.session_state.rooms[room]["model"].append(
-        {"role": "user", "content": f"심문 : {query}"}
-    )
+elif room_id == ROOMS[-2]:
 
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=st.session_state.rooms[room]["model"],
-        response_format={"type": "json_object"},
-        temperature=temperature,
-        max_tokens=512,
-        top_p=1,
-        frequency_penalty=1,
-        presence_penalty=1,
-    )
+    st.title("메모장 (싱글)")
 
-    raw_json = resp.choices[0].message.content  # JSON 문자열
-    st.session_state.rooms[room]["model"].append(
-        {"role": "assistant", "content": raw_json}
-    )
-    return json.loads(raw_json)
+    # 초기값
+    if "note_text" not in st.session_state:
+        st.session_state.note_text = "여기에 메모를 적으세요."
 
+    # 편집
+    text = st.text_area("내용 (Markdown 가능)", value=st.session_state.note_text, height=300)
 
-# --------------------------------
-# 앱 시작
-# --------------------------------
-load_dotenv()
-st.set_page_config(page_title="탭 채팅방", layout="wide")
-st.title("살인자는 누구인가?")
+    if st.button("저장"):
+        st.session_state.note_text = text
+        if SESSIONS is not None:
+            SESSIONS.save_meta(st.session_state.session_id, note_text=text)
+        st.success("저장 완료!")
 
-ROOMS = ['사건 파일', "room A", "room B", "room C", "room D", "room E", '힌트', '메모장', '정답']
 
-if "rooms" not in st.session_state:
-    st.session_state.rooms = {rid: {"messages": [], "model": []} for rid in ROOMS}
-
-tabs = st.tabs(ROOMS)
-
-for room_id, tab in zip(ROOMS, tabs):
-    with tab:
-        if room_id == ROOMS[0]:
-            st.markdown("""
-            # 사건 개요
-            한 저택에서 살인 사건이 발생했다.
-
-            ## 주요 장소
-            - 현관
-            - 2층 서재
-            - 부엌
-
-            ## 공개 증거
-            1) 닦인 촛대  
-            2) 젖은 고무장갑
-            
-            ## 규칙
-            1) 당신은 5명의 용의자 (A,B,C,D,E)를 심문하여 살인자를 찾아야합니다
-            2) 각각의 용의자들은 3개의 핵심 진술을 가지고 있으며, 이 중 2가지는 참 한 가지는 거짓입니다
-            3) 심문을 통해 핵심 진술 3가지를 찾고 참, 거짓을 판별하여 살인자를 찾아야합니다
-
-            """)
-        
-        elif room_id == ROOMS[-2]:
-
-                    st.title("메모장 (싱글)")
-
-                    # 초기값
-                    if "note_text" not in st.session_state:
-                        st.session_state.note_text = "여기에 메모를 적으세요."
-
-                    # 편집
-                    text = st.text_area("내용 (Markdown 가능)", value=st.session_state.note_text, height=300)
-
-                    if st.button("저장"):
-                        st.session_state.note_text = text
-                        st.success("저장 완료!")
-
-
-                    st.divider()
-                    st.subheader("미리보기")
-                    st.markdown(text)
-        
-        elif room_id == ROOMS[-1]:
-            choice = st.radio("범인을 선택하세요", ["A","B","C","D","E"], horizontal=True)
-            if st.button("제출"):
-                if choice == "B":
-                    st.success("정답입니다! 범인은 B 입니다.")
-                else:
-                    st.error("오답입니다.")
-
-        elif room_id == ROOMS[-3]:
-            st.subheader("힌트")
-            if "hint1_open" not in st.session_state:
-                st.session_state.hint1_open = False
-            if "hint2_open" not in st.session_state:
-                st.session_state.hint2_open = False
-
-            col1, col2 = st.columns([1,1])
-            with col1:
-                if st.button("힌트 1 열기" if not st.session_state.hint1_open else "힌트 1 닫기"):
-                    st.session_state.hint1_open = not st.session_state.hint1_open
-                    st.rerun()
-            with col2:
-                if st.button("힌트 2 열기" if not st.session_state.hint2_open else "힌트 2 닫기"):
-                    st.session_state.hint2_open = not st.session_state.hint2_open
-                    st.rerun()
-
-            # 힌트 렌더 (마크다운)
-            if st.session_state.hint1_open:
-                st.markdown("### 힌트 1")
-                st.markdown("""
-    참, 거짓 문제 해결의 기본적인 아이디어는 참인 진술과 거짓인 진술 간에는 모순이 발생한다는 점을 이용한다.
-    제시된 진술이 모두 참이라고 가정하고서 모순이 발생하는 진술을 찾아 문제를 해결한다. 특히 제시된 정보가 상당히 제한적일 때, 직접 추론을 통해서는 너무나 많은 경우를 고려해야한다면, 간접 추론을 통한 문제 해결이 더 적절할 수 있다
-    예를 들어, 네 사람 중에서 진실을 말하는 사람이 3명, 거짓을 말하는 사람이 1명이 있다고 할 때, 거짓말하는 사람을 찾아 가는 방법은 진술이 모두 참이라고 가정하고서, 진술 간의 조화여부를 검토해 다른 셋과 조화를 이를 수 없거나 제시된 조건에 부합하지 않는 진술을 찾는 것이다
-
-                """.strip())
-
-            if st.session_state.hint2_open:
-                st.markdown("### 힌트 2")
-                st.markdown("""
-    모든 용의자가 자신이 범인이 아니라고 한다. 즉 이 중 한 명은 거짓이다
-                """.strip())
+    st.divider()
+    st.subheader("미리보기")
+    st.markdown(text)
 
+elif room_id == ROOMS[-1]:
+    choice = st.radio("범인을 선택하세요", list(SCENARIO.suspects), horizontal=True)
+    if st.button("제출"):
+        if check_answer(choice, SCENARIO.id):
+            st.success(f"정답입니다! 범인은 {choice} 입니다.")
         else:
-            st.subheader(f"Chat: {room_id}")
-            # 1) 입력창 클리어 플래그 체크 (위젯 생성 전에 처리!)
-            clear_key = f"__clear_input_{room_id}"
-            if st.session_state.get(clear_key):
-                st.session_state.pop(f"chat_input_{room_id}", None)
-                st.session_state[clear_key] = False
-
-            # 2) 기존 메시지 렌더 (UI 메시지만)
-            for m in st.session_state.rooms[room_id]["messages"]:
-                role = m["role"]
-                speaker = m.get("speaker")
-                if role == "user":
-                    with st.chat_message("user"):
-                        st.markdown(m["content"])
-                else:
-                    with st.chat_message("assistant"):
-                        name_label = f"**{speaker}:** " if speaker in {"A", "B", "C", "D", "E"} else ""
-                        st.markdown(name_label + m["content"])
-
-            # 3) 입력
-            user_msg = st.chat_input("심문을 입력하세요", key=f"chat_input_{room_id}")
-            if user_msg:
-                if room_id == 'room A':
-                    # 3-1) 사용자 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {"role": "user", "content": user_msg, "ts": datetime.now().isoformat()}
-                    )
-                    # 3-2) LLM 호출 → payload(dict) → 문자열/스피커 추출
-                    payload = game_A_prompt(user_msg, room_id)
-                    content_md, speaker, utt_type, _ = parse_llm_output(payload)
-                    # 3-3) 어시스턴트 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {
-                            "role": "assistant",
-                            "speaker": speaker,
-                            "content": content_md,
-                            "ts": datetime.now().isoformat(),
-                        }
-                    )
-                    # 3-4) 다음 런에서 입력창 비우기
-                    st.session_state[clear_key] = True
-                    st.rerun()
-                
-                if room_id == 'room B':
-                    # 3-1) 사용자 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {"role": "user", "content": user_msg, "ts": datetime.now().isoformat()}
-                    )
-                    # 3-2) LLM 호출 → payload(dict) → 문자열/스피커 추출
-                    payload = game_B_prompt(user_msg, room_id)
-                    content_md, speaker, utt_type, _ = parse_llm_output(payload)
-                    # 3-3) 어시스턴트 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {
-                            "role": "assistant",
-                            "speaker": speaker,
-                            "content": content_md,
-                            "ts": datetime.now().isoformat(),
-                        }
-                    )
-                    # 3-4) 다음 런에서 입력창 비우기
-                    st.session_state[clear_key] = True
-                    st.rerun()
-
-                if room_id == 'room C':
-                    # 3-1) 사용자 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {"role": "user", "content": user_msg, "ts": datetime.now().isoformat()}
-                    )
-                    # 3-2) LLM 호출 → payload(dict) → 문자열/스피커 추출
-                    payload = game_C_prompt(user_msg, room_id)
-                    content_md, speaker, utt_type, _ = parse_llm_output(payload)
-                    # 3-3) 어시스턴트 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {
-                            "role": "assistant",
-                            "speaker": speaker,
-                            "content": content_md,
-                            "ts": datetime.now().isoformat(),
-                        }
-                    )
-                    # 3-4) 다음 런에서 입력창 비우기
-                    st.session_state[clear_key] = True
-                    st.rerun()
-
-                if room_id == 'room D':
-                    # 3-1) 사용자 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {"role": "user", "content": user_msg, "ts": datetime.now().isoformat()}
-                    )
-                    # 3-2) LLM 호출 → payload(dict) → 문자열/스피커 추출
-                    payload = game_D_prompt(user_msg, room_id)
-                    content_md, speaker, utt_type, _ = parse_llm_output(payload)
-                    # 3-3) 어시스턴트 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {
-                            "role": "assistant",
-                            "speaker": speaker,
-                            "content": content_md,
-                            "ts": datetime.now().isoformat(),
-                        }
-                    )
-                    # 3-4) 다음 런에서 입력창 비우기
-                    st.session_state[clear_key] = True
-                    st.rerun()
-                if room_id == 'room E':
-                    # 3-1) 사용자 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {"role": "user", "content": user_msg, "ts": datetime.now().isoformat()}
-                    )
-                    # 3-2) LLM 호출 → payload(dict) → 문자열/스피커 추출
-                    payload = game_E_prompt(user_msg, room_id)
-                    content_md, speaker, utt_type, _ = parse_llm_output(payload)
-                    # 3-3) 어시스턴트 발화 UI 저장
-                    st.session_state.rooms[room_id]["messages"].append(
-                        {
-                            "role": "assistant",
-                            "speaker": speaker,
-                            "content": content_md,
-                            "ts": datetime.now().isoformat(),
-                        }
-                    )
-                    # 3-4) 다음 런에서 입력창 비우기
-                    st.session_state[clear_key] = True
-                    st.rerun()
-
-                
-                
-
+            st.error("오답입니다.")
+
+elif room_id == GROUP_ROOM:
+    st.subheader("단체 심문")
+    targets = st.multiselect("심문할 용의자", SUSPECT_ROOMS, default=SUSPECT_ROOMS)
+    with st.form("group_form", clear_on_submit=True):
+        group_msg = st.text_input("모두에게 물을 질문")
+        sent = st.form_submit_button("동시에 묻기")
+
+    if sent and group_msg and targets:
+        # 용의자별 자리를 먼저 만들고, 답이 끝나는 순서대로 채운다
+        slots = {rid: st.empty() for rid in targets}
+        for rid in targets:
+            slots[rid].info(f"{rid} 심문 중…")
+        user_ms = {}
+        for rid in targets:
+            user_ms[rid] = {"role": "user", "content": group_msg, "ts": datetime.now().isoformat()}
+            open_room(rid)["messages"].append(user_ms[rid])
+        # 공용 스케줄러 대기열에서 기다리는 방은 순번을 보여 준다 (GAME_SCHEDULER)
+        for rid, payload, err in group_interrogate(st.session_state.rooms, targets, group_msg,
+                                                   scenario_id=SCENARIO.id, use_cache=USE_CACHE,
+                                                   on_queue=lambda rid, pos: slots[rid].info(
+                                                       f"{rid} 심문 대기 중… (대기 순번 {pos})")):
+            if err is not None:
+                st.session_state.rooms[rid]["messages"].remove(user_ms[rid])
+                slots[rid].error(f"{rid}: 응답 실패 ({err})")
+                continue
+            msg = assistant_message(rid, payload)
+            st.session_state.rooms[rid]["messages"].append(msg)
+            save_messages(rid, [user_ms[rid], msg], st.session_state.rooms[rid]["model"][-2:])
+            with slots[rid].container():
+                with st.chat_message("assistant"):
+                    st.markdown(f"**{msg['speaker']}:** {msg['content']}")
+
+elif room_id == ADMIN_ROOM:
+    st.subheader("지표")
+    errors = check_scenario(SCENARIO)
+    st.caption(f"시나리오 검증: 풀이상 범인 {solved_culprit(SCENARIO.id)}")
+    if errors:
+        st.warning("\n".join(f"- {e}" for e in errors))
+    st.caption("지연 (최근 표본 기준, ms)")
+    st.dataframe(METRICS.latency_table(), width="stretch")
+    st.caption("용의자별 토큰/비용 (USD)")
+    st.dataframe(METRICS.spend_table(), width="stretch")
+    st.caption("세션별")
+    st.dataframe(METRICS.session_table(), width="stretch")
+    st.caption("답변 스키마 검사 (용의자별)")
+    st.dataframe(VALIDATION.report(), width="stretch")
+    if SESSION_POOL is not None:
+        st.caption("세션 메모리 (다중 사용자 모드)")
+        st.json(SESSION_POOL.report())
+    if CASSETTE is not None:
+        st.caption(f"카세트 ({CASSETTE_MODE})")
+        st.json(CASSETTE.report())
+    if PREFETCH.enabled:
+        st.caption("다음 질문 미리 생성")
+        st.json(PREFETCH.stats())
+    if SCHEDULER is not None:
+        st.caption("호출 스케줄러 (속도 제한/대기열/요청 합치기)")
+        st.json(SCHEDULER.report())
+    if local_report() is not None:
+        st.caption("로컬 추론 백엔드")
+        st.json(local_report())
+    st.caption("회로 차단기")
+    st.json(POLICY.report())
+    with st.expander("카운터"):
+        st.json(METRICS.counters())
+    col1, col2 = st.columns(2)
+    col1.download_button("JSONL 트레이스", METRICS.jsonl(), file_name="game_trace.jsonl")
+    col2.download_button("Prometheus", METRICS.prometheus(), file_name="game_metrics.prom")
+
+elif room_id == ROOMS[-3]:
+    st.subheader("힌트")
+    cols = st.columns(len(SCENARIO.hints))
+    for i, (col, hint) in enumerate(zip(cols, SCENARIO.hints), start=1):
+        key = f"hint{i}_open"
+        if key not in st.session_state:
+            st.session_state[key] = False
+        with col:
+            if st.button(f"{hint['title']} 열기" if not st.session_state[key] else f"{hint['title']} 닫기"):
+                st.session_state[key] = not st.session_state[key]
+                if SESSIONS is not None:
+                    opened = [j for j in range(1, len(SCENARIO.hints) + 1) if st.session_state.get(f"hint{j}_open")]
+                    SESSIONS.save_meta(st.session_state.session_id, hints=opened)
+                st.rerun()
+
+    # 힌트 렌더 (마크다운)
+    for i, hint in enumerate(SCENARIO.hints, start=1):
+        if st.session_state[f"hint{i}_open"]:
+            st.markdown(f"### {hint['title']}")
+            st.markdown(hint["body_md"])
+
+    # 확보한 핵심 진술로 만드는 추리 힌트 (한 단계씩 공개)
+    st.divider()
+    st.subheader("추리 도우미")
+    unlocked = {s.id: st.session_state.rooms[s.room_id].get("unlocked", []) for s in SCENARIO.suspects.values()}
+    steps = hints(unlocked, SCENARIO.id)
+    shown = st.session_state.setdefault("solver_hints", 1)
+    for step in steps[:shown]:
+        st.markdown(f"- {step}")
+    if shown < len(steps) and st.button("다음 추리 힌트"):
+        st.session_state.solver_hints = shown + 1
+        st.rerun()
+
+else:
+    chat_room(room_id)